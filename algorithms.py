@@ -26,6 +26,7 @@ you really want them to do.
 """
 
 import random
+from concurrent.futures import wait, FIRST_COMPLETED
 import pandas as pd
 
 import tools
@@ -338,8 +339,30 @@ def eaMuPlusLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
     return population, logbook
 
 
+def writeGeneration(population, gen, archive=None):
+    """Appends *population* as generation *gen* to *archive*, a
+    :class:`~generation_archive.GenerationArchive`. Without an archive the
+    genomes, fitnesses and strategies are written to pop_*gen*.txt,
+    pop_fitness_*gen*.txt and pop_strategy_*gen*.txt."""
+    if archive is not None:
+        archive.append(population, gen)
+        return
+    pop_fitness = []
+    pop_strategy = []
+    for i in population:
+        pop_fitness.append(sum(i.fitness.values))
+        pop_strategy.append(i.strategy)
+    pop_df = pd.DataFrame(population)
+    pop_df.to_csv('pop_'+str(gen)+'.txt', sep=' ', index=False)
+    pop_fitness_df = pd.DataFrame(pop_fitness, columns=["fitness"])
+    pop_fitness_df.to_csv('pop_fitness_'+str(gen)+'.txt', sep=' ', index=False)
+    pop_strategy_df = pd.DataFrame(pop_strategy)
+    pop_strategy_df.to_csv('pop_strategy_'+str(gen)+'.txt', sep=' ', index=False)
+
+
 def eaMuCommaLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
-                    stats=None, halloffame=None, verbose=__debug__, writeGENS=False):
+                    stats=None, halloffame=None, verbose=__debug__, writeGENS=False,
+                    variation=None, archive=None, checkpoint=None):
     """This is the :math:`(\mu~,~\lambda)` evolutionary algorithm.
 
     :param population: A list of individuals.
@@ -355,6 +378,14 @@ def eaMuCommaLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
     :param halloffame: A :class:`~deap.tools.HallOfFame` object that will
                        contain the best individuals, optional.
     :param verbose: Whether or not to log the statistics.
+    :param variation: A function with the signature of :func:`varOr` used in
+                      its place, e.g. :func:`es_variation.varOrES`, optional.
+    :param writeGENS: Whether or not to write the population of every
+                      generation, see :func:`writeGeneration`.
+    :param archive: A :class:`~generation_archive.GenerationArchive` the
+                    generations are written to, including generation 0.
+    :param checkpoint: A :class:`~checkpoint.Checkpointer` updated at the end
+                       of every generation, optional.
     :returns: The final population
     :returns: A class:`~deap.tools.Logbook` with the statistics of the
               evolution
@@ -394,6 +425,8 @@ def eaMuCommaLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
     variation.
     """
     assert lambda_ >= mu, "lambda must be greater or equal to mu."
+    if variation is None:
+        variation = varOr
 
     # Evaluate the individuals with an invalid fitness
     invalid_ind = [ind for ind in population if not ind.fitness.valid]
@@ -411,11 +444,13 @@ def eaMuCommaLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
     logbook.record(gen=0, nevals=len(invalid_ind), **record)
     if verbose:
         print(logbook.stream)
+    if (writeGENS and archive is not None):
+        writeGeneration(population, 0, archive)
 
     # Begin the generational process
     for gen in range(1, ngen + 1):
         # Vary the population
-        offspring = varOr(population, toolbox, lambda_, cxpb, mutpb)
+        offspring = variation(population, toolbox, lambda_, cxpb, mutpb)
 
         # Evaluate the individuals with an invalid fitness
         invalid_ind = [ind for ind in offspring if not ind.fitness.valid]
@@ -432,28 +467,168 @@ def eaMuCommaLambda(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
 
         # Write every generation
         if (writeGENS):
-            pop_fitness = []
-            pop_strategy = []
-            for i in population:
-                pop_fitness.append(i.fitness.values[0])
-                pop_strategy.append(i.strategy)
-            pop_df = pd.DataFrame(population)
-            pop_df.to_csv('pop_'+str(gen)+'.txt', sep=' ', index=False)
-            pop_fitness_df = pd.DataFrame(pop_fitness, columns=["fitness"])
-            pop_fitness_df.to_csv('pop_fitness_'+str(gen)+'.txt', sep=' ', index=False)
-            pop_strategy_df = pd.DataFrame(pop_strategy)
-            pop_strategy_df.to_csv('pop_strategy_'+str(gen)+'.txt', sep=' ', index=False)
+            writeGeneration(population, gen, archive)
 
         # Update the statistics with the new population
         record = stats.compile(population) if stats is not None else {}
         logbook.record(gen=gen, nevals=len(invalid_ind), **record)
         if verbose:
             print(logbook.stream)
+        if checkpoint is not None:
+            checkpoint.update(population, halloffame, logbook, gen)
+    return population, logbook
+
+
+def eaMuCommaLambdaAsync(population, toolbox, mu, lambda_, cxpb, mutpb, ngen,
+                         stats=None, halloffame=None, verbose=__debug__,
+                         writeGENS=False, ninflight=None, archive=None,
+                         checkpoint=None):
+    """This is an asynchronous, steady-state variant of the
+    :math:`(\mu~,~\lambda)` evolutionary algorithm.
+
+    :param population: A list of individuals.
+    :param toolbox: A :class:`~deap.base.Toolbox` that contains the evolution
+                    operators.
+    :param mu: The number of individuals to select for the parent pool.
+    :param lambda\_: The number of evaluated offspring a selection is made
+                     from.
+    :param cxpb: The probability that an offspring is produced by crossover.
+    :param mutpb: The probability that an offspring is produced by mutation.
+    :param ngen: The number of selections (generations).
+    :param stats: A :class:`~deap.tools.Statistics` object that is updated
+                  inplace, optional.
+    :param halloffame: A :class:`~deap.tools.HallOfFame` object that will
+                       contain the best individuals, optional.
+    :param verbose: Whether or not to log the statistics.
+    :param writeGENS: Whether or not to write the parent pool after every
+                      selection, see :func:`writeGeneration`.
+    :param ninflight: The number of evaluations kept running, defaults to
+                      *lambda_*.
+    :param archive: A :class:`~generation_archive.GenerationArchive` the
+                    parent pools are written to, including generation 0.
+    :param checkpoint: A :class:`~checkpoint.Checkpointer` updated after
+                       every selection, optional. Evaluations running at a
+                       checkpoint are not saved.
+    :returns: The final population
+    :returns: A class:`~deap.tools.Logbook` with the statistics of the
+              evolution
+
+    Instead of evaluating *lambda_* offspring with :meth:`toolbox.map` and
+    waiting for the slowest one, every offspring is submitted on its own with
+    :meth:`toolbox.submit` and a new offspring is produced from the current
+    parent pool as soon as an evaluation completes, so *ninflight*
+    evaluations are always running. Offspring are produced one at a time by
+    :func:`varOr`. Each time *lambda_* offspring have completed, the parent
+    pool is replaced by the *mu* individuals selected from **only** those
+    offspring. The pseudocode goes as follow ::
+
+        evaluate(population)
+        submit ninflight offspring of population
+        while fewer than ngen * lambda_ offspring have completed:
+            wait for an evaluation and add it to offspring
+            submit varOr(population, toolbox, 1, cxpb, mutpb)
+            if len(offspring) == lambda_:
+                population = select(offspring, mu)
+                offspring = []
+
+    Offspring still running at a selection were produced from the previous
+    parent pool. In total *ngen* * *lambda_* offspring are produced, as with
+    :func:`eaMuCommaLambda`. The logbook contains the generation number, the
+    total number of evaluations *evals* and the number of evaluations of
+    each generation.
+
+    This function expects :meth:`toolbox.mate`, :meth:`toolbox.mutate`,
+    :meth:`toolbox.select`, :meth:`toolbox.evaluate` and
+    :meth:`toolbox.submit` aliases to be registered in the toolbox.
+    :meth:`toolbox.submit` takes a function and an individual and returns a
+    :class:`concurrent.futures.Future`, like
+    :meth:`concurrent.futures.Executor.submit`.
+    """
+    assert lambda_ >= mu, "lambda must be greater or equal to mu."
+    if ninflight is None:
+        ninflight = lambda_
+
+    # Evaluate the individuals with an invalid fitness
+    invalid_ind = [ind for ind in population if not ind.fitness.valid]
+    futures = [toolbox.submit(toolbox.evaluate, ind) for ind in invalid_ind]
+    for ind, fut in zip(invalid_ind, futures):
+        ind.fitness.values = fut.result()
+
+    if halloffame is not None:
+        halloffame.update(population)
+
+    logbook = tools.Logbook()
+    logbook.header = ['gen', 'evals', 'nevals'] + (stats.fields if stats else [])
+
+    evals = len(invalid_ind)
+    record = stats.compile(population) if stats is not None else {}
+    logbook.record(gen=0, evals=evals, nevals=len(invalid_ind), **record)
+    if verbose:
+        print(logbook.stream)
+    if (writeGENS and archive is not None):
+        writeGeneration(population, 0, archive)
+
+    running = {}
+    offspring = []
+    nevals = 0
+    remaining = ngen * lambda_
+    gen = 0
+
+    def submit():
+        # Offspring produced by reproduction are already evaluated
+        nonlocal remaining
+        while (remaining > 0 and len(running) < ninflight):
+            ind, = varOr(population, toolbox, 1, cxpb, mutpb)
+            remaining -= 1
+            if ind.fitness.valid:
+                offspring.append(ind)
+            else:
+                running[toolbox.submit(toolbox.evaluate, ind)] = ind
+            if (len(offspring) >= lambda_):
+                break
+
+    submit()
+    while (gen < ngen):
+        if (len(offspring) < lambda_):
+            done, _ = wait(list(running.keys()), return_when=FIRST_COMPLETED)
+            for fut in done:
+                ind = running.pop(fut)
+                ind.fitness.values = fut.result()
+                offspring.append(ind)
+                nevals += 1
+
+        if (len(offspring) >= lambda_):
+            gen += 1
+            evals += nevals
+            generation, offspring[:] = offspring[:lambda_], offspring[lambda_:]
+
+            # Update the hall of fame with the generated individuals
+            if halloffame is not None:
+                halloffame.update(generation)
+
+            # Select the next parent pool
+            population[:] = toolbox.select(generation, mu)
+
+            # Write every generation
+            if (writeGENS):
+                writeGeneration(population, gen, archive)
+
+            # Update the statistics with the new population
+            record = stats.compile(population) if stats is not None else {}
+            logbook.record(gen=gen, evals=evals, nevals=nevals, **record)
+            if verbose:
+                print(logbook.stream)
+            if checkpoint is not None:
+                checkpoint.update(population, halloffame, logbook, gen)
+            nevals = 0
+
+        submit()
+
     return population, logbook
 
 
 def eaGenerateUpdate(toolbox, ngen, halloffame=None, stats=None,
-                     verbose=__debug__):
+                     verbose=__debug__, writeGENS=False, archive=None):
     """This is algorithm implements the ask-tell model proposed in
     [Colette2010]_, where ask is called `generate` and tell is called `update`.
 
@@ -465,6 +640,10 @@ def eaGenerateUpdate(toolbox, ngen, halloffame=None, stats=None,
     :param halloffame: A :class:`~deap.tools.HallOfFame` object that will
                        contain the best individuals, optional.
     :param verbose: Whether or not to log the statistics.
+    :param writeGENS: Whether or not to write the population of every
+                      generation, see :func:`writeGeneration`.
+    :param archive: A :class:`~generation_archive.GenerationArchive` the
+                    generations are written to.
     :returns: The final population
     :returns: A class:`~deap.tools.Logbook` with the statistics of the
               evolution
@@ -510,6 +689,10 @@ def eaGenerateUpdate(toolbox, ngen, halloffame=None, stats=None,
         # Update the strategy with the evaluated individuals
         toolbox.update(population)
 
+        # Write every generation
+        if (writeGENS):
+            writeGeneration(population, gen, archive)
+
         record = stats.compile(population) if stats is not None else {}
         logbook.record(gen=gen, nevals=len(population), **record)
         if verbose:
@@ -0,0 +1,66 @@
+""" Benchmark of cma_strategy.CMAStrategy in eaGenerateUpdate against the
+(mu,lambda) ES of the fitting scripts in eaMuCommaLambda, as the number of
+evaluations needed to reach a target fitness on the cheap stand-in fitness
+of bench_surrogate."""
+
+import sys
+import array as arr
+import random
+from functools import partial
+import numpy as np
+
+import tools
+from algorithms import eaGenerateUpdate
+from cma_strategy import CMAStrategy
+from bench_surrogate import distance, evaluations_to_target, run, NUM_PARAMS
+from bench_variation import make_population
+from es_variation import varOrArrays
+from deap import base
+from deap import creator
+
+
+def run_cma(goal, seed, mu, lambda_, ngen, diagonal):
+    random.seed(seed)
+    np.random.seed(seed)
+    toolbox = base.Toolbox()
+    toolbox.register("evaluate", distance, goal=goal)
+    toolbox.register("map", map)
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    stats.register("min", np.min)
+    strategy = CMAStrategy.from_population(make_population(mu, NUM_PARAMS, seed),
+                                           lambda_=lambda_, diagonal=diagonal)
+    toolbox.register("generate", strategy.generate, creator.Individual, creator.Strategy)
+    toolbox.register("update", strategy.update)
+    pop, logbook = eaGenerateUpdate(toolbox, ngen, stats=stats, verbose=False)
+    return logbook
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_cma.py [NRUNS]')
+        return
+    nruns = int(argv[0]) if len(argv) == 1 else 10
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    creator.create("Individual", arr.array, typecode="d",
+                   fitness=creator.FitnessMin, strategy=None)
+    creator.create("Strategy", arr.array, typecode="d")
+
+    mu, lambda_, ngen = 20, 40, 150
+    goal = np.concatenate(([0.5], np.random.default_rng(123).uniform(0.1, 2.0, NUM_PARAMS-1)))
+    runs = {'(mu,lambda) ES': partial(run, varOrArrays),
+            'CMA-ES': partial(run_cma, diagonal=False),
+            'sep-CMA-ES': partial(run_cma, diagonal=True)}
+    logbooks = {name: [f(goal=goal, seed=seed, mu=mu, lambda_=lambda_, ngen=ngen)
+                       for seed in range(nruns)] for name, f in runs.items()}
+    for target in (1.0, 0.1, 0.01):
+        print('Target fitness %g:' % target)
+        for name in runs:
+            reached = [evaluations_to_target(l, target) for l in logbooks[name]]
+            reached = [i for i in reached if i is not None]
+            median = '%d' % np.median(reached) if reached else '-'
+            print('  %-16s reached %2d/%d, median evaluations %s'
+                  % (name, len(reached), nruns, median))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,118 @@
+""" Micro-benchmark of the array non-dominated sort of tools.emo
+(nondominated_fronts and crowding_distance) against the sorts on the
+individuals of deap.tools, for selNSGA2, selNSGA3 and ParetoFront """
+
+import sys
+import random
+import timeit
+import numpy as np
+
+import tools
+from deap import tools as deap_tools
+from deap.tools import emo as deap_emo
+from deap import base
+from deap import creator
+
+
+def make_population(n, nobj, seed=0, discrete=False):
+    rng = np.random.default_rng(seed)
+    pop = []
+    for i in range(n):
+        ind = creator.Individual([i])
+        if discrete:
+            values = rng.integers(0, 6, nobj)
+        else:
+            # Points around a front, so that there are several fronts
+            values = rng.dirichlet(np.ones(nobj)) * rng.uniform(1.0, 2.0)
+        ind.fitness.values = tuple(float(v) for v in values)
+        pop.append(ind)
+    return pop
+
+
+def front_sets(fronts):
+    return [sorted(ind[0] for ind in front) for front in fronts]
+
+
+def validate(nobj):
+    same_fronts = same_dist = same_nsga2 = same_pareto = True
+    for seed in range(20):
+        pop = make_population(300, nobj, seed, discrete=seed % 2 == 0)
+        wvalues = [ind.fitness.wvalues for ind in pop]
+        for k in (len(pop), 100):
+            old = front_sets(deap_tools.sortNondominated(pop, k))
+            new = [sorted(f.tolist()) for f in tools.nondominated_fronts(wvalues, k)]
+            same_fronts &= old == new
+        old = front_sets(deap_tools.sortNondominated(pop, len(pop), first_front_only=True))
+        new = [f.tolist() for f in tools.nondominated_fronts(wvalues, first_front_only=True)]
+        same_fronts &= old == new
+
+        # Crowding distances of the fronts in the order of deap
+        for front in deap_tools.sortNondominated(pop, len(pop)):
+            deap_emo.assignCrowdingDist(front)
+            dist = tools.crowding_distance([ind.fitness.values for ind in front])
+            same_dist &= dist.tolist() == [ind.fitness.crowding_dist for ind in front]
+
+        # Ties of crowding distance in the last front (as the infinite ones
+        # of its extremes) can select others of them, as can equal
+        # fitnesses in another order within a front
+        if seed % 2 == 1:
+            old = deap_tools.selNSGA2(pop, 100)
+            old = sorted((ind.fitness.crowding_dist, ind[0]) for ind in old)
+            new = tools.selNSGA2(pop, 100)
+            new = sorted((ind.fitness.crowding_dist, ind[0]) for ind in new)
+            same_nsga2 &= all(a == b or a[0] == b[0] == float('inf')
+                              for a, b in zip(old, new))
+
+        old, new = deap_tools.ParetoFront(), tools.ParetoFront()
+        for i in range(0, len(pop), 50):
+            old.update(pop[i:i + 50])
+            new.update(pop[i:i + 50])
+        same_pareto &= [ind[0] for ind in old] == [ind[0] for ind in new]
+    print('%d objectives: same fronts %s, crowding distances %s, selNSGA2 (no ties) %s, ParetoFront %s'
+          % (nobj, same_fronts, same_dist, same_nsga2, same_pareto))
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_emo.py [N]')
+        return
+    n = int(argv[0]) if len(argv) == 1 else 10000
+    creator.create("FitnessMulti", base.Fitness, weights=(-1.0, -1.0, -1.0, -1.0, -1.0))
+    creator.create("Individual", list, fitness=creator.FitnessMulti)
+
+    for nobj in (2, 3, 5):
+        creator.FitnessMulti.weights = (-1.0,) * nobj
+        validate(nobj)
+
+    # Timing of the selections of N/2 individuals among N; the standard
+    # sort is O(M N^2) in Python, so only on a smaller population
+    n_std = min(n, 2000)
+    print('%4s %14s %14s %14s %18s' % ('M', 'numpy (ms)', 'log (ms)', 'standard (ms)',
+                                      'ParetoFront (ms)'))
+    for nobj in (2, 3, 5):
+        creator.FitnessMulti.weights = (-1.0,) * nobj
+        pop = make_population(n, nobj)
+        times = [min(timeit.repeat(lambda: tools.selNSGA2(pop, n // 2), number=1, repeat=3)),
+                 min(timeit.repeat(lambda: deap_tools.selNSGA2(pop, n // 2, nd='log'),
+                                   number=1, repeat=1))]
+        t_std = min(timeit.repeat(lambda: deap_tools.selNSGA2(pop[:n_std], n_std // 2),
+                                  number=1, repeat=1))
+        pops = [pop[i:i + 500] for i in range(0, n, 500)]
+        t_pareto = [timeit.timeit(lambda: [hof.update(p) for p in pops], number=1)
+                    for hof in (tools.ParetoFront(), deap_tools.ParetoFront())]
+        print('%4d %14.1f %14.1f %9.1f N=%d %8.1f / %.1f' % (nobj, 1e3 * times[0], 1e3 * times[1],
+                                                          1e3 * t_std, n_std, 1e3 * t_pareto[0],
+                                                          1e3 * t_pareto[1]))
+
+    ref_points = tools.uniform_reference_points(3, 12)
+    creator.FitnessMulti.weights = (-1.0,) * 3
+    pop = make_population(n, 3)
+    random.seed(0)
+    times = [min(timeit.repeat(lambda: sel(pop, n // 2, ref_points, nd=nd), number=1, repeat=1))
+             for sel, nd in ((tools.selNSGA3, 'numpy'), (deap_tools.selNSGA3, 'log'))]
+    print('selNSGA3 3 objectives N=%d: numpy %.1f ms, log %.1f ms'
+          % (n, 1e3 * times[0], 1e3 * times[1]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
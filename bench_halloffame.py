@@ -0,0 +1,68 @@
+""" Micro-benchmark of tools.HallOfFame (sorted blocks and hashed
+duplicate detection) against deap.tools.HallOfFame, as the cost of one
+generation's update as the hall of fame grows """
+
+import sys
+import array as arr
+import timeit
+import numpy as np
+
+import tools
+from deap import tools as deap_tools
+from deap import base
+from deap import creator
+
+
+def make_population(n, rng, duplicates=None):
+    pop = []
+    for _ in range(n):
+        if duplicates and rng.random() < 0.2:
+            # Clone of an earlier individual, as reproduced offspring are
+            parent = duplicates[rng.integers(len(duplicates))]
+            ind = creator.Individual(parent)
+            ind.fitness.values = parent.fitness.values
+        else:
+            ind = creator.Individual(rng.uniform(0.01, 5.0, 14))
+            ind.fitness.values = (float(rng.uniform()),)
+        pop.append(ind)
+    return pop
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_halloffame.py [LAMBDA]')
+        return
+    lambda_ = int(argv[0]) if len(argv) == 1 else 200
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    creator.create("Individual", arr.array, typecode="d", fitness=creator.FitnessMin)
+
+    # Same contents in the same order on a stream with duplicates
+    rng = np.random.default_rng(0)
+    old, new = deap_tools.HallOfFame(500), tools.HallOfFame(500)
+    seen = []
+    for gen in range(50):
+        pop = make_population(lambda_, rng, seen)
+        seen.extend(pop)
+        old.update(pop)
+        new.update(pop)
+    same = all(a == b and a.fitness.values == b.fitness.values for a, b in zip(old, new))
+    print('Same hall of fame: %s (%d individuals)' % (same and len(old) == len(new), len(new)))
+
+    # Update of a hall of fame of maxsize that is already full. Individuals
+    # better than the worst hall-of-famer trigger the similarity check.
+    print('%8s %14s %14s' % ('maxsize', 'deap (ms/gen)', 'tools (ms/gen)'))
+    for maxsize in (100, 1000, 5000, 20000):
+        rng = np.random.default_rng(1)
+        fill = make_population(maxsize, rng)
+        pops = [make_population(lambda_, rng, fill) for _ in range(5)]
+        times = []
+        for clss in (deap_tools.HallOfFame, tools.HallOfFame):
+            hof = clss(maxsize)
+            hof.update(fill)
+            times.append(timeit.timeit(lambda: [hof.update(p) for p in pops], number=1)
+                         / len(pops))
+        print('%8d %14.2f %14.2f' % (maxsize, 1e3 * times[0], 1e3 * times[1]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
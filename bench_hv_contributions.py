@@ -0,0 +1,75 @@
+""" Micro-benchmark of the hypervolume contributions of
+tools._hypervolume.contributions against the leave-one-out hypervolumes of
+the python fallback pyhv, that tools.indicator.hypervolume computed when the
+C extension does not import """
+
+import sys
+import timeit
+import warnings
+import numpy as np
+
+from tools._hypervolume import pyhv
+from tools._hypervolume.contributions import contributions, hypervolume, HypervolumeContributions
+
+
+def make_front(n, nobj, rng):
+    # Points on a convex front
+    return rng.dirichlet(np.ones(nobj), n)**0.7
+
+
+def leave_one_out(points, ref):
+    total = pyhv.hypervolume(points.copy(), ref)
+    return np.array([total - pyhv.hypervolume(np.delete(points, i, axis=0), ref)
+                     for i in range(len(points))])
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_hv_contributions.py [N]')
+        return
+    n = int(argv[0]) if len(argv) == 1 else 100
+    warnings.simplefilter('ignore', RuntimeWarning)
+    rng = np.random.default_rng(0)
+
+    # Exact contributions on fronts and on sets with dominated and equal
+    # points, and after removing the least contributors one at a time
+    for nobj in (2, 3, 4):
+        err = err_removed = 0.0
+        for trial in range(6):
+            if trial % 2 == 0:
+                points = make_front(40, nobj, rng)
+            else:
+                points = rng.integers(0, 5, (40, nobj)).astype(np.float64)
+            ref = points.max(axis=0) + 1
+            scale = np.prod(ref - points.min(axis=0))
+            err = max(err, np.max(np.abs(contributions(points, ref) -
+                                         leave_one_out(points, ref))) / scale)
+            contrib = HypervolumeContributions(points, ref)
+            for _ in range(20):
+                contrib.remove(contrib.argmin())
+                alive = np.flatnonzero(contrib.alive)
+                exact = contributions(points[alive], ref)
+                err_removed = max(err_removed, np.max(np.abs(contrib.values[alive] - exact)) / scale)
+        print('%d objectives: max error %.1e, after removals %.1e' % (nobj, err, err_removed))
+
+    print('%4s %6s %18s %16s %18s' % ('M', 'N', 'leave-one-out (ms)', 'sweep (ms)',
+                                     'remove (ms/point)'))
+    for nobj in (2, 3, 4):
+        points = make_front(n, nobj, rng)
+        ref = points.max(axis=0) + 0.1
+        t_old = min(timeit.repeat(lambda: leave_one_out(points, ref), number=1, repeat=1))
+        t_new = min(timeit.repeat(lambda: contributions(points, ref), number=1, repeat=3))
+        contrib = HypervolumeContributions(points, ref)
+        t_remove = timeit.timeit(lambda: contrib.remove(contrib.argmin()), number=n // 2) / (n // 2)
+        print('%4d %6d %18.1f %16.1f %18.2f' % (nobj, n, 1e3 * t_old, 1e3 * t_new, 1e3 * t_remove))
+
+    # Sizes too large for the leave-one-out hypervolumes
+    for nobj, size in ((2, 10000), (3, 5000)):
+        points = make_front(size, nobj, rng)
+        ref = points.max(axis=0) + 0.1
+        t_new = min(timeit.repeat(lambda: contributions(points, ref), number=1, repeat=3))
+        print('%4d %6d %18s %16.1f' % (nobj, size, '-', 1e3 * t_new))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,59 @@
+""" Benchmark of the array hypervolume of tools._hypervolume.arrayhv (compiled
+with numba when installed) against the python fallback pyhv, on random
+fronts of 100 to 5000 points in 2 to 5 objectives """
+
+import sys
+import timeit
+import warnings
+import numpy as np
+
+from tools._hypervolume import arrayhv, pyhv
+
+
+# Sizes are skipped once a hypervolume takes longer than this (s)
+TIME_LIMIT = 20.0
+
+
+def make_front(n, nobj, rng):
+    # Points on a convex front
+    return rng.dirichlet(np.ones(nobj), n)**0.7
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_hypervolume.py [TIME_LIMIT]')
+        return
+    time_limit = float(argv[0]) if len(argv) == 1 else TIME_LIMIT
+    warnings.simplefilter('ignore', RuntimeWarning)
+    rng = np.random.default_rng(0)
+    print('numba: %s' % (arrayhv.numba is not None))
+    if arrayhv.numba is not None:
+        # Compilation, outside of the timings
+        arrayhv.hypervolume(make_front(10, 4, rng), np.ones(4))
+
+    print('%4s %6s %14s %14s %10s' % ('M', 'N', 'pyhv (ms)', 'arrayhv (ms)', 'rel. diff'))
+    for nobj in (2, 3, 4, 5):
+        slow = {'pyhv': False, 'arrayhv': False}
+        for n in (100, 300, 1000, 2000, 5000):
+            points = make_front(n, nobj, rng)
+            ref = np.ones(nobj) * 1.1
+            results = {}
+            for name, module in (('pyhv', pyhv), ('arrayhv', arrayhv)):
+                if slow[name]:
+                    continue
+                # pyhv translates the points in place
+                t = timeit.default_timer()
+                results[name] = module.hypervolume(points.copy(), ref)
+                t = timeit.default_timer() - t
+                results[name + '_t'] = '%14.1f' % (1e3 * t)
+                slow[name] = t > time_limit
+            if not results:
+                break
+            diff = ('%10.1e' % (abs(results['pyhv'] - results['arrayhv']) / results['arrayhv'])
+                    if 'pyhv' in results and 'arrayhv' in results else '%10s' % '-')
+            print('%4d %6d %s %s %s' % (nobj, n, results.get('pyhv_t', '%14s' % '-'),
+                                         results.get('arrayhv_t', '%14s' % '-'), diff))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
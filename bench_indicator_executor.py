@@ -0,0 +1,61 @@
+""" Benchmark of the indicator contributions of tools.indicator split across
+the workers of a ProcessPoolExecutor, against the serial ones, on random
+fronts of 5 objectives """
+
+import os
+import sys
+import timeit
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from tools import indicator
+from deap import base
+from deap import creator
+
+
+NOBJ = 5
+
+
+def make_front(n, nobj, rng):
+    # Points on a convex front
+    front = []
+    for values in rng.dirichlet(np.ones(nobj), n)**0.7:
+        ind = creator.Individual([0])
+        ind.fitness.values = tuple(values.tolist())
+        front.append(ind)
+    return front
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_indicator_executor.py [N]')
+        return
+    n = int(argv[0]) if len(argv) == 1 else 200
+    creator.create("FitnessMulti", base.Fitness, weights=(-1.0,) * NOBJ)
+    creator.create("Individual", list, fitness=creator.FitnessMulti)
+    rng = np.random.default_rng(0)
+    fronts = {indicator.hypervolume: make_front(n, NOBJ, rng),
+              indicator.additive_epsilon: make_front(10 * n, NOBJ, rng),
+              indicator.multiplicative_epsilon: make_front(10 * n, NOBJ, rng)}
+
+    cpus = os.cpu_count() or 1
+    workers = sorted({1, 2, 4, cpus} & set(range(1, cpus + 1)))
+    print('%d CPUs' % cpus)
+    print('%24s %6s %12s %s' % ('indicator', 'N', 'serial (s)',
+                                ' '.join('%12s' % ('%d proc. (s)' % w) for w in workers)))
+    times = {}
+    for func, front in fronts.items():
+        times[func] = [timeit.timeit(lambda: func(front), number=1)]
+    for w in workers:
+        with ProcessPoolExecutor(w) as executor:
+            for func, front in fronts.items():
+                # Same individual as the serial contributions
+                assert func(front, executor=executor) == func(front)
+                times[func].append(timeit.timeit(lambda: func(front, executor=executor), number=1))
+    for func, front in fronts.items():
+        print('%24s %6d %s' % (func.__name__, len(front),
+                               ' '.join('%12.2f' % t for t in times[func])))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,74 @@
+""" Micro-benchmark of the vectorized lexicase selections of tools.selection
+against the list comprehension loops of deap.tools on nine fitness cases """
+
+import sys
+import random
+import timeit
+from collections import Counter
+import numpy as np
+
+import tools
+from deap import tools as deap_tools
+from deap import base
+from deap import creator
+
+
+NCASES = 9
+
+
+def make_population(n, seed=0, discrete=False):
+    rng = np.random.default_rng(seed)
+    pop = []
+    for i in range(n):
+        ind = creator.Individual([i])
+        if discrete:
+            values = rng.integers(0, 4, NCASES)
+        else:
+            values = rng.lognormal(0.0, 1.0, NCASES)
+        ind.fitness.values = tuple(float(v) for v in values)
+        pop.append(ind)
+    return pop
+
+
+def selection_counts(select, pop, k):
+    return Counter(ind[0] for ind in select(pop, k))
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_lexicase.py [N]')
+        return
+    n = int(argv[0]) if len(argv) == 1 else 10000
+    creator.create("FitnessCases", base.Fitness, weights=(-1.0,)*NCASES)
+    creator.create("Individual", list, fitness=creator.FitnessCases)
+
+    selections = [('selLexicase', {}),
+                  ('selEpsilonLexicase', {'epsilon': 0.5}),
+                  ('selAutomaticEpsilonLexicase', {})]
+
+    # Selection frequencies on a small population with ties
+    pop = make_population(30, seed=1, discrete=True)
+    random.seed(0)
+    for name, kargs in selections:
+        new = selection_counts(lambda p, k: getattr(tools, name)(p, k, **kargs), pop, 30000)
+        old = selection_counts(lambda p, k: getattr(deap_tools, name)(p, k, **kargs), pop, 30000)
+        diff = max(abs(new[i] - old[i]) for i in range(30)) / 30000
+        print('%-28s max difference of selection frequencies: %.3f' % (name, diff))
+
+    # Timing of k = N selections; the loops only on a smaller population
+    pop = make_population(n)
+    n_old = min(n, 1000)
+    pop_old = pop[:n_old]
+    for name, kargs in selections:
+        t_new = min(timeit.repeat(lambda: getattr(tools, name)(pop, n, **kargs),
+                                  number=1, repeat=3))
+        t_old = min(timeit.repeat(lambda: getattr(deap_tools, name)(pop_old, n_old, **kargs),
+                                  number=1, repeat=1))
+        print('%-28s N=%d: %8.1f ms   loops N=%d: %8.1f ms'
+              % (name, n, 1e3 * t_new, n_old, 1e3 * t_old))
+    print('The loops are O(k N cases), so at N=%d they take about %d times longer.'
+          % (n, (n // n_old)**2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,81 @@
+""" Micro-benchmark of the batched NSGA-III selection of tools.emo
+(reference points, association to the niches and niching) against
+deap.tools.selNSGA3, at 9 objectives """
+
+import sys
+import random
+import timeit
+import numpy as np
+
+import tools
+from tools import emo
+from deap import tools as deap_tools
+from deap.tools import emo as deap_emo
+from deap import base
+from deap import creator
+
+
+NOBJ = 9
+
+
+def make_population(n, nobj, seed=0):
+    rng = np.random.default_rng(seed)
+    pop = []
+    for i in range(n):
+        ind = creator.Individual([i])
+        # Points around a front, so that there are several fronts
+        values = rng.dirichlet(np.ones(nobj)) * rng.uniform(1.0, 2.0)
+        ind.fitness.values = tuple(float(v) for v in values)
+        pop.append(ind)
+    return pop
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_nsga3.py [N]')
+        return
+    n = int(argv[0]) if len(argv) == 1 else 2000
+    creator.create("FitnessMulti", base.Fitness, weights=(-1.0,) * NOBJ)
+    creator.create("Individual", list, fitness=creator.FitnessMulti)
+
+    # Same reference points, and same niches for the same fitnesses
+    same_refs = all(np.array_equal(tools.uniform_reference_points(NOBJ, p),
+                                   deap_tools.uniform_reference_points(NOBJ, p))
+                    for p in (1, 2, 3, 4))
+    rng = np.random.default_rng(0)
+    fitnesses = rng.random((n, NOBJ))
+    ref_points = tools.uniform_reference_points(NOBJ, 4)
+    best, worst = fitnesses.min(axis=0), fitnesses.max(axis=0)
+    niches, dist = emo.associate_to_niche(fitnesses, ref_points, best, worst)
+    old_niches, old_dist = deap_emo.associate_to_niche(fitnesses, ref_points, best, worst)
+    print('%d reference points (p=4), same points: %s, same niches: %s, max distance diff: %.1e'
+          % (len(ref_points), same_refs, np.array_equal(niches, old_niches),
+             np.max(np.abs(dist - old_dist))))
+
+    print('%24s %12s %12s' % ('', 'tools (ms)', 'deap (ms)'))
+
+    def row(name, new, old, number=1):
+        t_new = min(timeit.repeat(new, number=number, repeat=3)) / number
+        t_old = min(timeit.repeat(old, number=number, repeat=3)) / number
+        print('%24s %12.2f %12.2f' % (name, 1e3 * t_new, 1e3 * t_old))
+
+    row('reference points p=4', lambda: tools.uniform_reference_points(NOBJ, 4),
+        lambda: deap_tools.uniform_reference_points(NOBJ, 4), number=10)
+    row('association', lambda: emo.associate_to_niche(fitnesses, ref_points, best, worst),
+        lambda: deap_emo.associate_to_niche(fitnesses, ref_points, best, worst))
+
+    # Niching of half of a last front, with the niches partly filled
+    counts = np.bincount(niches[:n // 4], minlength=len(ref_points))
+    individuals = list(range(n))
+    row('niching', lambda: emo.niching(individuals, n // 2, niches, dist, counts.copy()),
+        lambda: deap_emo.niching(individuals, n // 2, niches, dist, counts.copy()))
+
+    pop = make_population(n, NOBJ)
+    random.seed(0)
+    np.random.seed(0)
+    row('selNSGA3', lambda: tools.selNSGA3(pop, n // 2, ref_points),
+        lambda: deap_tools.selNSGA3(pop, n // 2, ref_points, nd='log'))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
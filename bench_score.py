@@ -0,0 +1,94 @@
+""" Micro-benchmark of ExperimentalAPSet.score against the interp1d scoring """
+
+import sys
+import os
+import tempfile
+import timeit
+import numpy as np
+import pandas as pd
+from scipy.interpolate import interp1d
+
+from cell_recording import ExperimentalAPSet
+from run_dclamp_simulation import DCLAMP_CONDITIONS
+
+
+def synthetic_ap(t, apd=300.0, vmax=35.0, mdp=-75.0):
+    """Triangular-ish AP with its upstroke at t(0)."""
+    v = np.full(len(t), mdp)
+    ap = (t >= 0.0) & (t < apd)
+    v[ap] = vmax - (vmax - mdp) * (t[ap] / apd)**4
+    return v
+
+
+def score_interp1d(AP_set, model_AP_set):
+    """Scoring loop of ExperimentalAPSet.score before vectorization."""
+    scores = {}
+    for i in list(AP_set.keys()):
+        real = AP_set[i]
+        simu = model_AP_set[0][i]
+        t_first_real = round(real.iat[0, 0], 1)
+        nrows_real = real.shape[0]
+        t_last_real = round(real.iat[(nrows_real-1), 0], 1)
+        t_resolution = round(real.iat[1, 0], 1) - round(real.iat[0, 0], 1)
+        t_resolution = round(t_resolution, 1)
+        t_first_simu = round(simu.iat[0, 0], 1)
+        nrows_simu = simu.shape[0]
+        t_last_simu = round(simu.iat[(nrows_simu-1), 0], 1)
+        if (t_first_real >= t_first_simu):
+            t_first = t_first_real + t_resolution
+        else:
+            t_first = t_first_simu + t_resolution
+        if (t_last_real >= t_last_simu):
+            t_last = t_last_simu - t_resolution
+        else:
+            t_last = t_last_real - t_resolution
+        N = int((t_last - t_first)/t_resolution)
+        t_new = np.linspace(t_first, t_last, N)
+        f_simu = interp1d(simu.iloc[:, 0], simu.iloc[:, 1])
+        mV_new_simu = f_simu(t_new)
+        f_real = interp1d(real.iloc[:, 0], real.iloc[:, 1])
+        mV_new_real = f_real(t_new)
+        n = float(len(t_new))
+        scores[i] = (sum((mV_new_real - mV_new_simu)**2) / n)**0.5
+    return scores
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_score.py [N_REPEATS]')
+        return
+    n_repeats = int(argv[0]) if len(argv) == 1 else 50
+    rng = np.random.default_rng(0)
+
+    # Experimental AP set at 0.1 ms resolution
+    path = tempfile.mkdtemp()
+    t_real = np.round(np.arange(-250.0, 750.0, 0.1), 1)
+    for key, _, _ in DCLAMP_CONDITIONS:
+        apd = rng.uniform(200.0, 400.0)
+        d = pd.DataFrame({'t': t_real, 'mV': synthetic_ap(t_real, apd)})
+        d.to_csv(os.path.join(path, 'cell_0_'+key+'_SAP.txt'), sep=' ', index=False)
+    cell = ExperimentalAPSet(path=path, file_prefix='cell_0_',
+                             file_suffix='_SAP.txt', cell_id=0, dc_ik1=1.0)
+
+    # Simulated APs on an irregular solver time axis
+    model_APs = {}
+    for key, _, _ in DCLAMP_CONDITIONS:
+        t_simu = np.sort(rng.uniform(-252.0, 752.0, 6000))
+        model_APs[key] = pd.DataFrame({'t': t_simu, 'V': synthetic_ap(t_simu, rng.uniform(200.0, 400.0)),
+                                       'I': np.zeros(len(t_simu))})
+    model_AP_set = (model_APs, False)
+
+    old = score_interp1d(cell.AP_set, model_AP_set)
+    new = cell.score(model_AP_set)
+    err = max(abs(old[i] - new[i]) for i in old.keys())
+    print('Max abs score difference: '+str(err))
+
+    t_old = timeit.timeit(lambda: score_interp1d(cell.AP_set, model_AP_set), number=n_repeats)
+    t_new = timeit.timeit(lambda: cell.score(model_AP_set), number=n_repeats)
+    print('interp1d:   %.3f ms/score' % (1e3 * t_old / n_repeats))
+    print('vectorized: %.3f ms/score' % (1e3 * t_new / n_repeats))
+    print('speedup:    %.1fx' % (t_old / t_new))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
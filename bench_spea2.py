@@ -0,0 +1,67 @@
+""" Micro-benchmark of the vectorized tools.selSPEA2 against the loops of
+deap.tools.selSPEA2, with a check of identical selections on seeded
+populations """
+
+import sys
+import random
+import timeit
+import numpy as np
+
+import tools
+from deap import tools as deap_tools
+from deap import base
+from deap import creator
+
+
+def make_population(n, nobj, seed=0, kind='front'):
+    rng = np.random.default_rng(seed)
+    pop = []
+    for i in range(n):
+        ind = creator.Individual([i])
+        if kind == 'discrete':
+            values = rng.integers(0, 4, nobj)
+        elif kind == 'front':
+            # Mostly non-dominated, for the truncation
+            values = rng.dirichlet(np.ones(nobj)) * rng.uniform(1.0, 1.2)
+        else:
+            values = rng.random(nobj)
+        ind.fitness.values = tuple(float(v) for v in values)
+        pop.append(ind)
+    return pop
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_spea2.py [N]')
+        return
+    n = int(argv[0]) if len(argv) == 1 else 2000
+    creator.create("FitnessMulti", base.Fitness, weights=(-1.0, -1.0, -1.0))
+    creator.create("Individual", list, fitness=creator.FitnessMulti)
+
+    same = True
+    for seed in range(100):
+        size = 1 + seed % 80
+        pop = make_population(size, 3, seed, ('discrete', 'front', 'uniform')[seed % 3])
+        for k in sorted({1, size // 3 + 1, size // 2 + 1, size}):
+            random.seed(seed)
+            old = [ind[0] for ind in deap_tools.selSPEA2(pop, k)]
+            new = [ind[0] for ind in tools.selSPEA2(pop, k)]
+            same &= old == new
+    print('Same selections on seeded populations: %s' % same)
+
+    # Truncation of a front, and archive filled from dominated individuals
+    print('%8s %6s %16s %16s' % ('kind', 'N', 'vectorized (ms)', 'loops (ms)'))
+    for kind in ('front', 'uniform'):
+        for size in (200, 500, 1000, n):
+            pop = make_population(size, 3, kind=kind)
+            t_new = min(timeit.repeat(lambda: tools.selSPEA2(pop, size // 2), number=1, repeat=3))
+            if size <= 1000:
+                t_old = timeit.timeit(lambda: deap_tools.selSPEA2(pop, size // 2), number=1)
+                t_old = '%16.1f' % (1e3 * t_old)
+            else:
+                t_old = '%16s' % '-'
+            print('%8s %6d %16.1f %s' % (kind, size, 1e3 * t_new, t_old))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
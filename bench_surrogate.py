@@ -0,0 +1,86 @@
+""" Benchmark of surrogate.SurrogateScreen against plain varOrArrays in
+eaMuCommaLambda, as the number of evaluations needed to reach a target
+fitness. The fitness is a cheap stand-in for the RMSD of the Kernik model:
+the squared distance of the log of the (clipped) genes to those of a target genome."""
+
+import sys
+import array as arr
+import random
+import numpy as np
+
+import tools
+from algorithms import eaMuCommaLambda
+from es_variation import varOrArrays
+from population import PopulationArrays
+from surrogate import SurrogateScreen
+from bench_variation import make_population
+from deap import base
+from deap import creator
+
+
+NUM_PARAMS = 14
+
+
+def evaluations_to_target(logbook, target):
+    """Returns the number of evaluations until the best fitness is at most
+    *target*, or None if it is never reached."""
+    nevals = 0
+    for record in logbook:
+        nevals += record['nevals']
+        if (record['min'] <= target):
+            return nevals
+    return None
+
+
+def distance(ind, goal):
+    x = np.clip(np.nan_to_num(np.asarray(ind), nan=1e3), 1e-3, 1e3)
+    return (float(np.sum(np.log(x / goal)**2)),)
+
+
+def run(variation, goal, seed, mu, lambda_, ngen):
+    random.seed(seed)
+    np.random.seed(seed)
+    toolbox = base.Toolbox()
+    toolbox.register("evaluate", distance, goal=goal)
+    toolbox.register("select", tools.selTournament, tournsize=3)
+    toolbox.register("map", map)
+    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    stats.register("min", np.min)
+    pop = PopulationArrays.from_individuals(make_population(mu, NUM_PARAMS, seed))
+    pop.fitness[:] = np.nan
+    # Strategies that grow without bound overflow in long runs
+    with np.errstate(over='ignore', invalid='ignore'):
+        pop, logbook = eaMuCommaLambda(pop, toolbox, mu, lambda_, 0.6, 0.3, ngen,
+                                       stats=stats, verbose=False, variation=variation)
+    return logbook
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_surrogate.py [NRUNS]')
+        return
+    nruns = int(argv[0]) if len(argv) == 1 else 10
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    creator.create("Individual", arr.array, typecode="d",
+                   fitness=creator.FitnessMin, strategy=None)
+    creator.create("Strategy", arr.array, typecode="d")
+
+    mu, lambda_, ngen = 20, 40, 150
+    goal = np.concatenate(([0.5], np.random.default_rng(123).uniform(0.1, 2.0, NUM_PARAMS-1)))
+    for target in (2.0, 1.0, 0.5):
+        counts = {'varOrArrays': [], 'SurrogateScreen': []}
+        for seed in range(nruns):
+            logbook = run(varOrArrays, goal, seed, mu, lambda_, ngen)
+            counts['varOrArrays'].append(evaluations_to_target(logbook, target))
+            logbook = run(SurrogateScreen(), goal, seed, mu, lambda_, ngen)
+            counts['SurrogateScreen'].append(evaluations_to_target(logbook, target))
+        print('Target fitness %.1f:' % target)
+        for name, c in counts.items():
+            reached = [i for i in c if i is not None]
+            median = '%d' % np.median(reached) if reached else '-'
+            print('  %-16s reached %2d/%d, median evaluations %s'
+                  % (name, len(reached), nruns, median))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
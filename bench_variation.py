@@ -0,0 +1,69 @@
+""" Micro-benchmark of es_variation.varOrES against varOr with mutateES and
+cxESBlend """
+
+import sys
+import array as arr
+import random
+import timeit
+import numpy as np
+from scipy.stats import ks_2samp
+
+from algorithms import varOr
+from es_variation import varOrES
+from iPSC_DEAP_fit import mutateES, cxESBlend
+from deap import base
+from deap import creator
+
+
+def make_population(n, size, seed=0):
+    rng = np.random.default_rng(seed)
+    pop = []
+    for _ in range(n):
+        ind = creator.Individual([rng.uniform()] + list(rng.uniform(0.01, 5.0, size-1)))
+        ind.strategy = creator.Strategy([rng.uniform()] + list(rng.lognormal(0.0, 0.5, size-1)))
+        ind.fitness.values = (rng.uniform(),)
+        pop.append(ind)
+    return pop
+
+
+def main(argv):
+    if (len(argv) > 1):
+        print('python bench_variation.py [LAMBDA]')
+        return
+    lambda_ = int(argv[0]) if len(argv) == 1 else 2000
+    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    creator.create("Individual", arr.array, typecode="d",
+                   fitness=creator.FitnessMin, strategy=None)
+    creator.create("Strategy", arr.array, typecode="d")
+    toolbox = base.Toolbox()
+    toolbox.register("mate", cxESBlend, alpha=0.3)
+    toolbox.register("mutate", mutateES)
+
+    pop = make_population(lambda_ // 2, 14)
+    random.seed(1)
+    old = varOr(pop, toolbox, lambda_, 0.6, 0.3)
+    new = varOrES(pop, toolbox, lambda_, 0.6, 0.3)
+
+    # Two-sample KS test of every gene and strategy over the new offspring
+    old_x = np.array([i for i in old if not i.fitness.valid])
+    new_x = np.array([i for i in new if not i.fitness.valid])
+    old_s = np.array([i.strategy for i in old if not i.fitness.valid])
+    new_s = np.array([i.strategy for i in new if not i.fitness.valid])
+    p_x = [ks_2samp(old_x[:, j], new_x[:, j]).pvalue for j in range(14)]
+    p_s = [ks_2samp(old_s[:, j], new_s[:, j]).pvalue for j in range(14)]
+    print('Reproduced: %d vs %d' % (lambda_ - len(old_x), lambda_ - len(new_x)))
+    # About 1 in 100 tests falls below 0.01 by chance
+    print('Min KS p-value genes:      %.3f' % min(p_x))
+    print('Min KS p-value strategies: %.3f' % min(p_s))
+    print('KS tests with p < 0.01:    %d/28' % sum(p < 0.01 for p in p_x + p_s))
+
+    n_repeats = 5
+    t_old = timeit.timeit(lambda: varOr(pop, toolbox, lambda_, 0.6, 0.3), number=n_repeats)
+    t_new = timeit.timeit(lambda: varOrES(pop, toolbox, lambda_, 0.6, 0.3), number=n_repeats)
+    print('varOr:   %.1f ms/generation' % (1e3 * t_old / n_repeats))
+    print('varOrES: %.1f ms/generation' % (1e3 * t_new / n_repeats))
+    print('speedup: %.1fx' % (t_old / t_new))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
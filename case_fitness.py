@@ -0,0 +1,46 @@
+""" Per-condition fitness vectors.
+
+fitness_cases keeps the RMSD of every AP of the experimental set as its own
+fitness value, in the order of ExperAPSet.ap_keys, for lexicase selection
+(tools.selLexicase and its epsilon variants). CaseFitness compares on the
+sum of its weighted values, so the HallOfFame, selBest and tournaments
+still rank the individuals by the total RMSD.
+"""
+
+from deap import base
+
+from fitness_cache import cached_score
+
+
+# Score of an AP missing from the scores (as for an AP failure).
+MAX_SCORE = 1000.0
+
+
+class CaseFitness(base.Fitness):
+    """ deap.base.Fitness of one value per fitness case, ordered by the sum
+    of the weighted values."""
+
+    @property
+    def total(self):
+        """Sum of the values."""
+        return sum(self.values)
+
+    def __le__(self, other):
+        return sum(self.wvalues) <= sum(other.wvalues)
+
+    def __lt__(self, other):
+        return sum(self.wvalues) < sum(other.wvalues)
+
+    def __eq__(self, other):
+        return sum(self.wvalues) == sum(other.wvalues)
+
+    def __hash__(self):
+        # Equal fitnesses must hash alike
+        return hash(sum(self.wvalues))
+
+
+def fitness_cases(ind, ExperAPSet, ss_cache=None, fit_cache=None):
+    """Returns the RMSD of every AP of *ExperAPSet* as the fitness of *ind*."""
+    scores = cached_score(ExperAPSet, ind, fit_cache, printIND=False,
+                          ss_cache=ss_cache)
+    return tuple(scores.get(key, MAX_SCORE) for key in ExperAPSet.ap_keys)
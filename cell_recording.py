@@ -1,9 +1,104 @@
 import os
+import struct
+import zipfile
 import pandas as pd
-from scipy.interpolate import interp1d
 import numpy as np
 
 
+# Arrays of a bundle that are memory-mapped instead of read into memory.
+BUNDLE_MMAP = ('t', 'v', 'grid_v')
+
+# Arrays of a bundle describing the resampled grids used by score().
+BUNDLE_GRIDS = ('t_first_real', 't_last_real', 't_resolution', 'grid_t0',
+                'grid_n', 'grid_offset', 'grid_v')
+
+# Bundles opened by this process, keyed by (filename, mtime).
+_BUNDLES = {}
+
+
+def _read_npz_mmap(filename):
+    """Reads an uncompressed .npz file with the large arrays in BUNDLE_MMAP
+    memory-mapped, so that every process opening it shares the same pages."""
+    arrays = {}
+    with zipfile.ZipFile(filename) as zf, open(filename, 'rb') as f:
+        for info in zf.infolist():
+            name = info.filename[:-len('.npy')]
+            if (info.compress_type != zipfile.ZIP_STORED):
+                arrays[name] = np.lib.format.read_array(zf.open(info))
+                continue
+            # Skip the local file header to the start of the .npy member
+            f.seek(info.header_offset)
+            header = f.read(30)
+            name_len, extra_len = struct.unpack('<HH', header[26:30])
+            f.seek(info.header_offset + 30 + name_len + extra_len)
+            version = np.lib.format.read_magic(f)
+            if (version == (1, 0)):
+                shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+            if (name in BUNDLE_MMAP and len(shape) > 0 and not dtype.hasobject):
+                arrays[name] = np.memmap(filename, dtype=dtype, mode='r',
+                                         offset=f.tell(), shape=shape,
+                                         order='F' if fortran else 'C')
+            else:
+                count = int(np.prod(shape))
+                data = np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype, count=count)
+                arrays[name] = data.reshape(shape, order='F' if fortran else 'C')
+    return arrays
+
+
+def load_bundle(filename):
+    """Returns the arrays of an AP set bundle, reusing the memory maps of a
+    bundle already opened by this process."""
+    filename = os.path.abspath(filename)
+    key = (filename, os.path.getmtime(filename))
+    if key not in _BUNDLES:
+        _BUNDLES[key] = _read_npz_mmap(filename)
+    return _BUNDLES[key]
+
+
+def bundle_filename(path):
+    """Returns the default bundle filename of an AP set directory."""
+    return os.path.normpath(path) + '.npz'
+
+
+def source_mtime(path, file_prefix='cell_', file_suffix='.txt'):
+    """Returns the latest modification time of the directory *path* and of
+    the AP files in it that ExperimentalAPSet reads, so that files edited in
+    place (which leave the directory mtime unchanged) are seen."""
+    mtime = os.path.getmtime(path)
+    for i in os.listdir(path):
+        if (i.find(file_prefix) >= 0 and i.find(file_suffix) >= 0):
+            mtime = max(mtime, os.path.getmtime(os.path.join(path, i)))
+    return mtime
+
+
+def open_AP_set(path, dc_ik1, file_prefix='cell_', file_suffix='.txt',
+                cell_id=0, bundle=None):
+    """Returns the ExperimentalAPSet of the directory *path*. The set is
+    opened from its bundle (default: bundle_filename(path)) when the bundle
+    is newer than the directory and its AP files (see source_mtime) and was
+    written with the same file_prefix, file_suffix, cell_id and dc_ik1.
+    Otherwise the text files are parsed and the bundle is written for the
+    next call."""
+    if bundle is None:
+        bundle = bundle_filename(path)
+    if (os.path.exists(bundle) and
+            os.path.getmtime(bundle) >= source_mtime(path, file_prefix, file_suffix)):
+        ap_set = ExperimentalAPSet.from_bundle(bundle)
+        if (ap_set.dc_ik1 == dc_ik1 and ap_set.cell_id == cell_id and
+                ap_set.file_prefix == file_prefix and
+                ap_set.file_suffix == file_suffix):
+            return ap_set
+    ap_set = ExperimentalAPSet(path=path, dc_ik1=dc_ik1, file_prefix=file_prefix,
+                               file_suffix=file_suffix, cell_id=cell_id)
+    try:
+        ap_set.write_bundle(bundle)
+    except OSError:
+        print('Could not write AP set bundle: '+bundle)
+    return ap_set
+
+
 class ExperimentalAPSet:
     """ Object containing iPSC-CM APs recorded during the dynamic clamp portion of
     the dynamically-rich protocol (2021).
@@ -11,6 +106,10 @@ class ExperimentalAPSet:
       AP_set: A dict containing single action potentials from experimental
               dynamic-clamp recording.
       score(model_AP_set): function for evaluating model fitness.
+
+    The set can also be written to a single .npz bundle with write_bundle()
+    and opened memory-mapped with ExperimentalAPSet.from_bundle(). A set
+    opened from a bundle is pickled as its filename only.
     """
 
     def __init__(self, path, dc_ik1, file_prefix='cell_', file_suffix='.txt',
@@ -20,6 +119,7 @@ class ExperimentalAPSet:
         self.file_suffix = file_suffix
         self.cell_id = cell_id # optional identifier for organization
         self.dc_ik1 = dc_ik1 # scaling coefficients on Ishihara IK1
+        self.bundle = None
         filenames = os.listdir(path)
 
         """Data is formatted so that each file contains an single AP waveform.
@@ -38,6 +138,131 @@ class ExperimentalAPSet:
                 print('Could not local file(s). Check file(s) and/or directory.')
                 print('path: '+self.path)
                 print('filename: '+i)
+        self._resample()
+
+    def _resample(self):
+        """Resamples every experimental AP once onto a uniform grid at its own
+        time resolution. The grids are stored back to back in one contiguous
+        array so that score() can interpolate all APs with index arithmetic.
+        """
+        self.ap_keys = list(self.AP_set.keys())
+        n_aps = len(self.ap_keys)
+        self.t_first_real = np.empty(n_aps)
+        self.t_last_real = np.empty(n_aps)
+        self.t_resolution = np.empty(n_aps)
+        self.grid_t0 = np.empty(n_aps)
+        self.grid_n = np.empty(n_aps, dtype=np.int64)
+        grids = []
+        for k, i in enumerate(self.ap_keys):
+            real = self.AP_set[i]
+            t_real = real.iloc[:, 0].to_numpy(dtype=np.float64)
+            v_real = real.iloc[:, 1].to_numpy(dtype=np.float64)
+            # Time series boundaries as rounded by the scoring
+            self.t_first_real[k] = round(t_real[0], 1)
+            self.t_last_real[k] = round(t_real[-1], 1)
+            self.t_resolution[k] = round(round(t_real[1], 1) - round(t_real[0], 1), 1)
+            # Uniform grid from the first sample
+            n = int(np.floor((t_real[-1] - t_real[0]) / self.t_resolution[k] + 1e-9)) + 1
+            grid = np.interp(t_real[0] + np.arange(n) * self.t_resolution[k], t_real, v_real)
+            self.grid_t0[k] = t_real[0]
+            self.grid_n[k] = n
+            grids.append(grid)
+        self.grid_offset = np.zeros(n_aps, dtype=np.int64)
+        if (n_aps > 0):
+            self.grid_offset[1:] = np.cumsum(self.grid_n)[:-1]
+            self.grid_v = np.ascontiguousarray(np.concatenate(grids))
+        else:
+            self.grid_v = np.empty(0)
+        self._buffers = None
+
+    @classmethod
+    def from_bundle(cls, filename):
+        """Opens an AP set from a bundle written by write_bundle()."""
+        ap_set = cls.__new__(cls)
+        ap_set._open_bundle(filename)
+        return ap_set
+
+    def _open_bundle(self, filename):
+        data = load_bundle(filename)
+        self.bundle = filename
+        self.path = str(data['path'])
+        self.file_prefix = str(data['file_prefix'])
+        self.file_suffix = str(data['file_suffix'])
+        self.cell_id = data['cell_id'].item()
+        self.dc_ik1 = float(data['dc_ik1'])
+        self.ap_keys = [str(i) for i in data['keys']]
+        for i in BUNDLE_GRIDS:
+            setattr(self, i, data[i])
+        self._AP_set = None
+        self._buffers = None
+
+    @property
+    def AP_set(self):
+        if self._AP_set is None:
+            # Build the DataFrames of a bundle on first use
+            data = load_bundle(self.bundle)
+            columns = [str(i) for i in data['columns']]
+            offsets = data['ap_offsets']
+            self._AP_set = {}
+            for k, i in enumerate(self.ap_keys):
+                a, b = offsets[k], offsets[k+1]
+                self._AP_set[i] = pd.DataFrame({columns[0]: np.array(data['t'][a:b]),
+                                                columns[1]: np.array(data['v'][a:b])})
+        return self._AP_set
+
+    @AP_set.setter
+    def AP_set(self, AP_set):
+        self._AP_set = AP_set
+
+    def write_bundle(self, filename):
+        """Writes the AP set to a single uncompressed .npz bundle holding the
+        time and voltage of every AP, the keys, dc_ik1, cell_id and the
+        resampled grids used by score()."""
+        aps = [self.AP_set[i] for i in self.ap_keys]
+        lengths = [ap.shape[0] for ap in aps]
+        ap_offsets = np.zeros(len(aps) + 1, dtype=np.int64)
+        ap_offsets[1:] = np.cumsum(lengths)
+        if (len(aps) > 0):
+            t = np.concatenate([ap.iloc[:, 0].to_numpy(dtype=np.float64) for ap in aps])
+            v = np.concatenate([ap.iloc[:, 1].to_numpy(dtype=np.float64) for ap in aps])
+            columns = np.array(list(aps[0].columns[:2]))
+        else:
+            t = v = np.empty(0)
+            columns = np.array(['t', 'mV'])
+        arrays = {'t': t, 'v': v, 'ap_offsets': ap_offsets,
+                  'keys': np.array(self.ap_keys, dtype=str), 'columns': columns,
+                  'path': np.array(self.path), 'file_prefix': np.array(self.file_prefix),
+                  'file_suffix': np.array(self.file_suffix),
+                  'cell_id': np.array(self.cell_id), 'dc_ik1': np.array(self.dc_ik1)}
+        for i in BUNDLE_GRIDS:
+            arrays[i] = np.asarray(getattr(self, i))
+        tmp = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, filename)
+
+    def __getstate__(self):
+        # A bundle is reopened (and its pages shared) in each worker
+        if self.bundle is not None:
+            return {'bundle': self.bundle}
+        # Scoring buffers are rebuilt in each worker
+        state = self.__dict__.copy()
+        state['_buffers'] = None
+        return state
+
+    def __setstate__(self, state):
+        if (len(state) == 1 and 'bundle' in state):
+            self._open_bundle(state['bundle'])
+        else:
+            self.__dict__.update(state)
+
+    def _get_buffers(self, size):
+        """Returns preallocated (t, real, simu, segment) buffers of at least
+        *size* elements."""
+        if (self._buffers is None or self._buffers[0].shape[0] < size):
+            self._buffers = (np.empty(size), np.empty(size), np.empty(size),
+                             np.empty(size, dtype=np.int64))
+        return self._buffers
 
     def get_info(self):
         info_string = 'cell_id: '+str(self.cell_id)+'/n'
@@ -48,61 +273,86 @@ class ExperimentalAPSet:
     def get_AP_set(self):
         return self.AP_set
 
-    def score(self, model_AP_set, model_id=0, write_data=False):
+    def score(self, model_AP_set, model_id=0, write_data=False, keys=None):
         # Score assigned if there was an AP Failure
         MAX_SCORE = 1000.0
-        
+
+        # Only the APs in keys are scored if given
         scores = {}
-        ap_keys = list(self.AP_set.keys())
+        ap_keys = self.ap_keys
 
         # Check for AP Failure
         if (model_AP_set[1]):
             for i in ap_keys:
-                scores[i] = MAX_SCORE
+                if (keys is None or i in keys):
+                    scores[i] = MAX_SCORE
             return scores
-        for i in ap_keys:
+
+        # Align curves within interpolation bounds
+        simu_set = []
+        keep = []
+        for k, i in enumerate(ap_keys):
+            if (keys is not None and i not in keys):
+                continue
             try:
-                real = self.AP_set[i]
                 simu = model_AP_set[0][i]
-                # Find time series boundaries
-                t_first_real = round(real.iat[0, 0], 1)
-                nrows_real = real.shape[0]
-                t_last_real = round(real.iat[(nrows_real-1), 0], 1)
-                t_resolution = round(real.iat[1, 0], 1) - round(real.iat[0, 0], 1)
-                t_resolution = round(t_resolution, 1)
-                t_first_simu = round(simu.iat[0, 0], 1)
-                nrows_simu = simu.shape[0]
-                t_last_simu = round(simu.iat[(nrows_simu-1), 0], 1)
-
-                # Align curves within interpolation bounds
-                if (t_first_real >= t_first_simu):
-                    t_first = t_first_real + t_resolution
-                else:
-                    t_first = t_first_simu + t_resolution
-
-                if (t_last_real >= t_last_simu):
-                    t_last = t_last_simu - t_resolution
-                else:
-                    t_last = t_last_real - t_resolution
-                N = int((t_last - t_first)/t_resolution)
-                t_new = np.linspace(t_first, t_last, N)
-
-                f_simu = interp1d(simu.iloc[:, 0], simu.iloc[:, 1])
-                mV_new_simu = f_simu(t_new)
-                f_real = interp1d(real.iloc[:, 0], real.iloc[:, 1])
-                mV_new_real = f_real(t_new)
-
-                # Calculate Root Mean Square Error
-                n = float(len(t_new))
-                rmse = (sum((mV_new_real - mV_new_simu)**2) / n)**0.5
-                scores[i] = rmse
-
-                # Write AP files
-                if write_data:
-                    d = {'t':t_new, 'mV_cell':mV_new_real, 'mV_simu':mV_new_simu}
-                    d = pd.DataFrame(d)
-                    filename = self.file_prefix + i + '_scored_AP_'+str(model_id)+'.txt'
-                    d.to_csv(filename, sep=' ', index=False)
             except KeyError:
                 print('Model AP_set keys did not match ExperimentalAPSet keys.')
+                continue
+            t_simu = simu.iloc[:, 0].to_numpy(dtype=np.float64)
+            simu_set.append((t_simu, simu.iloc[:, 1].to_numpy(dtype=np.float64)))
+            keep.append(k)
+        if (len(keep) == 0):
+            return scores
+        keep = np.array(keep)
+        t_res = self.t_resolution[keep]
+        t_first_simu = np.round([t[0] for t, _ in simu_set], 1)
+        t_last_simu = np.round([t[-1] for t, _ in simu_set], 1)
+        t_first = np.maximum(self.t_first_real[keep], t_first_simu) + t_res
+        t_last = np.minimum(self.t_last_real[keep], t_last_simu) - t_res
+        N = np.maximum(((t_last - t_first) / t_res).astype(np.int64), 0)
+
+        # Common time axis of every AP, back to back
+        ends = np.cumsum(N)
+        starts = ends - N
+        t_new, mV_new_real, mV_new_simu, seg = self._get_buffers(int(ends[-1]))
+        total = int(ends[-1])
+        t_new, mV_new_real = t_new[:total], mV_new_real[:total]
+        mV_new_simu, seg = mV_new_simu[:total], seg[:total]
+        seg[:] = np.repeat(np.arange(len(keep)), N)
+        step = (t_last - t_first) / np.maximum(N - 1, 1)
+        t_new[:] = np.arange(total) - starts[seg]
+        t_new *= step[seg]
+        t_new += t_first[seg]
+
+        # Experimental APs from the uniform grids
+        u = (t_new - self.grid_t0[keep][seg]) / t_res[seg]
+        idx = np.clip(np.floor(u).astype(np.int64), 0, self.grid_n[keep][seg] - 2)
+        frac = u - idx
+        idx += self.grid_offset[keep][seg]
+        mV_new_real[:] = self.grid_v[idx] * (1.0 - frac)
+        mV_new_real += self.grid_v[idx + 1] * frac
+
+        # Simulated APs
+        for j, (t_simu, v_simu) in enumerate(simu_set):
+            mV_new_simu[starts[j]:ends[j]] = np.interp(t_new[starts[j]:ends[j]], t_simu, v_simu)
+
+        # Calculate Root Mean Square Error of all APs in one reduction
+        sq_err = (mV_new_real - mV_new_simu)**2
+        sums = np.bincount(seg, weights=sq_err, minlength=len(keep))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rmse = np.where(N > 0, np.sqrt(sums / np.maximum(N, 1)), MAX_SCORE)
+
+        for j, k in enumerate(keep):
+            i = ap_keys[k]
+            scores[i] = float(rmse[j])
+
+            # Write AP files
+            if write_data:
+                d = {'t': t_new[starts[j]:ends[j]].copy(),
+                     'mV_cell': mV_new_real[starts[j]:ends[j]].copy(),
+                     'mV_simu': mV_new_simu[starts[j]:ends[j]].copy()}
+                d = pd.DataFrame(d)
+                filename = self.file_prefix + i + '_scored_AP_'+str(model_id)+'.txt'
+                d.to_csv(filename, sep=' ', index=False)
         return scores
@@ -0,0 +1,121 @@
+""" Binary checkpoints of a run.
+
+A checkpoint holds the run configuration (MU, LAMBDA, the strategy
+switches and the state of the variation, e.g. the training set of a
+surrogate) followed by the population (with strategies and fitnesses), the
+HallOfFame, the logbook, the generation, the random and NumPy RNG states,
+the next individual ID and the in-memory tier of the fitness cache. The configuration is pickled
+first so that it can be read (load_config) before the creator classes the
+individuals need are defined. A checkpoint is written to a temporary file
+and moved into place, so a job killed while writing leaves the previous
+checkpoint intact. Restoring the RNG states makes a resumed run draw the
+same offspring as an uninterrupted one, and the restored population is not
+evaluated again, nor do its new individuals reuse the IDs of the lineage
+already archived. The generation archive of the run is flushed before
+each checkpoint, so a resumed run does not miss generations the checkpoint
+is past.
+"""
+
+import os
+import random
+import pickle
+import numpy as np
+
+import tools
+from population import PopulationArrays, next_id, reserve_ids
+
+
+CHECKPOINT_NAME = 'checkpoint.pkl'
+
+
+def save_checkpoint(filename, population, halloffame, logbook, gen, fit_cache=None,
+                    config=None):
+    """Atomically writes a checkpoint of generation *gen* and of the run
+    configuration dict *config* to *filename*."""
+    state = {'population': population,
+             'halloffame': halloffame,
+             'logbook': logbook,
+             'gen': gen,
+             'random_state': random.getstate(),
+             'numpy_state': np.random.get_state(),
+             'next_id': next_id(),
+             'fit_cache': fit_cache.dump() if fit_cache is not None else []}
+    tmp = filename + '.' + str(os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(config if config is not None else {}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, filename)
+
+
+def load_config(filename):
+    """Returns the run configuration dict saved in *filename*."""
+    with open(filename, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_checkpoint(filename, fit_cache=None):
+    """Returns the state saved in *filename*, with the run configuration as
+    state['config'], and restores the RNG states and the fitness cache
+    entries. The creator classes of the individuals must exist before
+    loading."""
+    with open(filename, 'rb') as f:
+        config = pickle.load(f)
+        state = pickle.load(f)
+    state['config'] = config
+    random.setstate(state['random_state'])
+    np.random.set_state(state['numpy_state'])
+    reserve_ids(state['next_id'])
+    if (isinstance(state['population'], PopulationArrays) and len(state['population'])):
+        reserve_ids(state['population'].ids.max() + 1)
+    if fit_cache is not None:
+        fit_cache.load(state['fit_cache'])
+    return state
+
+
+class Checkpointer:
+    """ Saves a checkpoint every *freq* generations when passed to
+    eaMuCommaLambda or eaMuCommaLambdaAsync. In a resumed run, *logbook*
+    and *gen* are those of the checkpoint; the records of the run are
+    appended to *logbook* with their generations shifted by *gen*.
+    Attributes:
+      filename: Checkpoint file.
+      freq: Number of generations between checkpoints.
+      fit_cache: FitnessCache saved with the checkpoint, optional.
+      config: Run configuration dict saved with the checkpoint, pickled
+              anew at every checkpoint (see save_checkpoint).
+      archive: GenerationArchive flushed before every checkpoint, optional.
+    """
+
+    def __init__(self, filename, freq=1, fit_cache=None, logbook=None, gen=0,
+                 config=None, archive=None):
+        self.filename = filename
+        self.freq = freq
+        self.fit_cache = fit_cache
+        self.config = config
+        self.archive = archive
+        self.logbook = logbook
+        self.gen = gen
+
+    def merged(self, logbook):
+        """Returns the logbook of the checkpoint followed by *logbook*."""
+        if self.logbook is None:
+            return logbook
+        merged = tools.Logbook()
+        merged.header = logbook.header
+        for record in self.logbook:
+            merged.record(**record)
+        # Generation 0 of a resumed run repeats the checkpoint
+        for record in logbook[1:]:
+            merged.record(**dict(record, gen=record['gen'] + self.gen))
+        return merged
+
+    def update(self, population, halloffame, logbook, gen):
+        """Saves a checkpoint if *gen* is a multiple of freq."""
+        if (gen % self.freq == 0):
+            if self.archive is not None:
+                self.archive.flush()
+            save_checkpoint(self.filename, population, halloffame,
+                            self.merged(logbook), gen + self.gen, self.fit_cache,
+                            self.config)
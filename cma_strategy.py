@@ -0,0 +1,164 @@
+""" CMA-ES strategy for algorithms.eaGenerateUpdate.
+
+CMAStrategy samples the genomes in an unbounded internal space: the
+conductances as their log and phi through the logistic function, so every
+sampled conductance is positive and phi is in [0,1). The covariance is the
+full matrix of CMA-ES, or with diagonal=True only its diagonal
+(sep-CMA-ES, Ros & Hansen 2008), which learns faster and scales linearly
+with the number of parameters.
+
+    strategy = CMAStrategy.from_population(toolbox.population(n=MU), lambda_=LAMBDA)
+    toolbox.register("generate", strategy.generate, creator.Individual, creator.Strategy)
+    toolbox.register("update", strategy.update)
+    pop, logbook = eaGenerateUpdate(toolbox, ngen=NGEN, stats=stats, halloffame=hof)
+
+The strategy of a generated individual is the step size sigma * sqrt(C_ii)
+of every internal coordinate, the counterpart of the lognormal shape of the
+(mu,lambda) ES strategies.
+"""
+
+import math
+from operator import attrgetter
+import numpy as np
+
+from es_variation import get_rng
+
+
+# Largest phi, so that the logistic never rounds up to 1.
+_PHI_MAX = 1.0 - 1e-12
+# Smallest conductance before taking its log.
+_TINY = 1e-12
+
+
+def to_internal(genomes):
+    """Returns the internal coordinates of the (n, D) *genomes*."""
+    genomes = np.asarray(genomes, dtype=np.float64)
+    phi = np.clip(genomes[..., :1], _TINY, _PHI_MAX)
+    return np.concatenate((np.log(phi / (1.0 - phi)),
+                           np.log(np.maximum(genomes[..., 1:], _TINY))), axis=-1)
+
+
+def from_internal(y):
+    """Returns the genomes of the (n, D) internal coordinates *y*."""
+    y = np.asarray(y, dtype=np.float64)
+    phi = np.minimum(1.0 / (1.0 + np.exp(-y[..., :1])), _PHI_MAX)
+    return np.concatenate((phi, np.exp(y[..., 1:])), axis=-1)
+
+
+class CMAStrategy:
+    """ (mu/mu_w, lambda)-CMA-ES in the internal coordinates.
+    Attributes:
+      centroid: Initial genome of the mean.
+      sigma: Initial step size in the internal coordinates.
+      lambda_: Number of individuals per generation (default 4 + 3 ln(D)).
+      mu: Number of individuals the mean is recombined from (lambda_ / 2).
+      diagonal: Whether only the diagonal of the covariance is adapted.
+      rng: numpy.random.Generator, seeded from the random module if None.
+    """
+
+    def __init__(self, centroid, sigma=1.0, lambda_=None, mu=None, diagonal=False,
+                 rng=None):
+        self.mean = to_internal(centroid)
+        self.dim = len(self.mean)
+        self.sigma = sigma
+        self.lambda_ = lambda_ if lambda_ is not None else 4 + int(3 * math.log(self.dim))
+        self.mu = mu if mu is not None else self.lambda_ // 2
+        self.diagonal = diagonal
+        self.rng = get_rng(rng)
+
+        # Recombination weights
+        w = math.log(self.mu + 0.5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = w / w.sum()
+        self.mueff = 1.0 / np.sum(self.weights**2)
+
+        # Learning rates
+        n = self.dim
+        self.cc = (4.0 + self.mueff / n) / (n + 4.0 + 2.0 * self.mueff / n)
+        self.cs = (self.mueff + 2.0) / (n + self.mueff + 5.0)
+        self.c1 = 2.0 / ((n + 1.3)**2 + self.mueff)
+        self.cmu = min(1.0 - self.c1, 2.0 * (self.mueff - 2.0 + 1.0 / self.mueff) /
+                       ((n + 2.0)**2 + self.mueff))
+        if diagonal:
+            self.c1 = min(1.0, self.c1 * (n + 2.0) / 3.0)
+            self.cmu = min(1.0 - self.c1, self.cmu * (n + 2.0) / 3.0)
+        self.damps = 1.0 + 2.0 * max(0.0, math.sqrt((self.mueff - 1.0) / (n + 1.0)) - 1.0) + self.cs
+        self.chiN = math.sqrt(n) * (1.0 - 1.0 / (4.0 * n) + 1.0 / (21.0 * n**2))
+
+        # Evolution paths and covariance
+        self.pc = np.zeros(n)
+        self.ps = np.zeros(n)
+        if diagonal:
+            self.C = np.ones(n)
+        else:
+            self.C = np.eye(n)
+            self.B = np.eye(n)
+            self.D = np.ones(n)
+        self.update_count = 0
+
+    @classmethod
+    def from_population(cls, population, **kargs):
+        """Returns a CMAStrategy centred on the geometric mean of the
+        genomes of *population*, with the average spread of their internal
+        coordinates as sigma."""
+        y = to_internal(np.array(population, dtype=np.float64))
+        kargs.setdefault('sigma', float(np.mean(np.std(y, axis=0))))
+        return cls(from_internal(y.mean(axis=0)), **kargs)
+
+    def _scales(self):
+        # Standard deviation of every internal coordinate
+        return self.sigma * np.sqrt(self.C if self.diagonal else np.diag(self.C))
+
+    def generate(self, ind_init, strategy_clss=None):
+        """Returns lambda_ new individuals of class *ind_init*, with the step
+        sizes as strategy of class *strategy_clss* if given."""
+        z = self.rng.standard_normal((self.lambda_, self.dim))
+        if self.diagonal:
+            y = self.mean + self.sigma * z * np.sqrt(self.C)
+        else:
+            y = self.mean + self.sigma * (z * self.D) @ self.B.T
+        scales = self._scales().tolist()
+        population = []
+        for genome in from_internal(y):
+            ind = ind_init(genome.tolist())
+            if strategy_clss is not None:
+                ind.strategy = strategy_clss(scales)
+            population.append(ind)
+        return population
+
+    def update(self, population):
+        """Updates the mean, step size and covariance from the evaluated
+        *population*."""
+        population = sorted(population, key=attrgetter("fitness"), reverse=True)
+        y = to_internal(np.array(population[:self.mu], dtype=np.float64))
+        old_mean = self.mean
+        self.mean = self.weights @ y
+        c_diff = (self.mean - old_mean) / self.sigma
+
+        # Step size path, in the coordinates where C is the identity
+        if self.diagonal:
+            c_diff_white = c_diff / np.sqrt(self.C)
+        else:
+            c_diff_white = self.B @ ((self.B.T @ c_diff) / self.D)
+        self.ps = ((1.0 - self.cs) * self.ps +
+                   math.sqrt(self.cs * (2.0 - self.cs) * self.mueff) * c_diff_white)
+        self.update_count += 1
+        norm_ps = np.linalg.norm(self.ps)
+        hsig = (norm_ps / math.sqrt(1.0 - (1.0 - self.cs)**(2 * self.update_count)) / self.chiN <
+                1.4 + 2.0 / (self.dim + 1.0))
+        self.pc = ((1.0 - self.cc) * self.pc +
+                   hsig * math.sqrt(self.cc * (2.0 - self.cc) * self.mueff) * c_diff)
+
+        # Rank-one and rank-mu updates of the covariance
+        artmp = (y - old_mean) / self.sigma
+        decay = 1.0 - self.c1 - self.cmu + (1.0 - hsig) * self.c1 * self.cc * (2.0 - self.cc)
+        if self.diagonal:
+            self.C = (decay * self.C + self.c1 * self.pc**2 +
+                      self.cmu * (self.weights @ artmp**2))
+        else:
+            self.C = (decay * self.C + self.c1 * np.outer(self.pc, self.pc) +
+                      self.cmu * (self.weights * artmp.T) @ artmp)
+            self.C = np.triu(self.C) + np.triu(self.C, 1).T
+            D2, self.B = np.linalg.eigh(self.C)
+            self.D = np.sqrt(np.maximum(D2, _TINY))
+
+        self.sigma *= math.exp((norm_ps / self.chiN - 1.0) * self.cs / self.damps)
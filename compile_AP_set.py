@@ -0,0 +1,39 @@
+""" Compiles an AP set directory into a single memory-mappable .npz bundle """
+
+import sys
+import os
+
+from cell_recording import ExperimentalAPSet, bundle_filename
+
+
+def main(argv):
+    if (len(argv) < 5 or len(argv) > 6):
+        print('compile_AP_set.py AP_dir file_prefix file_suffix cell_id dc_ik1 [bundle]')
+        return
+    elif (os.path.exists(argv[0]) is False):
+        print('Cannot find AP set directory: '+argv[0])
+        return
+    else:
+        try:
+            cell_id = int(argv[3])
+        except ValueError:
+            cell_id = argv[3]
+        try:
+            dc_ik1 = float(argv[4])
+        except ValueError:
+            print('dc_ik1 must be a number.')
+            return
+        if (len(argv) == 6):
+            bundle = argv[5]
+        else:
+            bundle = bundle_filename(argv[0])
+
+        cell = ExperimentalAPSet(path=argv[0], file_prefix=argv[1],
+                                 file_suffix=argv[2], cell_id=cell_id, dc_ik1=dc_ik1)
+        cell.write_bundle(bundle)
+        print('APs: '+' '.join(cell.ap_keys))
+        print('Bundle: '+bundle)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
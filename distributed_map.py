@@ -0,0 +1,466 @@
+""" Distributed evaluation backend for toolbox.map.
+
+A broker holds a work queue of genomes. Workers on any host connect to it,
+evaluate the genomes and send the fitnesses back. Workers send heartbeats
+while they run a task, and the tasks of a worker that stops sending them
+are put back in the queue up to max_retries times. The client side,
+DistributedMap, is a drop-in for toolbox.map and toolbox.submit.
+
+Start a broker and workers from the command line:
+  python distributed_map.py broker HOST:PORT
+  python distributed_map.py worker HOST:PORT [N_PROCESSES]
+or on a single machine from python with start_broker() and
+start_workers(). An address without a port is a Unix socket path.
+The workers must be able to import the module defining the evaluate
+function (e.g. iPSC_DEAP_fit) and the AP set files it opens. The caches
+bound to that function are kept in memory on the workers, or in the local
+directory given with --cache-dir, not at the driver's paths.
+
+The broker unpickles what clients send and the workers run it, so every
+connection is authenticated with a shared key, taken from the
+EA_BROKER_AUTHKEY environment variable or the --authkey argument. A broker
+started without a key listens only on the loopback interface (or a Unix
+socket) with a random key that it prints for the workers.
+"""
+
+import os
+import sys
+import time
+import uuid
+import pickle
+import socket
+import hashlib
+import secrets
+import ipaddress
+import threading
+from collections import deque
+from concurrent.futures import Future
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager
+
+import fitness_cache
+import steady_state_cache
+
+
+# Key shared by the broker, its clients and workers (None if not set).
+AUTHKEY = os.environ.get('EA_BROKER_AUTHKEY') or None
+
+
+class Broker:
+    """ Work queue shared by clients and workers.
+    Attributes:
+      heartbeat_timeout: Seconds without a heartbeat after which a worker is
+                         considered lost and its tasks are put back in the
+                         queue.
+      max_retries: Number of times a lost task is put back in the queue
+                   before it fails.
+    """
+
+    def __init__(self, heartbeat_timeout=60.0, max_retries=3):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.functions = {}
+        self.tasks = {}
+        self.queue = deque()
+        self.running = {}
+        self.results = {}
+        self.workers = {}
+
+    def has_function(self, func_id):
+        with self.lock:
+            return func_id in self.functions
+
+    def add_function(self, func_id, data):
+        """Stores the pickled evaluate function *data* under *func_id*."""
+        with self.lock:
+            self.functions[func_id] = data
+
+    def get_function(self, func_id):
+        with self.lock:
+            return self.functions[func_id]
+
+    def put_task(self, client_id, task_id, func_id, genome):
+        """Adds the evaluation of *genome* with *func_id* to the queue."""
+        with self.lock:
+            self.tasks[task_id] = [client_id, func_id, genome, 0]
+            self.results.setdefault(client_id, {})
+            self.queue.append(task_id)
+
+    def get_task(self, worker_id):
+        """Returns the next (task_id, func_id, genome) for *worker_id*, or
+        None if the queue is empty."""
+        with self.lock:
+            self.workers[worker_id] = time.time()
+            self._requeue_lost()
+            while self.queue:
+                task_id = self.queue.popleft()
+                if task_id in self.tasks:
+                    self.running[task_id] = worker_id
+                    _, func_id, genome, _ = self.tasks[task_id]
+                    return task_id, func_id, genome
+            return None
+
+    def heartbeat(self, worker_id):
+        with self.lock:
+            self.workers[worker_id] = time.time()
+
+    def put_result(self, worker_id, task_id, ok, value):
+        """Stores the result of *task_id*. Results of tasks that already have
+        one (e.g. a lost worker coming back) are dropped."""
+        with self.lock:
+            self.workers[worker_id] = time.time()
+            task = self.tasks.pop(task_id, None)
+            self.running.pop(task_id, None)
+            if task is not None:
+                self.results[task[0]][task_id] = (ok, value)
+
+    def take_results(self, client_id):
+        """Returns and removes the results of *client_id* as a dict of
+        task_id: (ok, value)."""
+        with self.lock:
+            self._requeue_lost()
+            results = self.results.get(client_id, {})
+            self.results[client_id] = {}
+            return results
+
+    def status(self):
+        """Returns the number of queued and running tasks and of workers."""
+        with self.lock:
+            now = time.time()
+            alive = [i for i, t in self.workers.items()
+                     if (now - t) < self.heartbeat_timeout]
+            return {'queued': len(self.queue), 'running': len(self.running),
+                    'workers': len(alive)}
+
+    def _requeue_lost(self):
+        now = time.time()
+        lost = [i for i, t in self.workers.items()
+                if (now - t) > self.heartbeat_timeout]
+        if not lost:
+            return
+        for task_id, worker_id in list(self.running.items()):
+            if worker_id not in lost:
+                continue
+            del self.running[task_id]
+            task = self.tasks[task_id]
+            task[3] += 1
+            if (task[3] > self.max_retries):
+                del self.tasks[task_id]
+                self.results[task[0]][task_id] = (False, 'Task lost '+str(task[3])+' times.')
+            else:
+                self.queue.appendleft(task_id)
+        for i in lost:
+            del self.workers[i]
+
+
+class BrokerManager(BaseManager):
+    pass
+
+
+# Broker of the manager server process.
+_BROKER = None
+
+
+def _init_broker(heartbeat_timeout, max_retries):
+    global _BROKER
+    _BROKER = Broker(heartbeat_timeout, max_retries)
+
+
+def _get_broker():
+    global _BROKER
+    if _BROKER is None:
+        _BROKER = Broker()
+    return _BROKER
+
+
+BrokerManager.register('get_broker', callable=_get_broker)
+
+
+def parse_address(address):
+    """Returns a (host, port) tuple for 'HOST:PORT' and the string itself
+    (a Unix socket path) otherwise."""
+    if isinstance(address, str) and ':' in address:
+        host, port = address.rsplit(':', 1)
+        return (host, int(port))
+    return address
+
+
+def is_local(address):
+    """Returns whether the parsed *address* is a Unix socket path or a
+    loopback host."""
+    if not isinstance(address, tuple):
+        return True
+    host = address[0]
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def get_authkey(authkey=None):
+    """Returns *authkey*, or the EA_BROKER_AUTHKEY key, as bytes. Raises a
+    ValueError if neither is set."""
+    if authkey is None:
+        authkey = AUTHKEY
+    if not authkey:
+        raise ValueError('No broker key: set EA_BROKER_AUTHKEY or pass --authkey')
+    if isinstance(authkey, str):
+        authkey = authkey.encode()
+    return authkey
+
+
+def broker_authkey(address, authkey=None):
+    """Returns the key of a broker listening at *address*: *authkey* or the
+    EA_BROKER_AUTHKEY key if set, else a random key, allowed only on a local
+    *address*."""
+    if authkey is None and not AUTHKEY:
+        if not is_local(parse_address(address)):
+            raise ValueError('Refusing to listen on '+str(address)+' without a key: '
+                             'set EA_BROKER_AUTHKEY or pass --authkey')
+        return secrets.token_hex(32).encode()
+    return get_authkey(authkey)
+
+
+def connect(address, authkey=None):
+    """Returns a proxy of the broker at *address*."""
+    manager = BrokerManager(parse_address(address), get_authkey(authkey))
+    manager.connect()
+    return manager.get_broker()
+
+
+def serve_broker(address, authkey=None, heartbeat_timeout=60.0, max_retries=3):
+    """Runs a broker at *address* in this process until it is killed."""
+    generated = authkey is None and not AUTHKEY
+    authkey = broker_authkey(address, authkey)
+    _init_broker(heartbeat_timeout, max_retries)
+    manager = BrokerManager(parse_address(address), authkey)
+    server = manager.get_server()
+    print('Broker listening on '+str(server.address))
+    if generated:
+        print('Broker key (EA_BROKER_AUTHKEY of the workers): '+authkey.decode())
+    server.serve_forever()
+
+
+def start_broker(address=('127.0.0.1', 0), authkey=None, heartbeat_timeout=60.0,
+                 max_retries=3):
+    """Starts a broker in a child process and returns its manager. The
+    address actually used is manager.address and the key manager.authkey
+    (random if none is set, see broker_authkey). Call manager.shutdown()
+    when done."""
+    authkey = broker_authkey(address, authkey)
+    manager = BrokerManager(parse_address(address), authkey)
+    manager.start(_init_broker, (heartbeat_timeout, max_retries))
+    manager.authkey = authkey
+    return manager
+
+
+def run_worker(address, authkey=None, heartbeat_interval=5.0, poll_interval=0.5,
+               cache_dir=None):
+    """Evaluates tasks of the broker at *address* until the broker goes
+    away. The fitness and steady-state caches bound to the evaluate
+    functions are kept in *cache_dir*, a directory of this host, or only in
+    memory if it is None, never at the driver's paths."""
+    authkey = get_authkey(authkey)
+    fitness_cache.relocate(cache_dir)
+    steady_state_cache.relocate(cache_dir)
+    broker = connect(address, authkey)
+    worker_id = socket.gethostname()+':'+str(os.getpid())+':'+uuid.uuid4().hex[:8]
+    functions = {}
+
+    # Heartbeats are sent from a separate connection while a task runs
+    stop = threading.Event()
+
+    def beat():
+        hb = connect(address, authkey)
+        while not stop.wait(heartbeat_interval):
+            try:
+                hb.heartbeat(worker_id)
+            except (EOFError, OSError):
+                return
+
+    threading.Thread(target=beat, daemon=True).start()
+    try:
+        while True:
+            try:
+                task = broker.get_task(worker_id)
+            except (EOFError, OSError):
+                return
+            if task is None:
+                time.sleep(poll_interval)
+                continue
+            task_id, func_id, genome = task
+            try:
+                if func_id not in functions:
+                    functions[func_id] = pickle.loads(broker.get_function(func_id))
+                ok, value = True, functions[func_id](genome)
+            except Exception as e:
+                ok, value = False, repr(e)
+            try:
+                broker.put_result(worker_id, task_id, ok, value)
+            except (EOFError, OSError):
+                return
+    finally:
+        stop.set()
+
+
+def start_workers(address, n, authkey=None, **kargs):
+    """Starts *n* local worker processes for the broker at *address* and
+    returns them."""
+    authkey = get_authkey(authkey)
+    workers = []
+    for _ in range(n):
+        w = Process(target=run_worker, args=(address, authkey), kwargs=kargs, daemon=True)
+        w.start()
+        workers.append(w)
+    return workers
+
+
+class RemoteEvaluationError(Exception):
+    """Raised for a task that failed on a worker or was lost too often."""
+
+
+class DistributedMap:
+    """ Client of a broker usable as toolbox.map and toolbox.submit.
+    Functions are pickled and sent to the broker once; tasks only carry
+    the genome as a list of floats.
+    Attributes:
+      address: Broker address, (host, port) or a Unix socket path.
+      authkey: Key of the broker (default EA_BROKER_AUTHKEY).
+      poll_interval: Seconds between polls of the broker for results.
+    """
+
+    def __init__(self, address, authkey=None, poll_interval=0.05):
+        self.address = parse_address(address)
+        self.authkey = get_authkey(authkey)
+        self.poll_interval = poll_interval
+        self.client_id = uuid.uuid4().hex
+        self.broker = connect(self.address, self.authkey)
+        self._func_ids = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        self._poller = None
+        self._closed = False
+
+    def _func_id(self, func):
+        key = id(func)
+        if key not in self._func_ids:
+            data = pickle.dumps(func)
+            func_id = hashlib.sha1(data).hexdigest()
+            if not self.broker.has_function(func_id):
+                self.broker.add_function(func_id, data)
+            # Keep func alive so that its id is not reused
+            self._func_ids[key] = (func_id, func)
+        return self._func_ids[key][0]
+
+    def submit(self, func, ind):
+        """Queues the evaluation of *ind* with *func* and returns a
+        concurrent.futures.Future of the result."""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        task_id = uuid.uuid4().hex
+        with self._lock:
+            self._futures[task_id] = future
+        try:
+            self.broker.put_task(self.client_id, task_id, self._func_id(func),
+                                 [float(i) for i in ind])
+        except Exception:
+            with self._lock:
+                self._futures.pop(task_id, None)
+            raise
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, daemon=True)
+                self._poller.start()
+        return future
+
+    def map(self, func, iterable):
+        """Drop-in for toolbox.map."""
+        futures = [self.submit(func, ind) for ind in iterable]
+        return [f.result() for f in futures]
+
+    def _poll(self):
+        while not self._closed:
+            with self._lock:
+                waiting = bool(self._futures)
+            if waiting:
+                try:
+                    results = self.broker.take_results(self.client_id)
+                except Exception as e:
+                    # The queue of a lost or restarted broker is gone, so
+                    # the pending tasks fail instead of waiting forever
+                    self._fail(RemoteEvaluationError('Lost the broker: '+repr(e)))
+                    return
+                for task_id, (ok, value) in results.items():
+                    with self._lock:
+                        future = self._futures.pop(task_id, None)
+                    if future is None:
+                        continue
+                    if ok:
+                        future.set_result(value)
+                    else:
+                        future.set_exception(RemoteEvaluationError(value))
+            time.sleep(self.poll_interval)
+
+    def _fail(self, error):
+        # Sets *error* as the exception of every pending future
+        with self._lock:
+            futures = list(self._futures.values())
+            self._futures = {}
+            self._poller = None
+        for future in futures:
+            future.set_exception(error)
+
+    def close(self):
+        """Stops polling the broker."""
+        self._closed = True
+        poller = self._poller
+        if poller is not None:
+            poller.join()
+
+    def terminate(self):
+        """Stops polling the broker and fails the pending futures. Their
+        tasks are left to the workers of the broker."""
+        self.close()
+        self._fail(RemoteEvaluationError('client terminated'))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
+
+
+def main(argv):
+    authkey = None
+    if ('--authkey' in argv[:-1]):
+        # The environment variable keeps the key out of the process list
+        i = argv.index('--authkey')
+        authkey = argv[i+1]
+        argv = argv[:i] + argv[i+2:]
+    cache_dir = None
+    if ('--cache-dir' in argv[:-1]):
+        # Local directory of the caches of the workers of this host
+        i = argv.index('--cache-dir')
+        cache_dir = argv[i+1]
+        argv = argv[:i] + argv[i+2:]
+    if (len(argv) < 2 or argv[0] not in ('broker', 'worker')):
+        print('python distributed_map.py broker HOST:PORT [--authkey KEY]')
+        print('python distributed_map.py worker HOST:PORT [N_PROCESSES] [--authkey KEY] '
+              '[--cache-dir DIR]')
+        return
+    if (argv[0] == 'broker'):
+        serve_broker(argv[1], authkey)
+    else:
+        n = int(argv[2]) if len(argv) > 2 else os.cpu_count()
+        for w in start_workers(argv[1], n, authkey, cache_dir=cache_dir):
+            w.join()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+""" Batched ES variation over a population matrix.
+
+vary_es produces all offspring of a generation at once from the (N, D)
+genome and strategy matrices of the parents. It follows varOr with the
+mutateES and cxESBlend operators of the fitting scripts:
+  crossover (cxpb): blend of two distinct parents, only the first child is
+                    kept (cxESBlend),
+  mutation (mutpb): every gene is, with probability indpb, multiplied by a
+                    lognormal factor with the gene's strategy as shape, as is
+                    the strategy itself (mutateES); a phi above 1 is reset,
+  reproduction:     the parent itself.
+"""
+
+import random
+import numpy as np
+
+from population import PopulationArrays, new_ids
+
+
+def get_rng(rng=None):
+    """Returns *rng*, or a Generator seeded from the random module so that
+    random.seed keeps runs reproducible."""
+    if rng is None:
+        return np.random.default_rng(random.getrandbits(64))
+    return rng
+
+
+def vary_es(genomes, strategies, lambda_, cxpb, mutpb, alpha=0.3, indpb=0.3,
+            rng=None, return_parents=False):
+    """Returns the genomes and strategies of *lambda_* offspring and, for
+    each offspring, the index of the reproduced parent or -1 if it is new.
+    With *return_parents* the (lambda_, 2) indices of the parents of every
+    offspring (-1 for no second parent) are returned as well.
+    """
+    assert (cxpb + mutpb) <= 1.0, (
+        "The sum of the crossover and mutation probabilities must be smaller "
+        "or equal to 1.0.")
+    rng = get_rng(rng)
+    n, d = genomes.shape
+
+    # Choose the operation and the parents of every offspring
+    op_choice = rng.random(lambda_)
+    cx = np.flatnonzero(op_choice < cxpb)
+    mut = np.flatnonzero((op_choice >= cxpb) & (op_choice < cxpb + mutpb))
+    p1 = rng.integers(n, size=lambda_)
+    x = genomes[p1]
+    s = strategies[p1]
+
+    # Blend crossover with a second, distinct parent
+    parents = np.full((lambda_, 2), -1, dtype=np.int64)
+    parents[:, 0] = p1
+    if (cx.size > 0):
+        p2 = rng.integers(n - 1, size=cx.size)
+        p2 += (p2 >= p1[cx])
+        parents[cx, 1] = p2
+        gamma = 1.0 - rng.random((cx.size, d)) * alpha
+        x[cx] = gamma * genomes[p1[cx]] + (1.0 - gamma) * genomes[p2]
+        gamma = 1.0 - rng.random((cx.size, d)) * alpha
+        s[cx] = (1.0 - gamma) * strategies[p1[cx]] + gamma * strategies[p2]
+
+    # Lognormal self-adaptive mutation
+    if (mut.size > 0):
+        sigma = s[mut]
+        mask = rng.random((mut.size, d)) < indpb
+        x[mut] *= np.where(mask, rng.lognormal(0.0, sigma), 1.0)
+        s[mut] *= np.where(mask, rng.lognormal(0.0, sigma), 1.0)
+        # Check that Phi is [0:1)
+        reset = mut[x[mut, 0] > 1.0]
+        x[reset, 0] = rng.random(reset.size)
+        s[reset, 0] = rng.random(reset.size)
+
+    source = np.full(lambda_, -1, dtype=np.int64)
+    rep = np.ones(lambda_, dtype=bool)
+    rep[cx] = False
+    rep[mut] = False
+    source[rep] = p1[rep]
+    if return_parents:
+        return x, s, source, parents
+    return x, s, source
+
+
+def varOrES(population, toolbox, lambda_, cxpb, mutpb, alpha=0.3, indpb=0.3,
+            rng=None):
+    """Drop-in for algorithms.varOr with the mutateES and cxESBlend
+    operators. The offspring are built with vary_es, new offspring are
+    instances of the population's individual and strategy classes with an
+    invalid fitness and reproduced offspring are the parents themselves,
+    as in varOr. *toolbox* is not used."""
+    genomes = np.array(population, dtype=np.float64)
+    strategies = np.array([ind.strategy for ind in population], dtype=np.float64)
+    x, s, source = vary_es(genomes, strategies, lambda_, cxpb, mutpb, alpha,
+                           indpb, rng)
+    ind_clss = type(population[0])
+    strategy_clss = type(population[0].strategy)
+    offspring = []
+    for i in range(lambda_):
+        if (source[i] >= 0):
+            offspring.append(population[source[i]])
+        else:
+            ind = ind_clss(x[i].tolist())
+            ind.strategy = strategy_clss(s[i].tolist())
+            offspring.append(ind)
+    return offspring
+
+
+def varOrArrays(population, toolbox, lambda_, cxpb, mutpb, alpha=0.3, indpb=0.3,
+                rng=None):
+    """Drop-in for algorithms.varOr on a population.PopulationArrays. Returns
+    the offspring as a new PopulationArrays; reproduced offspring keep the
+    fitness, fidelity, ID and parent IDs of their parent. *toolbox* is not
+    used."""
+    x, s, source, parents = vary_es(population.genomes, population.strategies,
+                                    lambda_, cxpb, mutpb, alpha, indpb, rng,
+                                    return_parents=True)
+    rep = (source >= 0)
+    fitness = np.where(rep, population.fitness[np.maximum(source, 0)], np.nan)
+    ids = new_ids(lambda_)
+    ids[rep] = population.ids[source[rep]]
+    parent_ids = np.where(parents >= 0, population.ids[np.maximum(parents, 0)], -1)
+    parent_ids[rep] = population.parents[source[rep]]
+    fidelity = np.where(rep, population.fidelity[np.maximum(source, 0)], -1)
+    return PopulationArrays(x, s, fitness, population.weights, ids, parent_ids,
+                            fidelity)
@@ -0,0 +1,114 @@
+import array as arr
+from concurrent.futures import Future
+from multiprocessing import Pool, cpu_count
+
+
+# Evaluation functions of a worker process, set once by _init_worker.
+_FUNCTIONS = ()
+
+
+def _init_worker(*functions):
+    global _FUNCTIONS
+    _FUNCTIONS = functions
+
+
+def _evaluate_genome(f, genome):
+    return _FUNCTIONS[f](genome)
+
+
+def _evaluate_task(task):
+    i, f, genome = task
+    return i, _FUNCTIONS[f](genome)
+
+
+class EvaluationPool:
+    """ Process pool evaluating genomes for toolbox.map. Each worker receives
+    the evaluation function (with the experimental AP set and caches bound
+    to it) once when it starts, and afterwards only the genomes as plain
+    array('d') objects. Results are streamed back with imap_unordered and
+    returned in the order of the individuals.
+    Attributes:
+      evaluate: The registered toolbox.evaluate.
+      others: Other functions of the genomes sent to the workers once in the
+              same way, e.g. the coarse fitness of multi_fidelity.
+      processes: Number of worker processes (default cpu_count()).
+      chunksize: Genomes per task. The default gives each worker about
+                 four chunks of every population.
+
+    Use it as a context manager, or call close() when done:
+      with EvaluationPool(toolbox.evaluate) as pool:
+          toolbox.register("map", pool.map)
+          ...
+    """
+
+    def __init__(self, evaluate, processes=None, chunksize=None, others=()):
+        self.evaluate = evaluate
+        self.others = tuple(others)
+        self.processes = processes if processes is not None else cpu_count()
+        self.chunksize = chunksize
+        self.functions = (evaluate,) + self.others
+        self.pool = Pool(self.processes, initializer=_init_worker,
+                         initargs=self.functions)
+
+    def _index(self, func):
+        # Index of func among the functions of the workers, or None
+        for f, function in enumerate(self.functions):
+            if func is function:
+                return f
+        return None
+
+    def get_chunksize(self, n):
+        """Returns the chunk size used for a population of *n* genomes."""
+        if self.chunksize is not None:
+            return self.chunksize
+        chunksize, extra = divmod(n, self.processes * 4)
+        if extra:
+            chunksize += 1
+        return max(chunksize, 1)
+
+    def map(self, func, iterable):
+        """Drop-in for toolbox.map. Only calls of the evaluate function (and
+        of the others) go through the initialized workers, anything else is
+        sent to Pool.map."""
+        f = self._index(func)
+        if f is None:
+            return self.pool.map(func, iterable)
+        tasks = [(i, f, arr.array('d', ind)) for i, ind in enumerate(iterable)]
+        results = [None] * len(tasks)
+        for i, fit in self.pool.imap_unordered(_evaluate_task, tasks,
+                                               self.get_chunksize(len(tasks))):
+            results[i] = fit
+        return results
+
+    def submit(self, func, ind):
+        """Drop-in for toolbox.submit. Evaluates *ind* on the initialized
+        workers and returns a concurrent.futures.Future of its fitness."""
+        future = Future()
+        future.set_running_or_notify_cancel()
+        f = self._index(func)
+        if f is None:
+            task, args = func, (ind,)
+        else:
+            task, args = _evaluate_genome, (f, arr.array('d', ind))
+        self.pool.apply_async(task, args, callback=future.set_result,
+                              error_callback=future.set_exception)
+        return future
+
+    def close(self):
+        """Waits for the workers to finish and shuts the pool down."""
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        """Stops the workers immediately."""
+        self.pool.terminate()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.terminate()
@@ -0,0 +1,168 @@
+import os
+import json
+import inspect
+import sqlite3
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+
+# In-memory tier and SQLite connection shared by every FitnessCache of a
+# process with the same path (see steady_state_cache._MEMORY).
+_MEMORY = {}
+
+# Directory of the databases of the caches unpickled in this process (see
+# relocate), False to keep their own path.
+_LOCAL_DIR = False
+
+
+def relocate(directory):
+    """Keeps the database of every FitnessCache unpickled from now on in this
+    process in *directory* instead of its own path, or only in memory if
+    *directory* is None. Remote workers use it, as the driver's path may not
+    exist on their host and SQLite in WAL mode does not work on network
+    filesystems."""
+    global _LOCAL_DIR
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    _LOCAL_DIR = directory
+
+
+class FitnessCache:
+    """ Content-addressed cache of AP set scores. An entry is keyed by a hash
+    of the genome together with the dynamic-clamp IK1, the cell ID, the
+    simulation settings (see simulation_settings) and a namespace. Scores are kept in an LRU
+    in-memory tier and, if a path is given, in an SQLite database shared by
+    every worker process and later runs.
+    Attributes:
+      path: SQLite database file (None keeps the cache in memory).
+      maxsize: Maximum number of entries of the in-memory tier.
+      namespace: Identifier of the simulation/scoring settings.
+    """
+
+    def __init__(self, path=None, maxsize=10000, namespace=''):
+        self.path = path
+        self.maxsize = maxsize
+        self.namespace = namespace
+        self._attach()
+
+    def __getstate__(self):
+        # Only the settings are sent to the workers
+        return {'path': self.path, 'maxsize': self.maxsize,
+                'namespace': self.namespace}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if (_LOCAL_DIR is not False and self.path is not None):
+            self.path = (None if _LOCAL_DIR is None
+                         else os.path.join(_LOCAL_DIR, os.path.basename(self.path)))
+        self._attach()
+
+    def _attach(self):
+        memory = _MEMORY.setdefault(self.path, {'lru': OrderedDict(),
+                                                'db': None, 'pid': None})
+        self._memory = memory
+        self.lru = memory['lru']
+
+    def _db(self):
+        """Returns the SQLite connection of this process."""
+        if self.path is None:
+            return None
+        # Connections are not shared with forked workers
+        if (self._memory['db'] is None or self._memory['pid'] != os.getpid()):
+            db = sqlite3.connect(self.path, timeout=60.0)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS fitness '
+                       '(key TEXT PRIMARY KEY, scores TEXT)')
+            db.commit()
+            self._memory['db'] = db
+            self._memory['pid'] = os.getpid()
+        return self._memory['db']
+
+    def key(self, ind, dc_ik1, cell_id, settings=''):
+        """Returns the cache key of the genome *ind* scored against the cell
+        *cell_id* recorded with *dc_ik1*, simulated with the *settings*
+        string of simulation_settings."""
+        h = hashlib.sha1(np.asarray(ind, dtype=np.float64).tobytes())
+        h.update(repr((float(dc_ik1), str(cell_id), self.namespace, settings)).encode())
+        return h.hexdigest()
+
+    def get(self, key):
+        """Returns the cached scores dict of *key*, or None."""
+        if key in self.lru:
+            self.lru.move_to_end(key)
+            return self.lru[key]
+        db = self._db()
+        if db is not None:
+            row = db.execute('SELECT scores FROM fitness WHERE key=?', (key,)).fetchone()
+            if row is not None:
+                scores = json.loads(row[0])
+                self._remember(key, scores)
+                return scores
+        return None
+
+    def put(self, key, scores):
+        """Stores the scores dict of *key* in both tiers."""
+        scores = {i: float(j) for i, j in scores.items()}
+        self._remember(key, scores)
+        db = self._db()
+        if db is not None:
+            db.execute('INSERT OR REPLACE INTO fitness VALUES (?, ?)',
+                       (key, json.dumps(scores)))
+            db.commit()
+
+    def dump(self):
+        """Returns the entries of the in-memory tier as (key, scores) pairs."""
+        return list(self.lru.items())
+
+    def load(self, entries):
+        """Adds dumped (key, scores) pairs to the in-memory tier."""
+        for key, scores in entries:
+            self._remember(key, scores)
+
+    def _remember(self, key, scores):
+        self.lru[key] = scores
+        self.lru.move_to_end(key)
+        while len(self.lru) > self.maxsize:
+            self.lru.popitem(last=False)
+
+    def __len__(self):
+        db = self._db()
+        if db is None:
+            return len(self.lru)
+        return db.execute('SELECT COUNT(*) FROM fitness').fetchone()[0]
+
+
+def simulation_settings(**kargs):
+    """Returns a string of the settings of a run_ind_dclamp call with
+    *kargs* that change the simulated APs: its pacing and protocol
+    arguments, with their defaults for the ones not in *kargs*, and whether
+    the control is warm-started from a steady-state cache."""
+    from run_dclamp_simulation import run_ind_dclamp
+    params = inspect.signature(run_ind_dclamp).parameters
+    settings = {name: kargs.get(name, p.default) for name, p in params.items()
+                if name not in ('ind', 'dc_ik1', 'printIND', 'ss_cache')}
+    settings['warm_start'] = kargs.get('ss_cache') is not None
+    return repr(sorted(settings.items()))
+
+
+def cached_score(ExperAPSet, ind, fit_cache=None, **kargs):
+    """Returns the scores dict of *ind* against *ExperAPSet*, simulating the
+    individual with run_ind_dclamp (called with *kargs*) only if its scores
+    are not in *fit_cache* for the same simulation settings. If *kargs* has
+    conditions, only their APs are scored."""
+    from run_dclamp_simulation import run_ind_dclamp
+    if fit_cache is not None:
+        key = fit_cache.key(ind, ExperAPSet.dc_ik1, ExperAPSet.cell_id,
+                            simulation_settings(**kargs))
+        scores = fit_cache.get(key)
+        if scores is not None:
+            return scores
+    model_APSet = run_ind_dclamp(ind, dc_ik1=ExperAPSet.dc_ik1, **kargs)
+    keys = None
+    if kargs.get('conditions') is not None:
+        keys = [key for key, _, _ in kargs['conditions']]
+    scores = ExperAPSet.score(model_APSet, keys=keys)
+    if fit_cache is not None:
+        fit_cache.put(key, scores)
+    return scores
@@ -0,0 +1,187 @@
+""" Append-only columnar archive of the generations of a run.
+
+The archive is a directory of chunks. Each chunk is an uncompressed .npz
+holding the rows of one or more generations as columns:
+  gen:      (n,) int64 generation number
+  genome:   (n, D) float64 genes
+  strategy: (n, D) float64 ES strategies
+  fitness:  (n,) float64 fitness (sum of a fitness vector), NaN if invalid
+  id:       (n,) int64 individual ID, -1 if unknown
+  parents:  (n, 2) int64 parent IDs, -1 if none or unknown
+Chunks are named chunk_FIRSTGEN_LASTGEN_SEQ.npz, so reading a range of
+generations only opens the chunks that hold it. Chunks are written
+atomically and never modified, and a reopened archive keeps appending.
+
+GenerationArchive.append() only copies the columns. They are buffered and
+written by a background thread once chunk_rows rows are buffered and on
+flush() or close().
+"""
+
+import os
+import re
+import queue
+import threading
+import numpy as np
+
+
+COLUMNS = ('gen', 'genome', 'strategy', 'fitness', 'id', 'parents')
+
+_CHUNK = re.compile(r'^chunk_(\d+)_(\d+)_(\d+)\.npz$')
+_FLUSH = 'flush'
+
+
+def population_columns(population, gen):
+    """Returns the archive columns of *population* (a PopulationArrays or a
+    list of DEAP individuals with a strategy) at generation *gen*."""
+    n = len(population)
+    if hasattr(population, 'genomes'):
+        return {'gen': np.full(n, gen, dtype=np.int64),
+                'genome': population.genomes.copy(),
+                'strategy': population.strategies.copy(),
+                'fitness': population.fitness.copy(),
+                'id': population.ids.copy(),
+                'parents': population.parents.copy()}
+    return {'gen': np.full(n, gen, dtype=np.int64),
+            'genome': np.array(population, dtype=np.float64),
+            'strategy': np.array([ind.strategy for ind in population], dtype=np.float64),
+            'fitness': np.array([sum(ind.fitness.values) if ind.fitness.valid else np.nan
+                                 for ind in population]),
+            'id': np.full(n, -1, dtype=np.int64),
+            'parents': np.full((n, 2), -1, dtype=np.int64)}
+
+
+def list_chunks(path):
+    """Returns the (first gen, last gen, seq, filename) of the chunks of the
+    archive at *path* in the order they were written."""
+    chunks = []
+    if os.path.isdir(path):
+        for i in os.listdir(path):
+            m = _CHUNK.match(i)
+            if m is not None:
+                chunks.append((int(m.group(1)), int(m.group(2)), int(m.group(3)), i))
+    chunks.sort(key=lambda c: c[2])
+    return chunks
+
+
+def read_archive(path, first=None, last=None, columns=COLUMNS):
+    """Returns a dict of the *columns* of the rows of generations *first*
+    to *last* (inclusive, None for no bound) of the archive at *path*."""
+    parts = {c: [] for c in columns}
+    for g0, g1, _, filename in list_chunks(path):
+        if ((first is not None and g1 < first) or (last is not None and g0 > last)):
+            continue
+        with np.load(os.path.join(path, filename)) as data:
+            keep = np.ones(len(data['gen']), dtype=bool)
+            if first is not None:
+                keep &= (data['gen'] >= first)
+            if last is not None:
+                keep &= (data['gen'] <= last)
+            for c in columns:
+                parts[c].append(data[c][keep])
+    out = {}
+    for c in columns:
+        if parts[c]:
+            out[c] = np.concatenate(parts[c])
+        elif c in ('genome', 'strategy'):
+            out[c] = np.empty((0, 0))
+        elif c == 'parents':
+            out[c] = np.empty((0, 2), dtype=np.int64)
+        else:
+            out[c] = np.empty(0, dtype=(np.float64 if c == 'fitness' else np.int64))
+    return out
+
+
+def last_generation(path):
+    """Returns the last generation stored in the archive at *path*, or None
+    if it is empty."""
+    chunks = list_chunks(path)
+    if not chunks:
+        return None
+    return max(c[1] for c in chunks)
+
+
+class GenerationArchive:
+    """ Writer of an append-only generation archive.
+    Attributes:
+      path: Directory of the archive.
+      chunk_rows: Number of buffered rows that triggers writing a chunk.
+    """
+
+    def __init__(self, path, chunk_rows=10000):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        os.makedirs(path, exist_ok=True)
+        chunks = list_chunks(path)
+        self._seq = chunks[-1][2] + 1 if chunks else 0
+        self._buffer = []
+        self._rows = 0
+        self._error = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, population, gen):
+        """Adds *population* as generation *gen*."""
+        self._check()
+        self._queue.put(population_columns(population, gen))
+
+    def flush(self):
+        """Writes every buffered row and waits until it is on disk."""
+        self._check()
+        self._queue.put(_FLUSH)
+        self._queue.join()
+        self._check()
+
+    def close(self):
+        """Flushes the archive and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._check()
+
+    def read(self, first=None, last=None, columns=COLUMNS):
+        """Flushes the archive and returns read_archive of it."""
+        self.flush()
+        return read_archive(self.path, first, last, columns)
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None or item is _FLUSH:
+                    self._write()
+                else:
+                    self._buffer.append(item)
+                    self._rows += len(item['gen'])
+                    if (self._rows >= self.chunk_rows):
+                        self._write()
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+            if item is None:
+                return
+
+    def _write(self):
+        if not self._buffer:
+            return
+        data = {c: np.concatenate([b[c] for b in self._buffer]) for c in COLUMNS}
+        filename = 'chunk_%08d_%08d_%06d.npz' % (data['gen'].min(), data['gen'].max(),
+                                                 self._seq)
+        tmp = os.path.join(self.path, '.' + filename)
+        with open(tmp, 'wb') as f:
+            np.savez(f, **data)
+        os.replace(tmp, os.path.join(self.path, filename))
+        self._seq += 1
+        self._buffer = []
+        self._rows = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -1,15 +1,30 @@
 import array as arr
 import random
+from functools import partial
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from scipy.stats import lognorm
 from scipy.stats import loguniform
-from run_dclamp_simulation import run_ind_dclamp
-from cell_recording import ExperimentalAPSet
-from multiprocessing import Pool
-
-from algorithms import eaMuCommaLambda
+from cell_recording import open_AP_set
+from steady_state_cache import SteadyStateCache
+from fitness_cache import FitnessCache, cached_score
+from evaluation_pool import EvaluationPool
+from distributed_map import DistributedMap
+from island_model import eaMuCommaLambdaIslands
+
+from algorithms import eaMuCommaLambda, eaMuCommaLambdaAsync, eaGenerateUpdate
+from es_variation import varOrArrays, varOrES
+from surrogate import SurrogateScreen
+from cma_strategy import CMAStrategy
+from case_fitness import CaseFitness, fitness_cases
+from tools.selection import selAutomaticEpsilonLexicase
+from tools.support import HallOfFame
+from multi_fidelity import (FidelityFitness, FullFidelityHallOfFame, MultiFidelityMap,
+                            coarse_fitness, COARSE, FULL)
+from population import PopulationArrays
+from generation_archive import GenerationArchive
+from checkpoint import Checkpointer, CHECKPOINT_NAME
 from deap import base
 from deap import creator
 from deap import tools
@@ -39,9 +54,10 @@ def generateES(ind_clss, strategy_clss, size):
     return ind
 
 
-def fitness(ind, ExperAPSet):
-    model_APSet = run_ind_dclamp(ind, dc_ik1=ExperAPSet.dc_ik1, printIND=False)
-    rmsd_total = (sum(ExperAPSet.score(model_APSet).values()),)
+def fitness(ind, ExperAPSet, ss_cache=None, fit_cache=None):
+    scores = cached_score(ExperAPSet, ind, fit_cache, printIND=False,
+                          ss_cache=ss_cache)
+    rmsd_total = (sum(scores.values()),)
     return rmsd_total
 
 
@@ -49,8 +65,8 @@ def mutateES(ind, indpb=0.3):
     for i in range(len(ind)):
         if (indpb > random.random()):
             # Mutate
-            ind[i] *= lognorm.rvs(s=ind.strategy[i], size=1)
-            ind.strategy[i] *= lognorm.rvs(s=ind.strategy[i], size=1)
+            ind[i] *= lognorm.rvs(s=ind.strategy[i], size=1)[0]
+            ind.strategy[i] *= lognorm.rvs(s=ind.strategy[i], size=1)[0]
     # Check that Phi is [0:1)
     if (ind[0] > 1.0):
         # Reset
@@ -74,11 +90,40 @@ def cxESBlend(ind1, ind2, alpha):
     return ind1, ind2
 
 
-def iPSC_EA_fit_normal(outdir, MU=4, LAMBDA=8, NGEN=3):
+def iPSC_EA_fit_normal(outdir, MU=4, LAMBDA=8, NGEN=3, asynchronous=False,
+                       broker=None, NISLANDS=1, CKPT_FREQ=1, SCREEN=1,
+                       PROMOTE=None, LEXICASE=False, CMA=None, WARM_START=False):
     """This function applies the DEAP algorithm (mu,lambda) to fit
     the Kernik-Clancy model to an experimental AP data set.
     The 14 membrane conductance parameters are optimized.
-    The fitness is defined as the sum of RMSD from each AP."""
+    The fitness is defined as the sum of RMSD from each AP.
+    With asynchronous=True the steady-state eaMuCommaLambdaAsync is used.
+    If a broker address is given, the individuals are evaluated by the
+    workers of that broker (see distributed_map), with the key of the broker
+    in EA_BROKER_AUTHKEY, instead of a local pool.
+    With NISLANDS > 1 each of the NISLANDS islands of MU individuals runs in
+    its own process with ring migration (see island_model).
+    Every CKPT_FREQ generations a checkpoint is written to the outdir that
+    iPSC_EA_fit_restart can resume from (see checkpoint).
+    With SCREEN > 1 SCREEN candidates are sampled per offspring and only the
+    LAMBDA most promising ones by a k-NN surrogate of the fitness are
+    simulated (see surrogate).
+    With PROMOTE, every individual is first scored by a cheap tier and only
+    the PROMOTE fraction with the best cheap fitness is fully simulated (see
+    multi_fidelity). It applies to the synchronous single population only.
+    With LEXICASE the fitness keeps the RMSD of every AP as a separate case
+    (see case_fitness) and parents are chosen by automatic epsilon-lexicase
+    selection; SCREEN and PROMOTE are not used then.
+    With CMA = 'full' or 'sep' the synchronous single population is evolved
+    by CMA-ES or sep-CMA-ES in log-conductance space with eaGenerateUpdate
+    (see cma_strategy): LAMBDA individuals per generation, recombined from
+    the best MU, starting from the spread of the initial population. No
+    checkpoints are written then.
+    With WARM_START the control of every individual is warm-started from the
+    nearest paced state of a steady-state cache shared with earlier
+    individuals (see steady_state_cache). It is faster, but the fitness of a
+    genome then depends on the individuals evaluated before it, so runs are
+    not reproducible."""
 
     #  DEAP (mu,lambda) settings
     #  MU: Population size at the end of each generation including gen(0)
@@ -99,13 +144,20 @@ def iPSC_EA_fit_normal(outdir, MU=4, LAMBDA=8, NGEN=3):
     # Cell 2 recorded 12/24/20 Ishihara dynamic-clamp 1.0 pA/pF
     path_to_aps = '/home/drew/projects/iPSC_EA_Fitting_Sep2021/cell_2/AP_set'
     print('AP Set Path: '+path_to_aps)
-    cell_2 = ExperimentalAPSet(path=path_to_aps, file_prefix='cell_2_',
-                               file_suffix='_SAP.txt', cell_id=2, dc_ik1=1.0)
+    cell_2 = open_AP_set(path=path_to_aps, file_prefix='cell_2_',
+                         file_suffix='_SAP.txt', cell_id=2, dc_ik1=1.0)
     print('\tExperimental Cell ID: '+str(cell_2.cell_id))
     print('\tExperimental DC IK1: '+str(cell_2.dc_ik1))
     
     # Define classes for EA with DEAP libaries. #
-    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    multi_fidelity = (PROMOTE is not None and not asynchronous and NISLANDS == 1
+                      and not LEXICASE)
+    if LEXICASE:
+        creator.create("FitnessMin", CaseFitness, weights=(-1.0,)*len(cell_2.ap_keys))
+    elif multi_fidelity:
+        creator.create("FitnessMin", FidelityFitness, weights=(-1.0,))
+    else:
+        creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
     creator.create("Individual", arr.array, typecode="d",
                    fitness=creator.FitnessMin, strategy=None)
     creator.create("Strategy", arr.array, typecode="d")
@@ -122,28 +174,66 @@ def iPSC_EA_fit_normal(outdir, MU=4, LAMBDA=8, NGEN=3):
     toolbox.register("mate", cxESBlend, alpha=0.3)
     toolbox.register("mutate", mutateES)
 
+    # Paced control states are shared between individuals and runs, if
+    # warm starts are on.
+    ss_cache = SteadyStateCache(path=outdir+'ss_cache') if WARM_START else None
+    # Scores of evaluated genomes, reused by clones, reruns and restarts.
+    fit_cache = FitnessCache(path=outdir+'fitness_cache.sqlite')
+
     # Selection
-    toolbox.register("evaluate", fitness, ExperAPSet=cell_2)
-    toolbox.register("select", tools.selTournament, tournsize=3)
+    if LEXICASE:
+        toolbox.register("evaluate", fitness_cases, ExperAPSet=cell_2, ss_cache=ss_cache,
+                         fit_cache=fit_cache)
+        toolbox.register("select", selAutomaticEpsilonLexicase)
+    else:
+        toolbox.register("evaluate", fitness, ExperAPSet=cell_2, ss_cache=ss_cache,
+                         fit_cache=fit_cache)
+        toolbox.register("select", tools.selTournament, tournsize=3)
 
     # Register some statistical functions to the toolbox.
-    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    # The statistics of a fitness vector are those of its total.
+    stats = tools.Statistics(lambda ind: (sum(ind.fitness.values),))
     stats.register("avg", np.mean)
     stats.register("std", np.std)
     stats.register("min", np.min)
     stats.register("max", np.max)
 
-    # To speed things up with multi-threading
-    p = Pool()
-    toolbox.register("map", p.map)
-
-    hof = tools.HallOfFame(NHOF)
+    if multi_fidelity:
+        # The cheap tier has cache entries of its own
+        coarse_cache = FitnessCache(path=outdir+'fitness_cache.sqlite', namespace='coarse')
+        toolbox.register("coarse", coarse_fitness, ExperAPSet=cell_2, ss_cache=ss_cache,
+                         fit_cache=coarse_cache)
+
+    # To speed things up with multi-processing. The workers are started once
+    # with the evaluate (and coarse) function and then receive only genomes.
+    if (NISLANDS > 1):
+        # Every island starts its own pool
+        pool = None
+    elif broker is None:
+        pool = EvaluationPool(toolbox.evaluate,
+                              others=(toolbox.coarse,) if multi_fidelity else ())
+    else:
+        pool = DistributedMap(broker)
+    if pool is not None:
+        toolbox.register("map", pool.map)
+        toolbox.register("submit", pool.submit)
+    if multi_fidelity:
+        fidelity_map = MultiFidelityMap(pool.map, toolbox.coarse, promote=PROMOTE)
+        toolbox.register("map", fidelity_map)
+
+    # Individuals of a coarse fitness are kept out of the HallOfFame
+    if multi_fidelity:
+        hof = FullFidelityHallOfFame(NHOF)
+    else:
+        hof = HallOfFame(NHOF)
     hof_fitness = []
     pop_fitness = []
     pop_strategy = []
-    pop = toolbox.population(n=MU)
+    pop = toolbox.population(n=MU*NISLANDS)
 
     print('(mu,lambda): ('+str(MU)+','+str(LAMBDA)+')')
+    if (NISLANDS > 1):
+        print('Islands: '+str(NISLANDS))
     print('HoF size: '+str(NHOF))
 
     # Clock the start time.
@@ -154,14 +244,80 @@ def iPSC_EA_fit_normal(outdir, MU=4, LAMBDA=8, NGEN=3):
     pop_first_df = pd.DataFrame(pop, columns=PARAM_NAMES)
     filename = outdir+'pop_0_'+dt+'.txt'
     pop_first_df.to_csv(filename, sep=' ', index=False)
-
-    pop, logbook = eaMuCommaLambda(pop, toolbox, mu=MU, lambda_=LAMBDA,
-                                   cxpb=0.6, mutpb=0.3, ngen=NGEN, stats=stats,
-                                   halloffame=hof, verbose=False, writeGENS=True)
+    # Every generation is appended to one archive (see generation_archive)
+    archive = GenerationArchive(outdir+'generations_'+dt)
+
+    use_cma = (CMA is not None and not asynchronous and NISLANDS == 1)
+    if use_cma:
+        strategy = CMAStrategy.from_population(pop, lambda_=LAMBDA, mu=MU,
+                                               diagonal=(CMA == 'sep'))
+        toolbox.register("generate", strategy.generate, creator.Individual,
+                         creator.Strategy)
+        toolbox.register("update", strategy.update)
+
+    # The asynchronous loop keeps every worker busy between generations.
+    screen = None
+    if asynchronous:
+        algorithm = eaMuCommaLambdaAsync
+    elif (NISLANDS == 1 and LEXICASE):
+        # A fitness vector does not fit in PopulationArrays
+        algorithm = partial(eaMuCommaLambda, variation=varOrES)
+    elif (NISLANDS == 1):
+        # The population is kept as arrays and all offspring of a generation
+        # are varied at once, with the same alpha and indpb as cxESBlend and
+        # mutateES.
+        pop = PopulationArrays.from_individuals(pop)
+        if (SCREEN > 1):
+            variation = screen = SurrogateScreen(oversample=SCREEN)
+        else:
+            variation = varOrArrays
+        algorithm = partial(eaMuCommaLambda, variation=variation)
+
+    # The checkpoints hold the run configuration, with the surrogate and its
+    # training set, for iPSC_EA_fit_restart
+    config = {'MU': MU, 'LAMBDA': LAMBDA, 'asynchronous': asynchronous,
+              'LEXICASE': LEXICASE,
+              'PROMOTE': PROMOTE if multi_fidelity else None,
+              'CMA': CMA if use_cma else None, 'WARM_START': WARM_START,
+              'screen': screen}
+    checkpointer = Checkpointer(outdir+CHECKPOINT_NAME, freq=CKPT_FREQ,
+                                fit_cache=fit_cache, config=config, archive=archive)
+    try:
+        if (NISLANDS > 1):
+            islands = [pop[i*MU:(i+1)*MU] for i in range(NISLANDS)]
+            islands, logbooks = eaMuCommaLambdaIslands(islands, toolbox, mu=MU,
+                                                       lambda_=LAMBDA, cxpb=0.6,
+                                                       mutpb=0.3, ngen=NGEN,
+                                                       stats=stats, halloffame=hof,
+                                                       verbose=False)
+            pop = [ind for island in islands for ind in island]
+            logbook = [dict(record, island=i) for i in range(NISLANDS)
+                       for record in logbooks[i]]
+        elif use_cma:
+            pop, logbook = eaGenerateUpdate(toolbox, ngen=NGEN, halloffame=hof,
+                                            stats=stats, verbose=False, writeGENS=True,
+                                            archive=archive)
+        else:
+            pop, logbook = algorithm(pop, toolbox, mu=MU, lambda_=LAMBDA,
+                                     cxpb=0.6, mutpb=0.3, ngen=NGEN, stats=stats,
+                                     halloffame=hof, verbose=False, writeGENS=True,
+                                     archive=archive, checkpoint=checkpointer)
+    except BaseException:
+        # Stop the workers, which may be in long simulations
+        archive.close()
+        if pool is not None:
+            pool.terminate()
+        raise
+    archive.close()
+    if pool is not None:
+        pool.close()
 
     now = datetime.now()
     dt = now.strftime("%m%d%y_%H%M%S")
     print('Run end time: '+dt)
+    if multi_fidelity:
+        print('Evaluations (coarse, full): ('+str(fidelity_map.nevals[COARSE])+','
+              + str(fidelity_map.nevals[FULL])+')')
 
     #  Write output to disk
     logbook_df = pd.DataFrame(logbook)
@@ -177,13 +333,13 @@ def iPSC_EA_fit_normal(outdir, MU=4, LAMBDA=8, NGEN=3):
     hof_df.to_csv(filename, sep=' ', index=False)
 
     for i in hof:
-        hof_fitness.append(i.fitness.values[0])
+        hof_fitness.append(sum(i.fitness.values))
     hof_fitness_pd = pd.DataFrame(hof_fitness, columns=["fitness"])
     filename = outdir+'hof_fitness_'+dt+'.txt'
     hof_fitness_pd.to_csv(filename, sep=' ', index=False)
 
     for i in pop:
-        pop_fitness.append(i.fitness.values[0])
+        pop_fitness.append(sum(i.fitness.values))
         pop_strategy.append(i.strategy)
     pop_fitness_df = pd.DataFrame(pop_fitness, columns=["fitness"])
     filename = outdir+'pop_fitness_'+dt+'.txt'
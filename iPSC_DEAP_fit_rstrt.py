@@ -1,14 +1,24 @@
 import array as arr
 import random
+from functools import partial
 import numpy as np
 import pandas as pd
 from datetime import datetime
 from scipy.stats import lognorm
-from run_dclamp_simulation import run_ind_dclamp
-from cell_recording import ExperimentalAPSet
-from multiprocessing import Pool
-
-from algorithms import eaMuCommaLambda
+from cell_recording import open_AP_set
+from steady_state_cache import SteadyStateCache
+from fitness_cache import FitnessCache, cached_score
+from evaluation_pool import EvaluationPool
+from distributed_map import DistributedMap
+
+from algorithms import eaMuCommaLambda, eaMuCommaLambdaAsync
+from es_variation import varOrArrays, varOrES
+from case_fitness import CaseFitness, fitness_cases
+from tools.selection import selAutomaticEpsilonLexicase
+from tools.support import HallOfFame
+from population import PopulationArrays
+from generation_archive import GenerationArchive
+from checkpoint import Checkpointer, CHECKPOINT_NAME, load_checkpoint, load_config
 from deap import base
 from deap import creator
 from deap import tools
@@ -47,9 +57,10 @@ def rstrtHOF(hof, ind_clss, fit_clss, data):
         return(hof)
 
 
-def fitness(ind, ExperAPSet):
-    model_APSet = run_ind_dclamp(ind, dc_ik1=ExperAPSet.dc_ik1, printIND=False)
-    rmsd_total = (sum(ExperAPSet.score(model_APSet).values()),)
+def fitness(ind, ExperAPSet, ss_cache=None, fit_cache=None):
+    scores = cached_score(ExperAPSet, ind, fit_cache, printIND=False,
+                          ss_cache=ss_cache)
+    rmsd_total = (sum(scores.values()),)
     return rmsd_total
 
 
@@ -57,8 +68,8 @@ def mutateES(ind, indpb=0.3):
     for i in range(len(ind)):
         if (indpb > random.random()):
             # Mutate
-            ind[i] *= lognorm.rvs(s=ind.strategy[i], size=1)
-            ind.strategy[i] *= lognorm.rvs(s=ind.strategy[i], size=1)
+            ind[i] *= lognorm.rvs(s=ind.strategy[i], size=1)[0]
+            ind.strategy[i] *= lognorm.rvs(s=ind.strategy[i], size=1)[0]
     # Check that Phi is [0:1)
     if (ind[0] > 1.0):
         # Reset
@@ -82,13 +93,27 @@ def cxESBlend(ind1, ind2, alpha):
     return ind1, ind2
 
 
-def iPSC_EA_fit_restart(outdir, pop_, hof_, NGEN, NGEN_TOTAL):
+def iPSC_EA_fit_restart(outdir, pop_, hof_, NGEN, NGEN_TOTAL, asynchronous=False,
+                        broker=None, checkpoint=None, CKPT_FREQ=1, WARM_START=False):
     """This function applies the DEAP algorithm (mu,lambda) to fit
     the Kernik-Clancy model to an experimental AP data set.
     The 14 membrane conductance parameters are optimized.
     The fitness is defined as the sum of RMSD from each AP.
     iPSC_EA_fit_restart extends the optimization EA from a
-    prior optimization."""
+    prior optimization.
+    With asynchronous=True the steady-state eaMuCommaLambdaAsync is used.
+    If a broker address is given, the individuals are evaluated by the
+    workers of that broker (see distributed_map), with the key of the broker
+    in EA_BROKER_AUTHKEY, instead of a local pool.
+    If a checkpoint file is given, the population, HallOfFame, logbook, RNG
+    states and fitness cache are restored from it instead of pop_ and hof_,
+    and the run continues from the generation of the checkpoint with the
+    configuration saved in it: MU, LAMBDA, asynchronous, LEXICASE, WARM_START
+    and the SCREEN surrogate with its training set. Checkpoints of multi-fidelity
+    (PROMOTE) or CMA runs cannot be resumed. Every CKPT_FREQ generations a
+    new checkpoint is written to the outdir.
+    With WARM_START the controls are warm-started from a steady-state cache,
+    as in iPSC_EA_fit_normal, and runs are not reproducible."""
 
     #  DEAP (mu,lambda) settings
     #  MU: Population size at the end of each generation including gen(0)
@@ -104,13 +129,28 @@ def iPSC_EA_fit_restart(outdir, pop_, hof_, NGEN, NGEN_TOTAL):
     # Cell 2 recorded 12/24/20 Ishihara dynamic-clamp 1.0 pA/pF
     path_to_aps = '/home/drew/projects/iPSC_EA_Fitting_Sep2021/cell_2/AP_set'
     print('AP Set Path: '+path_to_aps)
-    cell_2 = ExperimentalAPSet(path=path_to_aps, file_prefix='cell_2_',
-                               file_suffix='_SAP.txt', cell_id=2, dc_ik1=1.0)
+    cell_2 = open_AP_set(path=path_to_aps, file_prefix='cell_2_',
+                         file_suffix='_SAP.txt', cell_id=2, dc_ik1=1.0)
     print('\tExperimental Cell ID: '+str(cell_2.cell_id))
     print('\tExperimental DC IK1: '+str(cell_2.dc_ik1))
     
+    # The configuration of the run of the checkpoint
+    config = {}
+    if checkpoint is not None:
+        config = load_config(checkpoint)
+        for name in ('PROMOTE', 'CMA'):
+            if (config.get(name) is not None):
+                raise ValueError('Cannot resume '+checkpoint+': runs with '+name+'='
+                                 + str(config[name])+' are not supported by the restart')
+        asynchronous = config.get('asynchronous', asynchronous)
+        WARM_START = config.get('WARM_START', WARM_START)
+    LEXICASE = config.get('LEXICASE', False)
+
     # Define classes for EA with DEAP libaries. #
-    creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
+    if LEXICASE:
+        creator.create("FitnessMin", CaseFitness, weights=(-1.0,)*len(cell_2.ap_keys))
+    else:
+        creator.create("FitnessMin", base.Fitness, weights=(-1.0,))
     creator.create("Individual", arr.array, typecode="d",
                    fitness=creator.FitnessMin, strategy=None)
     creator.create("Strategy", arr.array, typecode="d")
@@ -128,28 +168,64 @@ def iPSC_EA_fit_restart(outdir, pop_, hof_, NGEN, NGEN_TOTAL):
     toolbox.register("mate", cxESBlend, alpha=0.3)
     toolbox.register("mutate", mutateES)
 
+    # Paced control states are shared between individuals and runs, if
+    # warm starts are on.
+    ss_cache = SteadyStateCache(path=outdir+'ss_cache') if WARM_START else None
+    # Scores of evaluated genomes, reused by clones, reruns and restarts.
+    fit_cache = FitnessCache(path=outdir+'fitness_cache.sqlite')
+
     # Selection
-    toolbox.register("evaluate", fitness, ExperAPSet=cell_2)
-    toolbox.register("select", tools.selTournament, tournsize=3)
+    if LEXICASE:
+        toolbox.register("evaluate", fitness_cases, ExperAPSet=cell_2, ss_cache=ss_cache,
+                         fit_cache=fit_cache)
+        toolbox.register("select", selAutomaticEpsilonLexicase)
+    else:
+        toolbox.register("evaluate", fitness, ExperAPSet=cell_2, ss_cache=ss_cache,
+                         fit_cache=fit_cache)
+        toolbox.register("select", tools.selTournament, tournsize=3)
 
     # Register some statistical functions to the toolbox.
-    stats = tools.Statistics(lambda ind: ind.fitness.values)
+    # The statistics of a fitness vector are those of its total.
+    stats = tools.Statistics(lambda ind: (sum(ind.fitness.values),))
     stats.register("avg", np.mean)
     stats.register("std", np.std)
     stats.register("min", np.min)
     stats.register("max", np.max)
 
-    # To speed things up with multi-threading
-    p = Pool()
-    toolbox.register("map", p.map)
-
-    pop = toolbox.population()
-
-    MU = len(pop)
-    LAMBDA = 2 * MU
-    NHOF = int((0.1) * LAMBDA * NGEN_TOTAL)
-
-    hof = rstrtHOF(tools.HallOfFame(NHOF), creator.Individual, creator.FitnessMin, hof_)
+    # To speed things up with multi-processing. The workers are started once
+    # with the evaluate function and then receive only genomes.
+    if broker is None:
+        pool = EvaluationPool(toolbox.evaluate)
+    else:
+        pool = DistributedMap(broker)
+    toolbox.register("map", pool.map)
+    toolbox.register("submit", pool.submit)
+
+    if checkpoint is None:
+        pop = toolbox.population()
+
+        MU = len(pop)
+        LAMBDA = 2 * MU
+        NHOF = int((0.1) * LAMBDA * NGEN_TOTAL)
+
+        hof = rstrtHOF(HallOfFame(NHOF), creator.Individual, creator.FitnessMin, hof_)
+        config = {'MU': MU, 'LAMBDA': LAMBDA, 'asynchronous': asynchronous,
+                  'LEXICASE': False, 'PROMOTE': None, 'CMA': None,
+                  'WARM_START': WARM_START, 'screen': None}
+        checkpointer = Checkpointer(outdir+CHECKPOINT_NAME, freq=CKPT_FREQ,
+                                    fit_cache=fit_cache, config=config)
+    else:
+        state = load_checkpoint(checkpoint, fit_cache)
+        pop = state['population']
+        hof = state['halloffame']
+
+        MU = config['MU']
+        LAMBDA = config['LAMBDA']
+        NHOF = hof.maxsize
+        print('Resuming from generation '+str(state['gen'])+' of '+checkpoint)
+        checkpointer = Checkpointer(outdir+CHECKPOINT_NAME, freq=CKPT_FREQ,
+                                    fit_cache=fit_cache, logbook=state['logbook'],
+                                    gen=state['gen'], config=config)
     hof_fitness = []
     pop_fitness = []
     pop_strategy = []
@@ -165,16 +241,45 @@ def iPSC_EA_fit_restart(outdir, pop_, hof_, NGEN, NGEN_TOTAL):
     pop_first_df = pd.DataFrame(pop, columns=PARAM_NAMES)
     filename = outdir+'pop_0_'+dt+'.txt'
     pop_first_df.to_csv(filename, sep=' ', index=False)
-
-    pop, logbook = eaMuCommaLambda(pop, toolbox, mu=MU, lambda_=LAMBDA,
-                                   cxpb=0.6, mutpb=0.3, ngen=NGEN, stats=stats,
-                                   halloffame=hof, verbose=False, writeGENS=True)
+    # Every generation is appended to one archive (see generation_archive)
+    archive = GenerationArchive(outdir+'generations_'+dt)
+    checkpointer.archive = archive
+
+    # The asynchronous loop keeps every worker busy between generations.
+    if asynchronous:
+        if isinstance(pop, PopulationArrays):
+            pop = pop.to_individuals(creator.Individual, creator.Strategy)
+        algorithm = eaMuCommaLambdaAsync
+    elif LEXICASE:
+        # A fitness vector does not fit in PopulationArrays
+        algorithm = partial(eaMuCommaLambda, variation=varOrES)
+    else:
+        # The population is kept as arrays and all offspring of a generation
+        # are varied at once, with the same alpha and indpb as cxESBlend and
+        # mutateES. A surrogate screen continues with its training set.
+        if not isinstance(pop, PopulationArrays):
+            pop = PopulationArrays.from_individuals(pop)
+        variation = config.get('screen') or varOrArrays
+        algorithm = partial(eaMuCommaLambda, variation=variation)
+    try:
+        pop, logbook = algorithm(pop, toolbox, mu=MU, lambda_=LAMBDA,
+                                 cxpb=0.6, mutpb=0.3, ngen=NGEN, stats=stats,
+                                 halloffame=hof, verbose=False, writeGENS=True,
+                                 archive=archive, checkpoint=checkpointer)
+    except BaseException:
+        # Stop the workers, which may be in long simulations
+        archive.close()
+        pool.terminate()
+        raise
+    archive.close()
+    pool.close()
 
     now = datetime.now()
     dt = now.strftime("%m%d%y_%H%M%S")
     print('Run end time: '+dt)
 
     #  Write output to disk
+    logbook = checkpointer.merged(logbook)
     logbook_df = pd.DataFrame(logbook)
     filename = outdir+'logbook_'+dt+'.txt'
     logbook_df.to_csv(filename, sep=' ', index=False)
@@ -188,13 +293,13 @@ def iPSC_EA_fit_restart(outdir, pop_, hof_, NGEN, NGEN_TOTAL):
     hof_df.to_csv(filename, sep=' ', index=False)
 
     for i in hof:
-        hof_fitness.append(i.fitness.values[0])
+        hof_fitness.append(sum(i.fitness.values))
     hof_fitness_pd = pd.DataFrame(hof_fitness, columns=["fitness"])
     filename = outdir+'hof_fitness_'+dt+'.txt'
     hof_fitness_pd.to_csv(filename, sep=' ', index=False)
 
     for i in pop:
-        pop_fitness.append(i.fitness.values[0])
+        pop_fitness.append(sum(i.fitness.values))
         pop_strategy.append(i.strategy)
     pop_fitness_df = pd.DataFrame(pop_fitness, columns=["fitness"])
     filename = outdir+'pop_fitness_'+dt+'.txt'
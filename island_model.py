@@ -0,0 +1,157 @@
+import random
+import signal
+import multiprocessing
+import numpy as np
+from multiprocessing import cpu_count
+
+from algorithms import eaMuCommaLambda
+from evaluation_pool import EvaluationPool
+import tools
+
+
+def _exit_island(signum, frame):
+    # Terminating an island unwinds it, so that its pool is terminated too
+    raise SystemExit(1)
+
+
+def _run_island(conn, population, toolbox, mu, lambda_, cxpb, mutpb, nhof,
+                stats, processes, seed):
+    """Island process: evolves its population with eaMuCommaLambda for the
+    number of generations it receives and sends back the population, the
+    logbook and its HallOfFame until it receives None."""
+    signal.signal(signal.SIGTERM, _exit_island)
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    pool = EvaluationPool(toolbox.evaluate, processes)
+    toolbox.register("map", pool.map)
+    hof = tools.HallOfFame(nhof)
+    try:
+        while True:
+            msg = conn.recv()
+            if msg is None:
+                break
+            population, ngen = msg
+            population, logbook = eaMuCommaLambda(population, toolbox, mu, lambda_,
+                                                  cxpb, mutpb, ngen, stats=stats,
+                                                  halloffame=hof, verbose=False)
+            conn.send((population, logbook, list(hof)))
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        conn.close()
+
+
+def eaMuCommaLambdaIslands(islands, toolbox, mu, lambda_, cxpb, mutpb, ngen,
+                           stats=None, halloffame=None, verbose=__debug__,
+                           migfreq=5, migk=1, migselect=tools.selBest,
+                           migreplace=None, processes=None):
+    """Island model of the :math:`(\\mu~,~\\lambda)` evolutionary algorithm.
+
+    :param islands: A list of populations, one per island.
+    :param toolbox: A :class:`~deap.base.Toolbox` that contains the evolution
+                    operators.
+    :param mu: The number of individuals to select on each island.
+    :param lambda\\_: The number of children to produce on each island at
+                     each generation.
+    :param cxpb: The probability that an offspring is produced by crossover.
+    :param mutpb: The probability that an offspring is produced by mutation.
+    :param ngen: The number of generation.
+    :param stats: A :class:`~deap.tools.Statistics` object that is updated
+                  inplace, optional.
+    :param halloffame: A :class:`~deap.tools.HallOfFame` object that will
+                       contain the best individuals of all islands, optional.
+    :param verbose: Whether or not to log the statistics.
+    :param migfreq: The number of generations between migrations.
+    :param migk: The number of individuals migrating from each island.
+    :param migselect: The selection of the emigrants, see
+                      :func:`~deap.tools.migRing`.
+    :param migreplace: The selection of the replaced individuals, see
+                       :func:`~deap.tools.migRing`.
+    :param processes: The number of evaluation workers of each island,
+                      defaults to an even share of the cores.
+    :returns: The final islands
+    :returns: A list with the :class:`~deap.tools.Logbook` of each island
+
+    Each island runs :func:`~algorithms.eaMuCommaLambda` in its own process
+    with its own :class:`~evaluation_pool.EvaluationPool`. Every *migfreq*
+    generations the islands send their populations back, *migk* individuals
+    migrate around the ring with :func:`~deap.tools.migRing` and the islands
+    continue. The HallOfFame of every island is merged into *halloffame*.
+
+    The island processes are forked with the toolbox, so the creator
+    classes and the evaluate function do not have to be pickled; a
+    RuntimeError is raised on platforms without the fork start method
+    (Windows). Each island draws its own random seed. If an island fails,
+    the others are terminated and a RuntimeError is raised.
+    """
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise RuntimeError('eaMuCommaLambdaIslands needs the fork start method to pass '
+                           'the toolbox to the islands')
+    ctx = multiprocessing.get_context('fork')
+    nislands = len(islands)
+    if processes is None:
+        processes = max(1, cpu_count() // nislands)
+    nhof = halloffame.maxsize if halloffame is not None else 1
+
+    logbooks = [tools.Logbook() for _ in range(nislands)]
+    for lb in logbooks:
+        lb.header = ['gen', 'nevals'] + (stats.fields if stats else [])
+
+    conns = []
+    procs = []
+    try:
+        for i in range(nislands):
+            parent, child = ctx.Pipe()
+            p = ctx.Process(target=_run_island,
+                            args=(child, islands[i], toolbox, mu, lambda_, cxpb, mutpb,
+                                  nhof, stats, processes, random.randrange(2**63)))
+            p.start()
+            # Only the island holds its end, so recv fails once it exits
+            child.close()
+            conns.append(parent)
+            procs.append(p)
+
+        gen = 0
+        while (gen < ngen):
+            nstep = min(migfreq, ngen - gen)
+            for i in range(nislands):
+                conns[i].send((islands[i], nstep))
+            for i in range(nislands):
+                try:
+                    islands[i], logbook, hof = conns[i].recv()
+                except EOFError:
+                    raise RuntimeError('Island '+str(i)+' stopped, see its traceback') from None
+                if halloffame is not None:
+                    halloffame.update(hof)
+                # Generation 0 of the later epochs repeats the last record
+                for record in logbook[(0 if gen == 0 else 1):]:
+                    record['gen'] += gen
+                    logbooks[i].record(**record)
+                if verbose:
+                    print('Island '+str(i))
+                    print(logbook.stream)
+            gen += nstep
+
+            # Ring migration of the best individuals
+            if (gen < ngen):
+                tools.migRing(islands, migk, migselect, migreplace)
+    except BaseException:
+        # Do not wait for the generations of the other islands
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.join()
+        raise
+    else:
+        for c in conns:
+            c.send(None)
+        for p in procs:
+            p.join()
+    finally:
+        for c in conns:
+            c.close()
+
+    return islands, logbooks
@@ -1,6 +1,7 @@
 import pandas as pd
 from iPSC_DEAP_fit import iPSC_EA_fit_normal
 from iPSC_DEAP_fit_rstrt import iPSC_EA_fit_restart
+from checkpoint import CHECKPOINT_NAME
 
 
 def main(args):
@@ -100,6 +101,17 @@ if __name__ == '__main__':
             print('Cannot find directory: '+sys.argv[1])
             print('Default output directory: ./')
             argv[0] = sys.argv[1]
+        if os.path.exists(os.path.join(sys.argv[2], CHECKPOINT_NAME)):
+            # Resume from the binary checkpoint of a prior run
+            checkpoint = os.path.join(sys.argv[2], CHECKPOINT_NAME)
+            print('Checkpoint: '+checkpoint)
+            try:
+                NGEN = int(sys.argv[3])
+            except ValueError:
+                print('Number of generations to run must be integer.')
+                sys.exit()
+            iPSC_EA_fit_restart(argv[0], None, None, NGEN, None, checkpoint=checkpoint)
+            sys.exit()
         if os.path.exists(sys.argv[2]):
             print('Input Directory: '+sys.argv[2])
             path_in = sys.argv[2]
@@ -0,0 +1,147 @@
+""" Two-tier (multi-fidelity) evaluation.
+
+Every individual is first scored by a cheap tier: the adaptive pacing with
+looser beat convergence tolerances, shorter branch pacing and a subset of
+the dynamic-clamp conditions (coarse_fitness). A promotion policy then
+picks the individuals that are simulated again by the full fitness. With
+(mu,lambda) selection most offspring are discarded, so only the best
+fraction of a generation needs the full simulation.
+
+The fitness of every individual records the tier it came from as
+fitness.fidelity (COARSE or FULL) and keeps the values of that tier.
+FidelityFitness and population.FitnessView compare on the tier first (see
+population.fidelity_rank), so selection never prefers a coarse fitness over
+a full one, in the generation it was evaluated in or any later one, and
+FullFidelityHallOfFame only takes fully evaluated individuals.
+"""
+
+import math
+import numpy as np
+
+from deap import base
+
+from fitness_cache import cached_score
+from population import fidelity_rank
+from tools.support import HallOfFame
+
+
+COARSE = 0
+FULL = 1
+
+# AP set keys of the conditions of the cheap tier: the control and the
+# stronger perturbation of every current.
+COARSE_KEYS = ('cntrl', '0.7_ical', '0.9_ikr', '1.5_ito', '10_iks')
+
+
+class FidelityFitness(base.Fitness):
+    """ deap.base.Fitness that records the fidelity of its values and
+    compares on it first (see population.fidelity_rank). The fidelity is
+    kept by copies and reset with the values."""
+    fidelity = None
+
+    def __deepcopy__(self, memo):
+        copy_ = base.Fitness.__deepcopy__(self, memo)
+        copy_.fidelity = self.fidelity
+        return copy_
+
+    def delValues(self):
+        base.Fitness.delValues(self)
+        self.fidelity = None
+
+    values = property(base.Fitness.getValues, base.Fitness.setValues, delValues)
+
+    def __le__(self, other):
+        return fidelity_rank(self) <= fidelity_rank(other)
+
+    def __lt__(self, other):
+        return fidelity_rank(self) < fidelity_rank(other)
+
+    def __eq__(self, other):
+        return fidelity_rank(self) == fidelity_rank(other)
+
+    def __hash__(self):
+        return hash(self.wvalues)
+
+
+class FullFidelityHallOfFame(HallOfFame):
+    """ HallOfFame updated only with the individuals whose fitness comes
+    from the full tier."""
+
+    def update(self, population):
+        HallOfFame.update(self, [ind for ind in population
+                                 if ind.fitness.fidelity != COARSE])
+
+
+def coarse_fitness(ind, ExperAPSet, ss_cache=None, fit_cache=None,
+                   keys=COARSE_KEYS, branch_stim_end=3000, apd_tol=5.0,
+                   vmax_tol=2.0):
+    """Cheap tier of the fitness of the fitting scripts, simulating only
+    the conditions of *keys*, with their adaptive pacing capped at
+    *branch_stim_end* ms (3 beats). The RMSD of the simulated APs is scaled to the
+    number of APs of *ExperAPSet*, so it is on the scale of the full
+    fitness. *fit_cache* should use a namespace of its own (e.g. 'coarse')."""
+    from run_dclamp_simulation import DCLAMP_CONDITIONS
+    conditions = [c for c in DCLAMP_CONDITIONS if c[0] in keys]
+    scores = cached_score(ExperAPSet, ind, fit_cache, printIND=False,
+                          ss_cache=ss_cache, conditions=conditions,
+                          branch_stim_end=branch_stim_end, pacing='adaptive',
+                          apd_tol=apd_tol, vmax_tol=vmax_tol)
+    if (len(scores) == 0):
+        return (1000.0 * len(ExperAPSet.ap_keys),)
+    return (sum(scores.values()) * len(ExperAPSet.ap_keys) / len(scores),)
+
+
+class MultiFidelityMap:
+    """ Replacement of toolbox.map for the evaluation of the individuals.
+    Every individual is evaluated with *coarse*, then the promoted ones
+    with the function passed to the map (toolbox.evaluate).
+    Attributes:
+      map: Map the tiers are evaluated with, e.g. EvaluationPool.map (with
+           *coarse* among the functions of the pool, so that it is sent to
+           the workers only once).
+      coarse: Cheap fitness function, e.g. coarse_fitness.
+      promote: Fraction of the individuals promoted to the full tier. With
+               (mu,lambda) it should be at least mu/lambda.
+      threshold: Coarse fitness an individual must be at least as good as
+                 to be promoted in addition to the best fraction, optional.
+    """
+
+    def __init__(self, map, coarse, promote=0.5, threshold=None):
+        self.map = map
+        self.coarse = coarse
+        self.promote = promote
+        self.threshold = threshold
+        self.nevals = {COARSE: 0, FULL: 0}
+
+    def promoted(self, coarse_values, weight):
+        """Returns the indices of the individuals promoted given their
+        *coarse_values* and the *weight* of the fitness."""
+        wvalues = np.asarray(coarse_values) * weight
+        n = math.ceil(self.promote * len(wvalues))
+        keep = np.zeros(len(wvalues), dtype=bool)
+        keep[np.argsort(-wvalues, kind='stable')[:n]] = True
+        if self.threshold is not None:
+            keep |= (wvalues >= self.threshold * weight)
+        return np.flatnonzero(keep)
+
+    def __call__(self, func, iterable):
+        individuals = list(iterable)
+        if (len(individuals) == 0):
+            return []
+        fitnesses = list(self.map(self.coarse, individuals))
+        self.nevals[COARSE] += len(individuals)
+        fidelity = [COARSE] * len(individuals)
+
+        # Full tier of the promoted individuals
+        weight = individuals[0].fitness.weights[0]
+        promoted = self.promoted([fit[0] for fit in fitnesses], weight)
+        full = list(self.map(func, [individuals[i] for i in promoted]))
+        self.nevals[FULL] += len(promoted)
+        for i, fit in zip(promoted, full):
+            fitnesses[i] = fit
+            fidelity[i] = FULL
+
+        # The fitnesses compare on their fidelity first
+        for ind, f in zip(individuals, fidelity):
+            ind.fitness.fidelity = f
+        return fitnesses
@@ -0,0 +1,314 @@
+""" Structure-of-arrays population store.
+
+PopulationArrays keeps the genomes and strategies of N individuals in two
+contiguous (N, D) float64 matrices and their fitness in a vector (NaN for an
+invalid fitness). Indexing it returns an IndividualView, a lightweight
+individual reading and writing its row, with a FitnessView as fitness. The
+views satisfy what tools.selTournament, tools.HallOfFame, tools.Statistics
+and algorithms.eaMuCommaLambda expect of a population, so a PopulationArrays
+can be evolved by eaMuCommaLambda with es_variation.varOrArrays as the
+variation. Only single-objective fitnesses are stored.
+
+Every individual also has an ID and the IDs of its two parents (-1 if it
+has none) for the lineage recorded by generation_archive, and the fidelity
+its fitness was evaluated at (-1 if not recorded, see multi_fidelity). A
+fitness of the coarse fidelity ranks behind every other (fidelity_rank).
+"""
+
+import operator
+import itertools
+import numpy as np
+
+
+# Source of the individual IDs of a process.
+_IDS = itertools.count()
+
+# Fidelity of the cheap tier of multi_fidelity (multi_fidelity.COARSE).
+_COARSE = 0
+
+
+def new_ids(n):
+    """Returns *n* new individual IDs."""
+    return np.fromiter(itertools.islice(_IDS, n), dtype=np.int64, count=n)
+
+
+def fidelity_rank(fitness):
+    """Returns the key *fitness* compares on: whether it is not of the
+    coarse fidelity, then its weighted values. A coarse fitness thus ranks
+    behind every full (or unrecorded) one, whatever their values."""
+    return (getattr(fitness, 'fidelity', None) != _COARSE, fitness.wvalues)
+
+
+def next_id():
+    """Returns the ID the next new individual will get."""
+    global _IDS
+    i = next(_IDS)
+    _IDS = itertools.count(i)
+    return i
+
+
+def reserve_ids(start):
+    """Makes the new IDs start at *start* or later, past the IDs of a
+    resumed run (see checkpoint)."""
+    global _IDS
+    _IDS = itertools.count(max(int(start), next_id()))
+
+
+class FitnessView:
+    """ Fitness of row *index* of a PopulationArrays. Compares like
+    deap.base.Fitness on the weighted values, behind the fidelity (see
+    fidelity_rank)."""
+    __slots__ = ('pop', 'index')
+
+    def __init__(self, pop, index):
+        self.pop = pop
+        self.index = index
+
+    @property
+    def weights(self):
+        return self.pop.weights
+
+    @property
+    def values(self):
+        v = self.pop.fitness[self.index]
+        if np.isnan(v):
+            return ()
+        return (float(v),)
+
+    @values.setter
+    def values(self, values):
+        self.pop.fitness[self.index] = values[0]
+
+    @values.deleter
+    def values(self):
+        self.pop.fitness[self.index] = np.nan
+        self.pop.fidelity[self.index] = -1
+
+    @property
+    def fidelity(self):
+        f = self.pop.fidelity[self.index]
+        return None if f < 0 else int(f)
+
+    @fidelity.setter
+    def fidelity(self, fidelity):
+        self.pop.fidelity[self.index] = -1 if fidelity is None else fidelity
+
+    @property
+    def wvalues(self):
+        return tuple(v * w for v, w in zip(self.values, self.weights))
+
+    @property
+    def valid(self):
+        return not np.isnan(self.pop.fitness[self.index])
+
+    def dominates(self, other, obj=slice(None)):
+        return self.wvalues[obj] > other.wvalues[obj]
+
+    def __hash__(self):
+        return hash(self.wvalues)
+
+    def __gt__(self, other):
+        return not self.__le__(other)
+
+    def __ge__(self, other):
+        return not self.__lt__(other)
+
+    def __le__(self, other):
+        return fidelity_rank(self) <= fidelity_rank(other)
+
+    def __lt__(self, other):
+        return fidelity_rank(self) < fidelity_rank(other)
+
+    def __eq__(self, other):
+        return fidelity_rank(self) == fidelity_rank(other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self):
+        return 'FitnessView(' + repr(self.values) + ')'
+
+
+class IndividualView:
+    """ Individual stored in row *index* of a PopulationArrays. It behaves
+    as a sequence of the genes, with the strategy row as *strategy* and a
+    FitnessView as *fitness*. Deep copies and pickles are single-row
+    PopulationArrays, so they do not keep the whole population alive."""
+    __slots__ = ('pop', 'index')
+
+    def __init__(self, pop, index):
+        self.pop = pop
+        self.index = index
+
+    @property
+    def strategy(self):
+        return self.pop.strategies[self.index]
+
+    @strategy.setter
+    def strategy(self, strategy):
+        self.pop.strategies[self.index] = strategy
+
+    @property
+    def fitness(self):
+        return FitnessView(self.pop, self.index)
+
+    def __len__(self):
+        return self.pop.genomes.shape[1]
+
+    def __getitem__(self, i):
+        return self.pop.genomes[self.index, i]
+
+    def __setitem__(self, i, value):
+        self.pop.genomes[self.index, i] = value
+
+    def __iter__(self):
+        return iter(self.pop.genomes[self.index].tolist())
+
+    def __array__(self, dtype=None, copy=None):
+        return np.array(self.pop.genomes[self.index], dtype=dtype)
+
+    def __eq__(self, other):
+        try:
+            return np.array_equal(self.pop.genomes[self.index],
+                                  np.asarray(other, dtype=np.float64))
+        except (TypeError, ValueError):
+            return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    __hash__ = None
+
+    def __deepcopy__(self, memo):
+        return self.pop.take([self.index])[0]
+
+    def __reduce__(self):
+        return (operator.getitem, (self.pop.take([self.index]), 0))
+
+    def __repr__(self):
+        return 'IndividualView(' + repr(self.pop.genomes[self.index].tolist()) + ')'
+
+
+class PopulationArrays:
+    """ Population of N individuals stored as arrays.
+    Attributes:
+      genomes: (N, D) float64 matrix of the genes.
+      strategies: (N, D) float64 matrix of the ES strategies.
+      fitness: (N,) float64 vector of the fitness values, NaN if invalid.
+      weights: Weights of the fitness, as in deap.base.Fitness.
+      ids: (N,) int64 vector of the individual IDs.
+      parents: (N, 2) int64 matrix of the parent IDs, -1 if none.
+      fidelity: (N,) int8 vector of the fitness fidelities, -1 if unknown.
+    """
+
+    def __init__(self, genomes, strategies=None, fitness=None, weights=(-1.0,),
+                 ids=None, parents=None, fidelity=None):
+        self.genomes = np.ascontiguousarray(genomes, dtype=np.float64)
+        if strategies is None:
+            strategies = np.zeros_like(self.genomes)
+        self.strategies = np.ascontiguousarray(strategies, dtype=np.float64)
+        if fitness is None:
+            fitness = np.full(len(self.genomes), np.nan)
+        self.fitness = np.ascontiguousarray(fitness, dtype=np.float64)
+        self.weights = tuple(weights)
+        if ids is None:
+            ids = new_ids(len(self.genomes))
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if parents is None:
+            parents = np.full((len(self.genomes), 2), -1)
+        self.parents = np.ascontiguousarray(parents, dtype=np.int64)
+        if fidelity is None:
+            fidelity = np.full(len(self.genomes), -1)
+        self.fidelity = np.ascontiguousarray(fidelity, dtype=np.int8)
+
+    @classmethod
+    def from_individuals(cls, population):
+        """Returns the PopulationArrays of a list of DEAP individuals."""
+        genomes = np.array(population, dtype=np.float64)
+        strategies = np.array([ind.strategy for ind in population], dtype=np.float64)
+        fitness = np.array([ind.fitness.values[0] if ind.fitness.valid else np.nan
+                            for ind in population])
+        fidelity = [getattr(ind.fitness, 'fidelity', None) for ind in population]
+        fidelity = np.array([-1 if f is None else f for f in fidelity])
+        return cls(genomes, strategies, fitness, population[0].fitness.weights,
+                   fidelity=fidelity)
+
+    @classmethod
+    def gather(cls, views):
+        """Returns a PopulationArrays holding copies of the rows of *views*
+        (IndividualViews of one or more PopulationArrays)."""
+        if isinstance(views, PopulationArrays):
+            return views.take(np.arange(len(views)))
+        stores = {id(v.pop): v.pop for v in views}
+        if (len(stores) == 1):
+            pop, = stores.values()
+            return pop.take([v.index for v in views])
+        return cls(np.array([v.pop.genomes[v.index] for v in views]),
+                   np.array([v.pop.strategies[v.index] for v in views]),
+                   np.array([v.pop.fitness[v.index] for v in views]),
+                   views[0].pop.weights,
+                   np.array([v.pop.ids[v.index] for v in views]),
+                   np.array([v.pop.parents[v.index] for v in views]),
+                   np.array([v.pop.fidelity[v.index] for v in views]))
+
+    def to_individuals(self, ind_clss, strategy_clss):
+        """Returns the population as a list of *ind_clss* individuals."""
+        population = []
+        for i in range(len(self)):
+            ind = ind_clss(self.genomes[i].tolist())
+            ind.strategy = strategy_clss(self.strategies[i].tolist())
+            if not np.isnan(self.fitness[i]):
+                ind.fitness.values = (float(self.fitness[i]),)
+                if (self.fidelity[i] >= 0):
+                    ind.fitness.fidelity = int(self.fidelity[i])
+            population.append(ind)
+        return population
+
+    def take(self, indices):
+        """Returns a new PopulationArrays with the rows *indices*."""
+        return PopulationArrays(self.genomes[indices], self.strategies[indices],
+                                self.fitness[indices], self.weights,
+                                self.ids[indices], self.parents[indices],
+                                self.fidelity[indices])
+
+    def invalid(self):
+        """Returns the indices of the individuals with an invalid fitness."""
+        return np.flatnonzero(np.isnan(self.fitness))
+
+    def __len__(self):
+        return len(self.genomes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [IndividualView(self, j) for j in range(len(self))[i]]
+        if (i < 0):
+            i += len(self)
+        if (i < 0 or i >= len(self)):
+            raise IndexError('population index out of range')
+        return IndividualView(self, i)
+
+    def __setitem__(self, i, views):
+        # Only the whole population can be replaced, e.g.
+        # population[:] = toolbox.select(offspring, mu)
+        if (i != slice(None)):
+            raise TypeError('only population[:] can be assigned')
+        new = PopulationArrays.gather(views)
+        self.genomes = new.genomes
+        self.strategies = new.strategies
+        self.fitness = new.fitness
+        self.ids = new.ids
+        self.parents = new.parents
+        self.fidelity = new.fidelity
+
+    def __iter__(self):
+        return (IndividualView(self, i) for i in range(len(self)))
+
+    def __setstate__(self, state):
+        # Checkpoints written before the fidelity was recorded
+        if 'fidelity' not in state:
+            state['fidelity'] = np.full(len(state['genomes']), -1, dtype=np.int8)
+        self.__dict__.update(state)
+
+    def __repr__(self):
+        return ('PopulationArrays(' + str(len(self)) + ' individuals, ' +
+                str(self.genomes.shape[1]) + ' genes)')
@@ -6,9 +6,68 @@ import time
 import datetime
 from shutil import copy2
 
+from generation_archive import read_archive, last_generation, list_chunks
+
+PARAM_NAMES = ['phi', 'G_K1', 'G_Kr', 'G_Ks', 'G_to', 'P_CaL',
+               'G_CaT', 'G_Na', 'G_F', 'K_NaCa', 'P_NaK',
+               'G_b_Na', 'G_b_Ca', 'G_PCa']
+
+
+def recover_archive(path):
+    """Writes the restart files of the generation archive at *path*."""
+    suffix = '.txt'
+    final_ndx = last_generation(path)
+    if final_ndx is None:
+        print('Empty archive: '+path)
+        sys.exit()
+
+    # Get Time Stamp
+    last_chunk = max(list_chunks(path), key=lambda c: c[1])[3]
+    tstamp = time.ctime(os.path.getmtime(os.path.join(path, last_chunk)))
+    dt = datetime.datetime.strptime(tstamp, "%a %b %d %H:%M:%S %Y")
+    dt = dt.strftime("%m%d%y_%H%M%S")
+
+    # Copy final generation data
+    final = read_archive(path, first=final_ndx, last=final_ndx)
+    pd.DataFrame(final['genome'], columns=PARAM_NAMES).to_csv(
+        'pop_final_' + dt + suffix, sep=' ', index=False)
+    pd.DataFrame(final['strategy'], columns=PARAM_NAMES).to_csv(
+        'pop_strategy_' + dt + suffix, sep=' ', index=False)
+    pd.DataFrame(final['fitness'], columns=['fitness']).to_csv(
+        'pop_fitness_' + dt + suffix, sep=' ', index=False)
+
+    # Create log file
+    data = read_archive(path, columns=('gen', 'genome', 'fitness'))
+    ftnss = pd.Series(data['fitness']).groupby(data['gen'])
+    log = pd.DataFrame.from_dict(
+        {'gen': np.array(list(ftnss.groups.keys())),
+         'nevals': np.array(np.repeat('NA', ftnss.ngroups)),
+         'avg': ftnss.mean().values,
+         'std': ftnss.std(ddof=0).values,
+         'min': ftnss.min().values,
+         'max': ftnss.max().values}
+        )
+    log.to_csv('logbook_' + dt + suffix, sep=' ', index=False)
+
+    # Create halloffame file of top 20% fitness score
+    order = np.argsort(data['fitness'], kind='stable')
+    NHOF = int(0.2 * len(order))
+    hof = pd.DataFrame(data['genome'][order[0:NHOF]], columns=PARAM_NAMES)
+    hof.to_csv('hof_' + dt + suffix, sep=' ', index=False)
+    hof_fitness = pd.DataFrame(data['fitness'][order[0:NHOF]], columns=['fitness'])
+    hof_fitness.to_csv('hof_fitness_' + dt + suffix, sep=' ', index=False)
+
 
 def main(indir):
     filenames = os.listdir(indir)
+
+    # Prefer the generation archive of the latest run
+    archives = [os.path.join(indir, i) for i in filenames if i.startswith('generations_')]
+    archives = [i for i in archives if os.path.isdir(i)]
+    if archives:
+        recover_archive(max(archives, key=os.path.getmtime))
+        return
+
     popfiles = list(filter(lambda k: 'fitness' not in k, filenames))
     popfiles = list(filter(lambda k: 'strategy' not in k, popfiles))
     popfiles = list(filter(lambda k: 'pop_' in k, popfiles))
@@ -18,10 +77,6 @@ def main(indir):
     strtgy_prefix = 'pop_strategy_'
     ftnss_prefix = 'pop_fitness_'
 
-    PARAM_NAMES = ['phi', 'G_K1', 'G_Kr', 'G_Ks', 'G_to', 'P_CaL',
-                   'G_CaT', 'G_Na', 'G_F', 'K_NaCa', 'P_NaK',
-                   'G_b_Na', 'G_b_Ca', 'G_PCa']
-
     gens = []
     for i in popfiles:
         try:
@@ -1,8 +1,220 @@
+import numpy as np
+import pandas as pd
 from cell_models import protocols
 from cell_models.kernik import KernikModel
 
 
-def run_ind_dclamp(ind, dc_ik1=1.0, nai=10.0, ki=130.0, printIND=False):
+# Dynamic-clamp conditions in the order they are simulated.
+# Each entry is (AP set key, perturbed current, leak coefficient). The leak on
+# the perturbed current is phi * coefficient and is applied on top of the
+# Ishihara IK1 leak. The control condition has no perturbed current.
+DCLAMP_CONDITIONS = [('cntrl', None, 0.0),
+                     ('-0.15_ical', 'I_CaL', -0.15),
+                     ('0.7_ical', 'I_CaL', 0.7),
+                     ('-0.25_ikr', 'I_Kr', -0.25),
+                     ('0.9_ikr', 'I_Kr', 0.9),
+                     ('-0.9_ito', 'I_To', -0.9),
+                     ('1.5_ito', 'I_To', 1.5),
+                     ('10_iks', 'I_Ks', 10.0),
+                     ('4_iks', 'I_Ks', 4.0)]
+
+# Pacing cycle length (ms) of the 1 Hz protocol.
+BEAT_LENGTH = 1000.0
+
+# Pacing (ms) of the control and, by default, of the branches.
+STIM_END = 10000.0
+BRANCH_STIM_END = STIM_END
+
+# Parameter names of ind[1:] in the order they are stored in the individual.
+KERNIK_PARAM_NAMES = ['G_K1', 'G_Kr', 'G_Ks', 'G_to', 'P_CaL', 'G_CaT',
+                      'G_Na', 'G_F', 'K_NaCa', 'P_NaK', 'G_b_Na', 'G_b_Ca',
+                      'G_PCa']
+
+
+def build_kernik_model(ind, dc_ik1=1.0, nai=10.0, ki=130.0):
+    """ Create a Kernik model from individual DEAP object with the control
+    dynamic-clamp leak applied. Returns None if phi is not [0:1) or if any
+    conductance is negative.
+    """
+    kci = KernikModel()
+
+    # Apply dynamic-clamp leak
+    if (ind[0] >= 0.0 and ind[0] < 1.0):
+        ik1_leak = dc_ik1 * ind[0]
+        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak}
+    else:
+        print('phi != [0:1)')
+        return None
+
+    # Check bounds on ind
+    for i in range(1, len(ind)):
+        if (ind[i] < 0.0):
+            print('Individual out of range.')
+            return None
+
+    # Intialize individual to model
+    for i, name in enumerate(KERNIK_PARAM_NAMES, 1):
+        kci.default_parameters[name] = ind[i]
+
+    # Set internal monovalent ion concentrations
+    kci.nai_millimolar = nai
+    kci.ki_millimolar = ki
+
+    return kci
+
+
+def set_dclamp_condition(kci, ik1_leak, phi, current, coeff):
+    """Set the dynamic-clamp leak dict of *kci* for a single condition."""
+    leak = {'I_K1_Ishi': ik1_leak}
+    if current is not None:
+        leak[current] = phi * coeff
+    kci._CellModel__no_ion_selective = leak
+
+
+def run_dclamp_branches(kci, y_cntrl, ik1_leak, phi, conditions, protocol,
+                        adaptive=False, apd_tol=1.0, vmax_tol=0.5, max_beats=10,
+                        rest_protocol=None):
+    """Paces every perturbation in *conditions* from the shared control state
+    *y_cntrl*. Returns a dict of last APs keyed by condition and whether a
+    branch failed. With *adaptive* the branches are paced with
+    pace_until_converged (with *apd_tol*, *vmax_tol* and at most *max_beats*
+    beats) and the first failed branch stops the run. Otherwise a branch is
+    paced with *protocol* and, if *rest_protocol* is given and its last two
+    beats have not converged (see trace_converged), paced on with
+    *rest_protocol*. The model is left with the control leak applied.
+
+    The branches are integrated one after another: the Kernik right-hand
+    side of cell_models evaluates a single state vector per call."""
+    ap_set = {}
+    failure = False
+    for key, current, coeff in conditions:
+        kci.y_initial = y_cntrl
+        set_dclamp_condition(kci, ik1_leak, phi, current, coeff)
+        if adaptive:
+            ap_set[key] = pace_until_converged(kci, y_cntrl, max_beats=max_beats,
+                                               apd_tol=apd_tol, vmax_tol=vmax_tol)[0]
+            if ap_set[key] is None:
+                del ap_set[key]
+                failure = True
+                break
+        else:
+            tr = kci.generate_response(protocol, is_no_ion_selective=True)
+            if (rest_protocol is not None and
+                    not trace_converged(tr, apd_tol, vmax_tol)):
+                # Pace on from the final state of the short pacing
+                del tr
+                tr = kci.generate_response(rest_protocol, is_no_ion_selective=True)
+            tr.get_last_ap()
+            ap_set[key] = tr.last_ap
+            del tr
+    kci.y_initial = y_cntrl
+    set_dclamp_condition(kci, ik1_leak, phi, None, 0.0)
+    return ap_set, failure
+
+
+def beat_features(t, v):
+    """Returns the (Vmax, APD90, MDP) of the single paced beat in *t*, *v*.
+    The APD90 is measured from dV/dt max and is None if the beat does not
+    repolarize by 90%."""
+    dv_dt = np.diff(v) / np.diff(t)
+    i_up = int(np.argmax(dv_dt))
+    i_peak = int(np.argmax(v))
+    vmax = v[i_peak]
+    mdp = np.min(v)
+    v90 = vmax - 0.9 * (vmax - mdp)
+    below = np.flatnonzero(v[i_peak:] < v90)
+    if (below.size == 0):
+        return vmax, None, mdp
+    return vmax, t[i_peak + below[0]] - t[i_up], mdp
+
+
+def beat_failed(features, min_amplitude=40.0, max_mdp=-40.0):
+    """Checks beat_features for a clear AP failure: no upstroke (amplitude
+    below *min_amplitude* mV) or depolarization block (no 90% repolarization
+    or an MDP above *max_mdp* mV)."""
+    vmax, apd90, mdp = features
+    return ((vmax - mdp) < min_amplitude or apd90 is None or mdp > max_mdp)
+
+
+def beats_converged(prev, cur, apd_tol=1.0, vmax_tol=0.5):
+    """Checks if two successive beat_features agree within *apd_tol* (ms)
+    and *vmax_tol* (mV)."""
+    if (prev[1] is None or cur[1] is None):
+        return False
+    return (abs(cur[0] - prev[0]) < vmax_tol and abs(cur[1] - prev[1]) < apd_tol)
+
+
+def trace_converged(tr, apd_tol=1.0, vmax_tol=0.5, cycle=BEAT_LENGTH):
+    """Checks if the last two beats of the paced trace *tr* agree (see
+    beats_converged) and did not fail (see beat_failed)."""
+    t = np.asarray(tr.t)
+    v = np.asarray(tr.y)
+    features = []
+    for start in (t[-1] - 2*cycle, t[-1] - cycle):
+        beat = (t >= start) & (t <= start + cycle)
+        if (np.count_nonzero(beat) < 3):
+            return False
+        features.append(beat_features(t[beat], v[beat]))
+    if any(beat_failed(f) for f in features):
+        return False
+    return beats_converged(features[0], features[1], apd_tol, vmax_tol)
+
+
+def last_ap_from_beats(prev, cur, cycle=BEAT_LENGTH):
+    """Builds the last AP from two successive single-beat segments given as
+    (t, V, I) arrays. The AP has the format of Trace.get_last_ap: t(0) is the
+    dV/dt max of the last beat and the window starts 25% of a cycle before."""
+    t = np.concatenate((prev[0], cur[0][1:] + prev[0][-1]))
+    v = np.concatenate((prev[1], cur[1][1:]))
+    i = np.concatenate((prev[2], cur[2][1:]))
+    n_prev = len(prev[0])
+    dv_dt = np.diff(v[n_prev:]) / np.diff(t[n_prev:])
+    t_up = t[n_prev + int(np.argmax(dv_dt))]
+    start_time = t_up - 0.25 * cycle
+    end_time = start_time + cycle
+    start_idx = np.abs(t - start_time).argmin()
+    end_idx = np.abs(t - end_time).argmin()
+    return pd.DataFrame({'t': t[start_idx:end_idx] - t_up,
+                         'V': v[start_idx:end_idx],
+                         'I': i[start_idx:end_idx]})
+
+
+def pace_until_converged(kci, y_init, max_beats=10, apd_tol=1.0, vmax_tol=0.5,
+                         max_failed_beats=2):
+    """Paces *kci* from *y_init* one beat at a time until the Vmax and APD90
+    of successive beats agree (see beats_converged) or *max_beats* beats have
+    been paced. Pacing stops early once *max_failed_beats* successive beats
+    fail (see beat_failed). Returns the last AP, the final state and the
+    number of beats. The last AP is None if the pacing failed.
+    """
+    beat_protocol = protocols.PacedProtocol(model_name="Kernik", stim_end=BEAT_LENGTH,
+                                            stim_mag=2)
+    kci.y_initial = y_init
+    beats = []
+    failed_beats = 0
+    for n in range(1, max(max_beats, 2)+1):
+        tr = kci.generate_response(beat_protocol, is_no_ion_selective=True)
+        cur = (np.asarray(tr.t), np.asarray(tr.y),
+               np.asarray(tr.current_response_info.get_current_summed()))
+        del tr
+        beats = beats[-1:] + [(cur, beat_features(cur[0], cur[1]))]
+        # Bail out on clear failures
+        if beat_failed(beats[-1][1]):
+            failed_beats += 1
+            if (failed_beats >= max_failed_beats):
+                return None, kci.y_initial, n
+            continue
+        failed_beats = 0
+        if (len(beats) == 2 and
+                beats_converged(beats[0][1], beats[1][1], apd_tol, vmax_tol)):
+            break
+    last_ap = last_ap_from_beats(beats[0][0], beats[1][0])
+    return last_ap, kci.y_initial, n
+
+
+def run_ind_dclamp(ind, dc_ik1=1.0, nai=10.0, ki=130.0, printIND=False,
+                   conditions=None, branch_stim_end=BRANCH_STIM_END, ss_cache=None,
+                   pacing='fixed', apd_tol=1.0, vmax_tol=0.5):
     """ Create model from individual DEAP object.
     The optimized parameters are limited to the membrane conductances/fluxes.
     There is an additional parameter: phi for leak on the dynamic clamp.
@@ -20,6 +232,26 @@ def run_ind_dclamp(ind, dc_ik1=1.0, nai=10.0, ki=130.0, printIND=False):
      ind[11] = 'G_b_Na'
      ind[12] = 'G_b_Ca'
      ind[13] = 'G_PCa'
+
+    The control is paced once for 10s and every perturbation in *conditions*
+    (default DCLAMP_CONDITIONS) branches from the final control state and is
+    paced for 10s as well. A shorter *branch_stim_end* (ms) is opt-in: a
+    branch is then paced for *branch_stim_end* ms and only paced on to the
+    full 10s if its last two beats have not converged within *apd_tol* and
+    *vmax_tol* (see trace_converged).
+
+    If a SteadyStateCache is given as *ss_cache*, the control is warm-started
+    from the nearest cached state and paced only until successive beats
+    converge (see pace_until_converged). The paced control state is stored
+    back in the cache.
+
+    With *pacing* = 'adaptive' every condition is paced beat by beat until
+    successive beats converge, the branches for at most *branch_stim_end* ms
+    of beats (10 by default), and the run stops at the first condition
+    that clearly fails (no upstroke or depolarization block).
+
+    *apd_tol* (ms) and *vmax_tol* (mV) are the convergence tolerances of the
+    beat by beat pacing; looser tolerances stop the pacing sooner.
     """
 
     ap_failure = False
@@ -27,142 +259,81 @@ def run_ind_dclamp(ind, dc_ik1=1.0, nai=10.0, ki=130.0, printIND=False):
     # Print individual passed to function (debug)
     if (printIND):
         print(list(ind))
-    
-    # Create the model from the DEAP individual.
-    kci = KernikModel()
-   
-    # Apply dynamic-clamp leak
-    if (ind[0] >= 0.0 and ind[0] < 1.0):
-        ik1_leak = dc_ik1 * ind[0]
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak}
-    else:
-        print('phi != [0:1)')
-        return None
-
-   
-    # Check bounds on ind
-    for i in range(1, len(ind)):
-        if (ind[i] < 0.0):
-            print('Individual out of range.')
-            return None
 
-    # Intialize individual to model
-    kci.default_parameters['G_K1']  = ind[1]
-    kci.default_parameters['G_Kr']  = ind[2]
-    kci.default_parameters['G_Ks']  = ind[3] 
-    kci.default_parameters['G_to']  = ind[4] 
-    kci.default_parameters['P_CaL'] = ind[5]
-    kci.default_parameters['G_CaT'] = ind[6]
-    kci.default_parameters['G_Na']  = ind[7] 
-    kci.default_parameters['G_F']   = ind[8]  
-    kci.default_parameters['K_NaCa']= ind[9]
-    kci.default_parameters['P_NaK'] = ind[10]
-    kci.default_parameters['G_b_Na']= ind[11]
-    kci.default_parameters['G_b_Ca']= ind[12]
-    kci.default_parameters['G_PCa'] = ind[13]
+    if conditions is None:
+        conditions = DCLAMP_CONDITIONS
+    if pacing not in ('fixed', 'adaptive'):
+        print('pacing must be fixed or adaptive.')
+        return None
+    adaptive = (pacing == 'adaptive')
 
-    # Set internal monovalent ion concentrations
-    kci.nai_millimolar = nai
-    kci.ki_millimolar = ki
+    # Create the model from the DEAP individual.
+    kci = build_kernik_model(ind, dc_ik1, nai, ki)
+    if kci is None:
+        return None
+    ik1_leak = dc_ik1 * ind[0]
 
     # Create 10s paced protocol
-    KERNIK_PROTOCOL = protocols.PacedProtocol(model_name="Kernik", stim_end=10000, stim_mag=2)
+    KERNIK_PROTOCOL = protocols.PacedProtocol(model_name="Kernik", stim_end=STIM_END, stim_mag=2)
+    if branch_stim_end is None or branch_stim_end >= STIM_END:
+        BRANCH_PROTOCOL = KERNIK_PROTOCOL
+        REST_PROTOCOL = None
+        branch_beats = int(STIM_END // BEAT_LENGTH)
+    else:
+        BRANCH_PROTOCOL = protocols.PacedProtocol(model_name="Kernik", stim_end=branch_stim_end,
+                                                  stim_mag=2)
+        # get_last_ap needs at least 5 beats
+        REST_PROTOCOL = protocols.PacedProtocol(model_name="Kernik",
+                                                stim_end=max(STIM_END - branch_stim_end,
+                                                             5*BEAT_LENGTH),
+                                                stim_mag=2)
+        branch_beats = int(branch_stim_end // BEAT_LENGTH)
 
     # Create AP_set dict
-    ap_set = {'cntrl': None,
-              '-0.15_ical': None,
-              '0.7_ical': None,
-              '-0.25_ikr': None,
-              '0.9_ikr': None,
-              '-0.9_ito': None,
-              '1.5_ito': None,
-              '10_iks': None,
-              '4_iks': None}
+    ap_set = dict.fromkeys([key for key, _, _ in conditions])
+    branches = [c for c in conditions if c[1] is not None]
+
+    # Look for a paced state of a neighbouring individual
+    y_warm = None
+    if ss_cache is not None:
+        y_warm = ss_cache.nearest(ind, dc_ik1, nai, ki)
 
     try:
         # Run Ishihara IK1
-        tr_ishi = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        y_ishi_final = kci.y_initial
-        tr_ishi.get_last_ap()
-        ap_set['cntrl'] = tr_ishi.last_ap
-        del tr_ishi
-   
-        # Run ICal -0.15
-        kci.y_initial = y_ishi_final
-        ical_leak = ind[0] * -0.15
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_CaL': ical_leak}
-        tr_ical_decrease = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_ical_decrease.get_last_ap()
-        ap_set['-0.15_ical'] = tr_ical_decrease.last_ap
-        del tr_ical_decrease
-   
-        # Run ICal 0.7
-        kci.y_initial = y_ishi_final
-        ical_leak = ind[0] * 0.7
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_CaL': ical_leak}
-        tr_ical_increase = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_ical_increase.get_last_ap()
-        ap_set['0.7_ical'] = tr_ical_increase.last_ap
-        del tr_ical_increase
-
-        # Run IKr -0.25
-        kci.y_initial = y_ishi_final
-        ikr_leak = ind[0] * -0.25
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_Kr': ikr_leak}
-        tr_ikr_decrease = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_ikr_decrease.get_last_ap()
-        ap_set['-0.25_ikr'] = tr_ikr_decrease.last_ap
-        del tr_ikr_decrease
-
-        # Run IKr 0.9
-        kci.y_initial = y_ishi_final
-        ikr_leak = ind[0] * 0.9
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_Kr': ikr_leak}
-        tr_ikr_increase = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_ikr_increase.get_last_ap()
-        ap_set['0.9_ikr'] = tr_ikr_increase.last_ap
-        del tr_ikr_increase
-
-        # Run Ito -0.9
-        kci.y_initial = y_ishi_final
-        ito_leak = ind[0] * -0.9
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_To': ito_leak}
-        tr_ito_decrease = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_ito_decrease.get_last_ap()
-        ap_set['-0.9_ito'] = tr_ito_decrease.last_ap
-        del tr_ito_decrease
-
-        # Run Ito 1.5
-        kci.y_initial = y_ishi_final
-        ito_leak = ind[0] * 1.5
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_To': ito_leak}
-        tr_ito_increase = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_ito_increase.get_last_ap()
-        ap_set['1.5_ito'] = tr_ito_increase.last_ap
-        del tr_ito_increase
-
-        # Run IKs 10
-        kci.y_initial = y_ishi_final
-        iks_leak = ind[0] * 10.0
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_Ks': iks_leak}
-        tr_iks_10 = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_iks_10.get_last_ap()
-        ap_set['10_iks'] = tr_iks_10.last_ap
-        del tr_iks_10
-
-        # Run IKs 4
-        kci.y_initial = y_ishi_final
-        iks_leak = ind[0] * 4.0
-        kci._CellModel__no_ion_selective = {'I_K1_Ishi': ik1_leak, 'I_Ks': iks_leak}
-        tr_iks_4 = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
-        tr_iks_4.get_last_ap()
-        ap_set['4_iks'] = tr_iks_4.last_ap
-        del tr_iks_4
+        if y_warm is not None:
+            cntrl_ap, y_ishi_final, _ = pace_until_converged(kci, y_warm, apd_tol=apd_tol,
+                                                             vmax_tol=vmax_tol)
+        elif adaptive:
+            cntrl_ap, y_ishi_final, _ = pace_until_converged(kci, kci.y_initial,
+                                                             apd_tol=apd_tol,
+                                                             vmax_tol=vmax_tol)
+        else:
+            tr_ishi = kci.generate_response(KERNIK_PROTOCOL, is_no_ion_selective=True)
+            y_ishi_final = kci.y_initial
+            tr_ishi.get_last_ap()
+            cntrl_ap = tr_ishi.last_ap
+            del tr_ishi
+        if cntrl_ap is None:
+            # Control failed, skip the perturbations
+            raise IndexError('control pacing failed')
+        for key, current, _ in conditions:
+            if current is None:
+                ap_set[key] = cntrl_ap
+        if ss_cache is not None:
+            ss_cache.put(ind, dc_ik1, y_ishi_final, nai, ki)
+
+        # Run the perturbations from the control state
+        branch_aps, ap_failure = run_dclamp_branches(kci, y_ishi_final, ik1_leak, ind[0],
+                                                     branches, BRANCH_PROTOCOL, adaptive,
+                                                     apd_tol, vmax_tol, branch_beats,
+                                                     REST_PROTOCOL)
+        ap_set.update(branch_aps)
 
         # Check if APs were generated
-        for i in ap_set.keys():
-            if ((max(ap_set[i].t)-min(ap_set[i].t)) < 800.0):
-                ap_failure = True
+        if not ap_failure:
+            for i in ap_set.keys():
+                if ((max(ap_set[i].t)-min(ap_set[i].t)) < 800.0):
+                    ap_failure = True
 
     except (OverflowError, IndexError):
         ap_failure = True
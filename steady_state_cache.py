@@ -0,0 +1,150 @@
+import os
+import hashlib
+import numpy as np
+
+
+# In-memory tier shared by every SteadyStateCache of a process with the same
+# path. Pool workers unpickle a new cache object for every task, so keeping
+# the states at module level lets them accumulate across tasks.
+_MEMORY = {}
+
+# Directory of the on-disk tiers of the caches unpickled in this process
+# (see relocate), False to keep their own path.
+_LOCAL_DIR = False
+
+
+def relocate(directory):
+    """Keeps the on-disk tier of every SteadyStateCache unpickled from now on
+    in this process under *directory* instead of its own path, or only in
+    memory if *directory* is None (see fitness_cache.relocate)."""
+    global _LOCAL_DIR
+    _LOCAL_DIR = directory
+
+
+class SteadyStateCache:
+    """ Cache of paced Kernik model states keyed by a quantized individual.
+    States are kept in memory and, if a path is given, in one .npz file per
+    state so that every worker process and later restarts can reuse them.
+    Attributes:
+      path: Directory holding the on-disk tier (None keeps it in memory).
+      resolution: Quantization step of phi and of the log10 conductances.
+      max_distance: Largest distance (in phi/log10 units) of a usable
+                    neighbour for a warm start.
+    """
+
+    def __init__(self, path=None, resolution=0.01, max_distance=0.1):
+        self.path = path
+        self.resolution = resolution
+        self.max_distance = max_distance
+        if path is not None and not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+        self._attach()
+
+    def __getstate__(self):
+        # Only the settings are sent to the workers, never the states.
+        return {'path': self.path, 'resolution': self.resolution,
+                'max_distance': self.max_distance}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if (_LOCAL_DIR is not False and self.path is not None):
+            if _LOCAL_DIR is None:
+                self.path = None
+            else:
+                self.path = os.path.join(_LOCAL_DIR, os.path.basename(os.path.normpath(self.path)))
+                os.makedirs(self.path, exist_ok=True)
+        self._attach()
+
+    def _attach(self):
+        memory = _MEMORY.setdefault((self.path, self.resolution),
+                                    {'states': {}, 'files': set(),
+                                     'coords': {}})
+        self.states = memory['states']
+        self.files = memory['files']
+        self._coords = memory['coords']
+
+    def coords(self, ind):
+        """Returns the continuous coordinates of *ind*: phi followed by the
+        log10 of the conductances."""
+        x = np.asarray(ind, dtype=np.float64)
+        c = np.empty(len(x))
+        c[0] = x[0]
+        c[1:] = np.log10(np.maximum(x[1:], 1e-12))
+        return c
+
+    def key(self, ind, dc_ik1=1.0, nai=10.0, ki=130.0):
+        """Returns the quantized cache key of *ind* under the given dynamic
+        clamp and ion concentrations."""
+        q = np.rint(self.coords(ind) / self.resolution).astype(np.int64)
+        return (round(dc_ik1, 6), round(nai, 6), round(ki, 6)) + tuple(q.tolist())
+
+    def get(self, ind, dc_ik1=1.0, nai=10.0, ki=130.0):
+        """Returns the state cached under the exact key of *ind*, or None."""
+        k = self.key(ind, dc_ik1, nai, ki)
+        if k not in self.states:
+            self.refresh()
+        return self.states.get(k)
+
+    def nearest(self, ind, dc_ik1=1.0, nai=10.0, ki=130.0):
+        """Returns the cached state closest to *ind* within max_distance, or
+        None if there is no such state."""
+        k = self.key(ind, dc_ik1, nai, ki)
+        if k in self.states:
+            return self.states[k]
+        self.refresh()
+        if k in self.states:
+            return self.states[k]
+        keys, coords = self._context_coords(k[:3])
+        if len(keys) == 0:
+            return None
+        dist = np.sqrt(np.sum((coords - self.coords(ind))**2, axis=1))
+        i = int(np.argmin(dist))
+        if dist[i] > self.max_distance:
+            return None
+        return self.states[keys[i]]
+
+    def put(self, ind, dc_ik1, y, nai=10.0, ki=130.0):
+        """Stores the paced state *y* of *ind* in memory and on disk."""
+        k = self.key(ind, dc_ik1, nai, ki)
+        y = np.array(y, dtype=np.float64)
+        self._store(k, y)
+        if self.path is not None:
+            filename = self._filename(k)
+            tmp = os.path.join(self.path, '.' + filename + '.' + str(os.getpid()))
+            with open(tmp, 'wb') as f:
+                np.savez(f, key=np.array(k, dtype=np.float64), y=y)
+            os.replace(tmp, os.path.join(self.path, filename))
+            self.files.add(filename)
+
+    def refresh(self):
+        """Loads the states written to disk by other processes."""
+        if self.path is None:
+            return
+        for i in os.listdir(self.path):
+            if (i.startswith('ss_') and i.endswith('.npz') and i not in self.files):
+                try:
+                    with np.load(os.path.join(self.path, i)) as data:
+                        k = data['key']
+                        k = (tuple(float(j) for j in k[:3]) +
+                             tuple(int(j) for j in k[3:]))
+                        self._store(k, data['y'])
+                except (OSError, ValueError, KeyError):
+                    print('Could not load cached state: '+i)
+                self.files.add(i)
+
+    def _store(self, k, y):
+        self.states[k] = y
+        self._coords.pop(k[:3], None)
+
+    def _context_coords(self, context):
+        if context not in self._coords:
+            keys = [k for k in self.states.keys() if k[:3] == context]
+            coords = np.array([k[3:] for k in keys], dtype=np.float64)
+            self._coords[context] = (keys, coords * self.resolution)
+        return self._coords[context]
+
+    def _filename(self, k):
+        return 'ss_' + hashlib.sha1(repr(k).encode()).hexdigest() + '.npz'
+
+    def __len__(self):
+        return len(self.states)
@@ -0,0 +1,159 @@
+""" Surrogate pre-screening of offspring.
+
+KNNSurrogate is a k-nearest-neighbour regressor of the fitness on the log
+of the genes, trained online on every evaluated (genome, fitness) pair of
+the run. SurrogateScreen is a variation for eaMuCommaLambda on a
+population.PopulationArrays: it samples *oversample* times lambda_
+candidates with es_variation.varOrArrays, ranks the new candidates by the
+predicted fitness and only passes the most promising lambda_ on to be
+simulated, so the rejected candidates are replaced by the extra sampled
+ones. Reproduced candidates keep their known fitness and are not ranked:
+they take as many of the lambda_ slots as varOrArrays would give them, so
+clones of good parents do not crowd out the new offspring.
+"""
+
+import numpy as np
+
+from es_variation import varOrArrays, get_rng
+from generation_archive import read_archive
+
+
+# Floor of the genes before taking their log.
+_TINY = 1e-12
+# Number of rows predicted at once.
+_BLOCK = 256
+
+
+def _features(genomes):
+    return np.log(np.maximum(np.asarray(genomes, dtype=np.float64), _TINY))
+
+
+class KNNSurrogate:
+    """ Inverse-distance weighted k-NN regression of the fitness.
+    Attributes:
+      k: Number of neighbours.
+      maxsize: Number of most recent training pairs kept.
+    """
+
+    def __init__(self, k=3, maxsize=20000):
+        self.k = k
+        self.maxsize = maxsize
+        self._x = None
+        self._y = np.empty(0)
+
+    @classmethod
+    def from_archive(cls, path, **kargs):
+        """Returns a KNNSurrogate trained on the generation archive at
+        *path* (see generation_archive)."""
+        surrogate = cls(**kargs)
+        data = read_archive(path, columns=('genome', 'fitness'))
+        surrogate.add(data['genome'], data['fitness'])
+        return surrogate
+
+    def add(self, genomes, fitness):
+        """Adds the pairs of the (n, D) *genomes* and (n,) *fitness*;
+        pairs with a NaN fitness are skipped."""
+        fitness = np.asarray(fitness, dtype=np.float64)
+        keep = ~np.isnan(fitness)
+        if not keep.any():
+            return
+        x = _features(genomes)[keep]
+        if self._x is None:
+            self._x = x
+            self._y = fitness[keep]
+        else:
+            self._x = np.concatenate((self._x, x))[-self.maxsize:]
+            self._y = np.concatenate((self._y, fitness[keep]))[-self.maxsize:]
+
+    def predict(self, genomes):
+        """Returns the predicted fitness of the (n, D) *genomes*."""
+        if not len(self):
+            raise ValueError('the surrogate has no training data')
+        # Distances in units of the spread of each feature
+        scale = self._x.std(axis=0)
+        scale[scale == 0.0] = 1.0
+        train = self._x / scale
+        train_sq = np.sum(train**2, axis=1)
+        x = _features(genomes) / scale
+        k = min(self.k, len(self))
+        pred = np.empty(len(x))
+        # Rows in blocks to bound the size of the distance matrix
+        for i in range(0, len(x), _BLOCK):
+            xb = x[i:i+_BLOCK]
+            d2 = np.sum(xb**2, axis=1)[:, None] - 2.0 * xb @ train.T + train_sq
+            np.maximum(d2, 0.0, out=d2)
+            nearest = np.argpartition(d2, k - 1, axis=1)[:, :k]
+            w = 1.0 / (np.sqrt(np.take_along_axis(d2, nearest, axis=1)) + _TINY)
+            pred[i:i+_BLOCK] = np.sum(w * self._y[nearest], axis=1) / np.sum(w, axis=1)
+        return pred
+
+    def __len__(self):
+        return len(self._y)
+
+
+class SurrogateScreen:
+    """ Variation for eaMuCommaLambda that pre-screens the offspring of
+    es_variation.varOrArrays with a surrogate. The offspring returned by a
+    call are added to the surrogate at the next call, once evaluated.
+    Attributes:
+      surrogate: Regressor with add() and predict(), e.g. KNNSurrogate.
+      oversample: Number of candidates sampled per offspring.
+      explore: Fraction of the new offspring taken at random from the
+               candidates rather than by rank, so that regions the
+               surrogate rates poorly are still sampled.
+      min_samples: Number of training pairs before screening starts.
+    """
+
+    def __init__(self, surrogate=None, oversample=8, explore=0.1, min_samples=20):
+        self.surrogate = surrogate if surrogate is not None else KNNSurrogate()
+        self.oversample = oversample
+        self.explore = explore
+        self.min_samples = min_samples
+        self._last = None
+        self._seen = False
+
+    def learn(self, population):
+        """Adds the evaluated individuals of *population* to the surrogate."""
+        self.surrogate.add(population.genomes, population.fitness)
+
+    def __call__(self, population, toolbox, lambda_, cxpb, mutpb, alpha=0.3,
+                 indpb=0.3, rng=None):
+        rng = get_rng(rng)
+        if not self._seen:
+            self.learn(population)
+            self._seen = True
+        if self._last is not None:
+            offspring, new = self._last
+            self.surrogate.add(offspring.genomes[new], offspring.fitness[new])
+        if (len(self.surrogate) < self.min_samples or self.oversample <= 1):
+            offspring = varOrArrays(population, toolbox, lambda_, cxpb, mutpb,
+                                    alpha, indpb, rng)
+        else:
+            candidates = varOrArrays(population, toolbox, self.oversample * lambda_,
+                                     cxpb, mutpb, alpha, indpb, rng)
+            # As many reproductions as varOrArrays would draw for lambda_
+            nrepro = rng.binomial(lambda_, max(0.0, 1.0 - cxpb - mutpb))
+            offspring = candidates.take(self.select(candidates, lambda_, rng, nrepro))
+        # Only the new offspring are evaluated, reproduced ones are known
+        self._last = (offspring, offspring.invalid())
+        return offspring
+
+    def select(self, candidates, lambda_, rng, nrepro=0):
+        """Returns the indices of the *lambda_* candidates to keep: *nrepro*
+        reproduced candidates drawn at random and the new candidates ranked
+        by their predicted fitness in the other slots."""
+        new = np.flatnonzero(np.isnan(candidates.fitness))
+        repro = np.flatnonzero(~np.isnan(candidates.fitness))
+        nrepro = min(max(nrepro, lambda_ - len(new)), len(repro))
+        keep = [rng.choice(repro, nrepro, replace=False)] if nrepro else []
+        nslots = lambda_ - nrepro
+        if (nslots > 0):
+            score = self.surrogate.predict(candidates.genomes[new])
+            # Larger weighted fitness is better, as in deap.base.Fitness
+            order = new[np.argsort(-score * candidates.weights[0], kind='stable')]
+            nexplore = int(self.explore * nslots)
+            keep.append(order[:nslots - nexplore])
+            if (nexplore > 0):
+                rest = order[nslots - nexplore:]
+                keep.append(rng.choice(rest, nexplore, replace=False))
+        return np.sort(np.concatenate(keep)).astype(np.intp)
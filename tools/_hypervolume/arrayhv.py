@@ -0,0 +1,250 @@
+"""Hypervolume on arrays, the replacement of the C extension :mod:`hv` on the
+interpreters it is not built for.
+
+The two and three dimensional hypervolumes are sweeps on the last
+objective of the staircase of the first two, vectorized in two dimensions.
+From four dimensions on, with numba installed, this is the dimension-sweep
+algorithm of :mod:`pyhv` (variant 3 of Fonseca, Paquete and Lopez-Ibanez,
+2006) compiled, with the doubly linked lists of :class:`pyhv._MultiList` as
+flat arrays: the links, area and volume of node i in dimension j are at
+index i * M + j, the sentinel is node N. Without numba, the hypervolume is
+the sum of the hypervolumes of the slices on the last objective, down to
+the three dimensional sweep.
+
+Minimization is implicitly assumed here!
+"""
+
+import bisect
+import warnings
+
+import numpy
+
+try:
+    import numba
+    from numba.core.errors import NumbaError
+except ImportError:
+    numba = None
+
+from ..emo import nondominated_fronts
+
+
+def hypervolume(pointset, ref):
+    """Compute the absolute hypervolume of a *pointset* according to the
+    reference point *ref*. Points outside of the reference point add no
+    volume.
+    """
+    ref = numpy.asarray(ref, dtype=numpy.float64)
+    points = numpy.minimum(numpy.asarray(pointset, dtype=numpy.float64), ref)
+    if len(points) == 0:
+        return 0.0
+    nobj = points.shape[1]
+    if nobj == 1:
+        return float(ref[0] - points[:, 0].min())
+    elif nobj == 2:
+        return _hypervolume_2d(points, ref)
+    elif nobj == 3:
+        return _hypervolume_3d(points, ref)
+
+    points = _front(points)
+    if numba is not None:
+        try:
+            return _dimension_sweep(points - ref)
+        except NumbaError as e:
+            warnings.warn("Cannot compile the hypervolume kernel with numba, "
+                          "falling back to Python: {0}".format(e), RuntimeWarning)
+            _python_kernel()
+
+    # Slices of the points sorted on the last objective
+    points = points[numpy.argsort(points[:, -1], kind='stable')]
+    bounds = numpy.append(points[1:, -1], ref[-1])
+    volume = 0.0
+    for k in range(len(points)):
+        if bounds[k] > points[k, -1]:
+            volume += hypervolume(points[:k+1, :-1], ref[:-1]) * (bounds[k] - points[k, -1])
+    return volume
+
+
+def _front(points):
+    # The non-dominated points, one of each equal ones
+    if len(points) < 2:
+        return points
+    points = numpy.unique(points, axis=0)
+    return points[nondominated_fronts(-points, first_front_only=True)[0]]
+
+
+def _is_front(points):
+    # Whether the points are distinct and non-dominated
+    return len(_front(points)) == len(points)
+
+
+def _hypervolume_2d(points, ref):
+    # Staircase of the points sorted on the first objective, less those
+    # not below the points before
+    points = points[numpy.lexsort(points.T[::-1])]
+    lowest = numpy.minimum.accumulate(points[:, 1])
+    points = points[numpy.insert(points[1:, 1] < lowest[:-1], 0, True)]
+    widths = numpy.append(points[1:, 0], ref[0]) - points[:, 0]
+    return float(numpy.dot(widths, ref[1] - points[:, 1]))
+
+
+def _hypervolume_3d(points, ref):
+    # Sweep on the third objective, with the area dominated by the points
+    # below kept on the staircase of their first two objectives (the first
+    # increasing, the second decreasing)
+    rx, ry, rz = ref.tolist()
+    xs, ys = [], []
+    volume, area, last_z = 0.0, 0.0, None
+    for x, y, z in points[numpy.argsort(points[:, 2], kind='stable')].tolist():
+        if last_z is not None:
+            volume += area * (z - last_z)
+        last_z = z
+        start = bisect.bisect_left(xs, x)
+        if (start > 0 and ys[start-1] <= y) or (start < len(xs) and xs[start] == x and ys[start] <= y):
+            continue
+        stop = start
+        while stop < len(ys) and ys[stop] >= y:
+            stop += 1
+
+        # Area between the point and the staircase, over the points it
+        # dominates
+        cur_x, cur_y = x, ys[start-1] if start > 0 else ry
+        for k in range(start, stop):
+            area += (xs[k] - cur_x) * (cur_y - y)
+            cur_x, cur_y = xs[k], ys[k]
+        area += ((xs[stop] if stop < len(xs) else rx) - cur_x) * (cur_y - y)
+        xs[start:stop] = [x]
+        ys[start:stop] = [y]
+    return volume + area * (rz - last_z)
+
+
+def _dimension_sweep(points):
+    # Hypervolume of the points translated so that the reference point is
+    # [0, ..., 0], on the node arrays
+    n, nobj = points.shape
+    sentinel = n
+    next_ = numpy.empty((n + 1, nobj), dtype=numpy.int64)
+    prev = numpy.empty((n + 1, nobj), dtype=numpy.int64)
+    for j in range(nobj):
+        # Lists sorted on each objective, from the sentinel back to it
+        order = numpy.argsort(points[:, j], kind='stable')
+        chain = numpy.concatenate(([sentinel], order, [sentinel]))
+        next_[chain[:-1], j] = chain[1:]
+        prev[chain[1:], j] = chain[:-1]
+
+    cargo = numpy.concatenate((points, numpy.full((1, nobj), -numpy.inf))).ravel()
+    area = numpy.zeros((n + 1) * nobj)
+    volume = numpy.zeros((n + 1) * nobj)
+    ignore = numpy.zeros(n + 1, dtype=numpy.int64)
+    bounds = numpy.full(nobj, -1.0e308)
+    return float(_hv_recursive(nobj - 1, n, cargo, next_.ravel(), prev.ravel(), area, volume,
+                               ignore, bounds, nobj, sentinel))
+
+
+def _hv_recursive(dim, length, cargo, next_, prev, area, volume, ignore, bounds,
+                  nobj, sentinel):
+    # pyhv._HyperVolume.hvRecursive on the node arrays
+    hvol = 0.0
+    if length == 0:
+        return hvol
+    elif dim == 0:
+        # special case: only one dimension
+        return -cargo[next_[sentinel * nobj] * nobj]
+    elif dim == 1:
+        # special case: two dimensions, end recursion
+        q = next_[sentinel * nobj + 1]
+        h = cargo[q * nobj]
+        p = next_[q * nobj + 1]
+        while p != sentinel:
+            hvol += h * (cargo[q * nobj + 1] - cargo[p * nobj + 1])
+            if cargo[p * nobj] < h:
+                h = cargo[p * nobj]
+            q = p
+            p = next_[q * nobj + 1]
+        hvol += h * cargo[q * nobj + 1]
+        return hvol
+
+    p = sentinel
+    q = prev[p * nobj + dim]
+    while q != sentinel:
+        if ignore[q] < dim:
+            ignore[q] = 0
+        q = prev[q * nobj + dim]
+    q = prev[p * nobj + dim]
+    while length > 1 and (cargo[q * nobj + dim] > bounds[dim] or
+                          cargo[prev[q * nobj + dim] * nobj + dim] >= bounds[dim]):
+        p = q
+        _remove(p, dim, cargo, next_, prev, bounds, nobj)
+        q = prev[p * nobj + dim]
+        length -= 1
+    q_prev = prev[q * nobj + dim]
+    if length > 1:
+        hvol = volume[q_prev * nobj + dim] + area[q_prev * nobj + dim] * (
+            cargo[q * nobj + dim] - cargo[q_prev * nobj + dim])
+    else:
+        area[q * nobj] = 1.0
+        for i in range(dim):
+            area[q * nobj + i + 1] = area[q * nobj + i] * -cargo[q * nobj + i]
+    volume[q * nobj + dim] = hvol
+    if ignore[q] >= dim:
+        area[q * nobj + dim] = area[q_prev * nobj + dim]
+    else:
+        area[q * nobj + dim] = _hv_recursive(dim - 1, length, cargo, next_, prev, area, volume,
+                                             ignore, bounds, nobj, sentinel)
+        if area[q * nobj + dim] <= area[q_prev * nobj + dim]:
+            ignore[q] = dim
+    while p != sentinel:
+        p_cargo = cargo[p * nobj + dim]
+        hvol += area[q * nobj + dim] * (p_cargo - cargo[q * nobj + dim])
+        bounds[dim] = p_cargo
+        _reinsert(p, dim, cargo, next_, prev, bounds, nobj)
+        length += 1
+        q = p
+        p = next_[p * nobj + dim]
+        volume[q * nobj + dim] = hvol
+        q_prev = prev[q * nobj + dim]
+        if ignore[q] >= dim:
+            area[q * nobj + dim] = area[q_prev * nobj + dim]
+        else:
+            area[q * nobj + dim] = _hv_recursive(dim - 1, length, cargo, next_, prev, area, volume,
+                                                 ignore, bounds, nobj, sentinel)
+            if area[q * nobj + dim] <= area[q_prev * nobj + dim]:
+                ignore[q] = dim
+    hvol -= area[q * nobj + dim] * cargo[q * nobj + dim]
+    return hvol
+
+
+def _remove(node, dim, cargo, next_, prev, bounds, nobj):
+    # Removes node from all lists in [0, dim[
+    for i in range(dim):
+        predecessor = prev[node * nobj + i]
+        successor = next_[node * nobj + i]
+        next_[predecessor * nobj + i] = successor
+        prev[successor * nobj + i] = predecessor
+        if bounds[i] > cargo[node * nobj + i]:
+            bounds[i] = cargo[node * nobj + i]
+
+
+def _reinsert(node, dim, cargo, next_, prev, bounds, nobj):
+    # Inserts node back at its position in all lists in [0, dim[
+    for i in range(dim):
+        next_[prev[node * nobj + i] * nobj + i] = node
+        prev[next_[node * nobj + i] * nobj + i] = node
+        if bounds[i] > cargo[node * nobj + i]:
+            bounds[i] = cargo[node * nobj + i]
+
+
+if numba is not None:
+    # The recursion goes through the module names, bound to the compiled
+    # functions
+    _remove = numba.njit(cache=True)(_remove)
+    _reinsert = numba.njit(cache=True)(_reinsert)
+    _hv_recursive = numba.njit(cache=True)(_hv_recursive)
+
+
+def _python_kernel():
+    # Hypervolumes from the slices from now on
+    global numba
+    numba = None
+
+
+__all__ = ["hypervolume"]
@@ -0,0 +1,195 @@
+"""Exclusive hypervolume contributions on arrays of points.
+
+Minimization is implicitly assumed here, as in :mod:`pyhv`. The exact
+contributions of a front of distinct non-dominated points come from one
+sort-and-sweep in two and three dimensions. Otherwise the contribution of a
+point p is the volume of its box [p, ref] minus the hypervolume of the
+other points moved to max(q, p), which only a few points near p make
+non-zero. The same holds for the volume a point gains when another is
+removed, so that :class:`HypervolumeContributions` updates the
+contributions incrementally.
+"""
+
+import bisect
+
+import numpy
+
+from .arrayhv import hypervolume, _front, _is_front
+
+
+def contributions(points, ref):
+    """Returns the exclusive hypervolume contribution of each of the (N, M)
+    *points* with the reference point *ref*, the hypervolume lost when
+    removing only that point.
+    """
+    ref = numpy.asarray(ref, dtype=numpy.float64)
+    points = numpy.minimum(numpy.asarray(points, dtype=numpy.float64), ref)
+    if len(points) == 0:
+        return numpy.zeros(0)
+    nobj = points.shape[1]
+    if nobj in (2, 3) and _is_front(points):
+        if nobj == 2:
+            return _contributions_2d(points, ref)
+        return _contributions_3d(points, ref)
+    return numpy.array([_exclusive_volume(numpy.delete(points, i, axis=0), points[i], ref)
+                        for i in range(len(points))])
+
+
+class HypervolumeContributions:
+    """Exclusive hypervolume contributions of a set of points that are
+    updated when a point is removed, as in the SMS-EMOA reduction of the
+    last front, one point of least contribution at a time.
+
+        contrib = HypervolumeContributions(points, ref)
+        while contrib.size > k:
+            contrib.remove(contrib.argmin())
+
+    The contributions of the removed points are infinite in :attr:`values`.
+    """
+
+    def __init__(self, points, ref):
+        self.ref = numpy.asarray(ref, dtype=numpy.float64)
+        self.points = numpy.minimum(numpy.asarray(points, dtype=numpy.float64), self.ref)
+        self.values = contributions(self.points, self.ref)
+        self.alive = numpy.ones(len(self.points), dtype=bool)
+
+        # Neighbours on the staircase of a two objectives front, -1 for the
+        # reference point
+        self._staircase = self.points.shape[1] == 2 and _is_front(self.points)
+        if self._staircase:
+            order = numpy.argsort(self.points[:, 0], kind='stable')
+            self._left = numpy.empty(len(order), dtype=numpy.int64)
+            self._right = numpy.empty(len(order), dtype=numpy.int64)
+            self._left[order] = numpy.insert(order[:-1], 0, -1)
+            self._right[order] = numpy.append(order[1:], -1)
+
+    @property
+    def size(self):
+        """Number of points not removed."""
+        return int(self.alive.sum())
+
+    def argmin(self):
+        """Returns the index of the point of least contribution."""
+        return int(numpy.argmin(self.values))
+
+    def remove(self, i):
+        """Removes the point *i* and adds to the contribution of the others
+        the volume that was only theirs and the point's."""
+        self.alive[i] = False
+        self.values[i] = numpy.inf
+        if self._staircase:
+            self._remove_step(i)
+            return
+        others = numpy.flatnonzero(self.alive)
+        if len(others) == 0:
+            return
+        points = self.points[others]
+        shared = numpy.maximum(points, self.points[i])
+
+        # The volume shared by q and the point removed is in the box of
+        # max(q, point), which has volume left only if no other point
+        # dominates that corner. The points nearest to the removed one
+        # cover most corners, so only the others are checked against all.
+        index = numpy.arange(len(others))
+        near = numpy.argsort(numpy.sum((points - self.points[i])**2, axis=1))[:_NEAR]
+        candidates = index[~_covered(points[near], near, shared, index)]
+        candidates = candidates[~_covered(points, index, shared[candidates], candidates)]
+        for j in candidates.tolist():
+            self.values[others[j]] += _exclusive_volume(numpy.delete(points, j, axis=0),
+                                                        shared[j], self.ref)
+
+    def _remove_step(self, i):
+        # Only the neighbours on the staircase get a larger rectangle
+        left, right = self._left[i], self._right[i]
+        if left >= 0:
+            self._right[left] = right
+        if right >= 0:
+            self._left[right] = left
+        for j in (left, right):
+            if j >= 0:
+                x, y = self.points[j]
+                right_x = self.points[self._right[j], 0] if self._right[j] >= 0 else self.ref[0]
+                left_y = self.points[self._left[j], 1] if self._left[j] >= 0 else self.ref[1]
+                self.values[j] = (right_x - x) * (left_y - y)
+
+
+# Number of points nearest to a removed point checked first for covering
+_NEAR = 16
+
+def _covered(points, point_ids, corners, corner_ids):
+    # Whether each corner is dominated by one of the points, but the point
+    # of the same id
+    covered = numpy.ones((len(corners), len(points)), dtype=bool)
+    for m in range(points.shape[1]):
+        covered &= points[:, m] <= corners[:, m, None]
+    covered &= corner_ids[:, None] != point_ids
+    return covered.any(axis=1)
+
+
+def _exclusive_volume(others, point, ref):
+    # Volume of the box [point, ref] not dominated by the *others*
+    box = float(numpy.prod(ref - point))
+    if box == 0.0 or len(others) == 0:
+        return box
+    return max(box - hypervolume(numpy.maximum(others, point), ref), 0.0)
+
+
+def _contributions_2d(points, ref):
+    # Rectangle between each point and its neighbours on the staircase
+    order = numpy.argsort(points[:, 0], kind='stable')
+    x, y = points[order, 0], points[order, 1]
+    values = numpy.empty(len(points))
+    values[order] = (numpy.append(x[1:], ref[0]) - x) * (numpy.insert(y[:-1], 0, ref[1]) - y)
+    return values
+
+
+def _contributions_3d(points, ref):
+    # Sweep on the third objective as in arrayhv._hypervolume_3d. In a
+    # slice, the area only of a point of the staircase is its strip up to
+    # its neighbours less the area of the points below it that it alone
+    # dominates (its own staircase). An inserted point takes the points it
+    # dominates as its own, and changes only the areas of its neighbours.
+    rx, ry, rz = ref.tolist()
+    n = len(points)
+    values, areas, since = [0.0] * n, [0.0] * n, [0.0] * n
+    xs, ys, ids = [], [], []
+    owned = [None] * n
+
+    def update(k, z):
+        # Area of the k-th point of the staircase from height z
+        j = ids[k]
+        right_x = xs[k+1] if k + 1 < len(xs) else rx
+        left_y = ys[k-1] if k > 0 else ry
+        area = (right_x - xs[k]) * (left_y - ys[k])
+        below = owned[j]
+        for (x, y), (next_x, _) in zip(below, below[1:] + [(right_x, None)]):
+            area -= (next_x - x) * (left_y - y)
+        values[j] += areas[j] * (z - since[j])
+        areas[j], since[j] = area, z
+
+    coords = points.tolist()
+    for i in numpy.argsort(points[:, 2], kind='stable').tolist():
+        x, y, z = coords[i]
+        start = bisect.bisect_left(xs, x)
+        stop = start
+        while stop < len(ys) and ys[stop] >= y:
+            j = ids[stop]
+            values[j] += areas[j] * (z - since[j])
+            areas[j] = 0.0
+            stop += 1
+        owned[i] = list(zip(xs[start:stop], ys[start:stop]))
+        xs[start:stop] = [x]
+        ys[start:stop] = [y]
+        ids[start:stop] = [i]
+
+        # The points of the neighbours that the point also dominates are
+        # no longer theirs alone
+        for k in (start - 1, start + 1):
+            if 0 <= k < len(ids):
+                owned[ids[k]] = [(a, b) for a, b in owned[ids[k]] if a < x or b < y]
+                update(k, z)
+        update(start, z)
+
+    for j in ids:
+        values[j] += areas[j] * (rz - since[j])
+    return numpy.array(values)
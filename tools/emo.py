@@ -1,7 +1,8 @@
 
 import bisect
 from collections import defaultdict, namedtuple
-from itertools import chain
+import heapq
+from itertools import chain, combinations
 import math
 from operator import attrgetter, itemgetter
 import random
@@ -12,7 +13,7 @@ import numpy
 # Non-Dominated Sorting   (NSGA-II)  #
 ######################################
 
-def selNSGA2(individuals, k, nd='standard'):
+def selNSGA2(individuals, k, nd='numpy'):
     """Apply NSGA-II selection operator on the *individuals*. Usually, the
     size of *individuals* will be larger than *k* because any individual
     present in *individuals* will appear in the returned list at most once.
@@ -23,14 +24,17 @@ def selNSGA2(individuals, k, nd='standard'):
 
     :param individuals: A list of individuals to select from.
     :param k: The number of individuals to select.
-    :param nd: Specify the non-dominated algorithm to use: 'standard' or 'log'.
+    :param nd: Specify the non-dominated algorithm to use: 'numpy' (the
+               arrays of :func:`nondominated_fronts`), 'standard' or 'log'.
     :returns: A list of selected individuals.
 
     .. [Deb2002] Deb, Pratab, Agarwal, and Meyarivan, "A fast elitist
        non-dominated sorting genetic algorithm for multi-objective
        optimization: NSGA-II", 2002.
     """
-    if nd == 'standard':
+    if nd == 'numpy':
+        return _selNSGA2Arrays(individuals, k)
+    elif nd == 'standard':
         pareto_fronts = sortNondominated(individuals, k)
     elif nd == 'log':
         pareto_fronts = sortLogNondominated(individuals, k)
@@ -50,6 +54,29 @@ def selNSGA2(individuals, k, nd='standard'):
     return chosen
 
 
+def _selNSGA2Arrays(individuals, k):
+    # selNSGA2 on the fitness arrays of nondominated_fronts and
+    # crowding_distance
+    if k == 0 or len(individuals) == 0:
+        return []
+    values = numpy.array([ind.fitness.values for ind in individuals], dtype=numpy.float64)
+    weights = numpy.asarray(individuals[0].fitness.weights, dtype=numpy.float64)
+    pareto_fronts = nondominated_fronts(values * weights, k)
+
+    for front in pareto_fronts:
+        distances = crowding_distance(values[front])
+        for i, dist in zip(front.tolist(), distances.tolist()):
+            individuals[i].fitness.crowding_dist = dist
+
+    chosen = list(chain(*(front.tolist() for front in pareto_fronts[:-1])))
+    k = k - len(chosen)
+    if k > 0:
+        last = pareto_fronts[-1]
+        ranking = numpy.argsort(-distances, kind='stable')
+        chosen.extend(last[ranking[:k]].tolist())
+    return [individuals[i] for i in chosen]
+
+
 def sortNondominated(individuals, k, first_front_only=False):
     """Sort the first *k* *individuals* into different nondomination levels
     using the "Fast Nondominated Sorting Approach" proposed by Deb et al.,
@@ -124,23 +151,169 @@ def assignCrowdingDist(individuals):
     if len(individuals) == 0:
         return
 
-    distances = [0.0] * len(individuals)
-    crowd = [(ind.fitness.values, i) for i, ind in enumerate(individuals)]
+    distances = crowding_distance([ind.fitness.values for ind in individuals])
+    for ind, dist in zip(individuals, distances.tolist()):
+        ind.fitness.crowding_dist = dist
+
 
-    nobj = len(individuals[0].fitness.values)
+# Number of points compared at once against the points sorted before them
+_ND_BLOCK = 512
 
+def nondominated_fronts(wvalues, k=None, first_front_only=False):
+    """Sort the rows of the (N, M) array of weighted fitness values
+    *wvalues* into nondomination levels, as :func:`sortNondominated` does
+    for the individuals. The distinct rows are sorted lexicographically, so
+    a row can only be dominated by the rows before it; its front is then one
+    after the last front of its dominators, found by blocks of rows with
+    array comparisons (or by bisection for two objectives). Equal rows
+    share their front.
+
+    :param wvalues: The weighted fitness values, one row per individual.
+    :param k: The number of rows to sort (all of them if :obj:`None`).
+    :param first_front_only: If :obj:`True` sort only the first front.
+    :returns: A list of Pareto fronts as arrays of row indices, in
+              increasing order within a front.
+    """
+    wvalues = numpy.asarray(wvalues, dtype=numpy.float64)
+    n = len(wvalues)
+    k = n if k is None else min(k, n)
+    if k == 0:
+        return []
+
+    # Minimise the negated weighted values, on distinct lexicographically
+    # sorted points
+    points = -wvalues.reshape(n, -1)
+    order = numpy.lexsort(points.T[::-1])
+    points = points[order]
+    distinct = numpy.ones(n, dtype=bool)
+    numpy.any(points[1:] != points[:-1], axis=1, out=distinct[1:])
+    group = numpy.cumsum(distinct) - 1
+    points = points[distinct]
+
+    ranks = numpy.empty(n, dtype=numpy.int64)
+    if first_front_only:
+        ranks[order] = _first_front_ranks(points)[group]
+        return [numpy.flatnonzero(ranks == 0)]
+    ranks[order] = _front_ranks(points)[group]
+
+    fronts = numpy.split(numpy.argsort(ranks, kind='stable'),
+                         numpy.cumsum(numpy.bincount(ranks))[:-1])
+    # Keep the fronts up to the one holding the k-th row
+    nfronts = numpy.searchsorted(numpy.cumsum([len(f) for f in fronts]), k) + 1
+    return fronts[:nfronts]
+
+
+def _front_ranks(points):
+    """Front of each of the distinct lexicographically sorted *points*."""
+    n, nobj = points.shape
+    if nobj == 1:
+        return numpy.arange(n)
+
+    ranks = numpy.zeros(n, dtype=numpy.int64)
+    if nobj == 2:
+        # The smallest second objective of each front increases with the
+        # front, the first front without a smaller or equal one is the rank.
+        front_min = []
+        for i, value in enumerate(points[:, 1].tolist()):
+            rank = bisect.bisect_right(front_min, value)
+            if rank == len(front_min):
+                front_min.append(value)
+            else:
+                front_min[rank] = value
+            ranks[i] = rank
+        return ranks
+
+    for start in range(0, n, _ND_BLOCK):
+        stop = min(start + _ND_BLOCK, n)
+        block = points[start:stop]
+        # Points before have a smaller or equal first objective and are
+        # distinct, those smaller or equal on the other objectives dominate.
+        # With them in decreasing rank, the first dominator has the largest.
+        before = numpy.argsort(-ranks[:start], kind='stable')
+        block_ranks = _dominator_ranks(points[before], ranks[before], block)
+        # Points of the block dominating each other, until no rank changes
+        within = _dominators(block, block) & numpy.tri(stop - start, k=-1, dtype=bool)
+        ranks_in = block_ranks
+        while True:
+            order = numpy.argsort(-ranks_in, kind='stable')
+            new_ranks = numpy.maximum(block_ranks, _dominator_ranks(block[order], ranks_in[order],
+                                                                   block, within[:, order]))
+            if numpy.array_equal(new_ranks, ranks_in):
+                break
+            ranks_in = new_ranks
+        ranks[start:stop] = ranks_in
+    return ranks
+
+
+def _dominators(before, block):
+    # (len(block), len(before)) matrix of the points *before* smaller or
+    # equal to the points of *block* on all but the first objective
+    before = numpy.ascontiguousarray(before[:, 1:].T)
+    block = numpy.ascontiguousarray(block[:, 1:].T)
+    dominated = before[0] <= block[0, :, None]
+    for m in range(1, len(block)):
+        dominated &= before[m] <= block[m, :, None]
+    return dominated
+
+
+def _dominator_ranks(before, before_ranks, block, dominated=None):
+    # One more than the rank of the first dominator of the points of
+    # *block* among the points *before*, 0 without dominator
+    if len(before) == 0:
+        return numpy.zeros(len(block), dtype=numpy.int64)
+    if dominated is None:
+        dominated = _dominators(before, block)
+    first = dominated.argmax(axis=1)
+    has_dominator = dominated[numpy.arange(len(block)), first]
+    return numpy.where(has_dominator, before_ranks[first] + 1, 0)
+
+
+def _first_front_ranks(points):
+    """0 for the nondominated distinct lexicographically sorted *points*,
+    1 for the others."""
+    n, nobj = points.shape
+    if nobj == 1:
+        return (numpy.arange(n) > 0).astype(numpy.int64)
+    ranks = numpy.ones(n, dtype=numpy.int64)
+    front = numpy.zeros(0, dtype=numpy.int64)
+    for start in range(0, n, _ND_BLOCK):
+        stop = min(start + _ND_BLOCK, n)
+        # A dominated point is dominated by a point of the first front.
+        candidates = numpy.concatenate((front, numpy.arange(start, stop)))
+        dominated = _dominators(points[candidates], points[start:stop])
+        dominated[:, len(front):] &= numpy.tri(stop - start, k=-1, dtype=bool)
+        block_front = numpy.flatnonzero(~dominated.any(axis=1)) + start
+        ranks[block_front] = 0
+        front = numpy.concatenate((front, block_front))
+    return ranks
+
+
+def crowding_distance(values):
+    """Returns the crowding distances of the rows of the (N, M) array of
+    fitness values *values* of one front, the same as
+    :func:`assignCrowdingDist` for the individuals in that order.
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    n = len(values)
+    distances = numpy.zeros(n)
+    if n == 0:
+        return distances
+    values = values.reshape(n, -1)
+    nobj = values.shape[1]
+
+    # Stable sorts of the order of the previous objective, as list.sort
+    order = numpy.arange(n)
     for i in range(nobj):
-        crowd.sort(key=lambda element: element[0][i])
-        distances[crowd[0][1]] = float("inf")
-        distances[crowd[-1][1]] = float("inf")
-        if crowd[-1][0][i] == crowd[0][0][i]:
+        order = order[numpy.argsort(values[order, i], kind='stable')]
+        column = values[order, i]
+        distances[order[0]] = float("inf")
+        distances[order[-1]] = float("inf")
+        if column[-1] == column[0]:
             continue
-        norm = nobj * float(crowd[-1][0][i] - crowd[0][0][i])
-        for prev, cur, next in zip(crowd[:-2], crowd[1:-1], crowd[2:]):
-            distances[cur[1]] += (next[0][i] - prev[0][i]) / norm
+        norm = nobj * float(column[-1] - column[0])
+        distances[order[1:-1]] += (column[2:] - column[:-2]) / norm
+    return distances
 
-    for i, dist in enumerate(distances):
-        individuals[i].fitness.crowding_dist = dist
 
 def selTournamentDCD(individuals, k):
     """Tournament selection based on dominance (D) between two individuals, if
@@ -459,7 +632,7 @@ class selNSGA3WithMemory(object):
         >>> toolbox.register("select", selNSGA3WithMemory(ref_points))
 
     """
-    def __init__(self, ref_points, nd="log"):
+    def __init__(self, ref_points, nd="numpy"):
         self.ref_points = ref_points
         self.nd = nd
         self.best_point = numpy.full((1, ref_points.shape[1]), numpy.inf)
@@ -476,7 +649,7 @@ class selNSGA3WithMemory(object):
         return chosen
 
 
-def selNSGA3(individuals, k, ref_points, nd="log", best_point=None,
+def selNSGA3(individuals, k, ref_points, nd="numpy", best_point=None,
              worst_point=None, extreme_points=None, return_memory=False):
     """Implementation of NSGA-III selection as presented in [Deb2014]_.
 
@@ -490,7 +663,8 @@ def selNSGA3(individuals, k, ref_points, nd="log", best_point=None,
     :param individuals: A list of individuals to select from.
     :param k: The number of individuals to select.
     :param ref_points: Reference points to use for niching.
-    :param nd: Specify the non-dominated algorithm to use: 'standard' or 'log'.
+    :param nd: Specify the non-dominated algorithm to use: 'numpy' (the
+               arrays of :func:`nondominated_fronts`), 'standard' or 'log'.
     :param best_point: Best point found at previous generation. If not provided
         find the best point only from current individuals.
     :param worst_point: Worst point found at previous generation. If not provided
@@ -515,7 +689,11 @@ def selNSGA3(individuals, k, ref_points, nd="log", best_point=None,
         Part I: Solving Problems With Box Constraints. IEEE Transactions on
         Evolutionary Computation, 18(4), 577-601. doi:10.1109/TEVC.2013.2281535.
     """
-    if nd == "standard":
+    if nd == "numpy":
+        wvalues = numpy.array([ind.fitness.wvalues for ind in individuals], dtype=numpy.float64)
+        pareto_fronts = [[individuals[i] for i in front.tolist()]
+                         for front in nondominated_fronts(wvalues, k)]
+    elif nd == "standard":
         pareto_fronts = sortNondominated(individuals, k)
     elif nd == "log":
         pareto_fronts = sortLogNondominated(individuals, k)
@@ -543,9 +721,7 @@ def selNSGA3(individuals, k, ref_points, nd="log", best_point=None,
     niches, dist = associate_to_niche(fitnesses, ref_points, best_point, intercepts)
 
     # Get counts per niche for individuals in all front but the last
-    niche_counts = numpy.zeros(len(ref_points), dtype=numpy.int64)
-    index, counts = numpy.unique(niches[:-len(pareto_fronts[-1])], return_counts=True)
-    niche_counts[index] = counts
+    niche_counts = numpy.bincount(niches[:-len(pareto_fronts[-1])], minlength=len(ref_points))
 
     # Choose individuals from all fronts but the last
     chosen = list(chain(*pareto_fronts[:-1]))
@@ -607,30 +783,27 @@ def associate_to_niche(fitnesses, reference_points, best_point, intercepts):
     # Normalize by ideal point and intercepts
     fn = (fitnesses - best_point) / (intercepts - best_point)
 
-    # Create distance matrix
-    fn = numpy.repeat(numpy.expand_dims(fn, axis=1), len(reference_points), axis=1)
-    norm = numpy.linalg.norm(reference_points, axis=1)
-
-    distances = numpy.sum(fn * reference_points, axis=2) / norm.reshape(1, -1)
-    distances = distances[:, :, numpy.newaxis] * reference_points[numpy.newaxis, :, :] / norm[numpy.newaxis, :, numpy.newaxis]
-    distances = numpy.linalg.norm(distances - fn, axis=2)
+    # Squared distance to each reference line, from the projections on the
+    # unit reference directions (one matrix product)
+    directions = reference_points / numpy.linalg.norm(reference_points, axis=1, keepdims=True)
+    projections = fn @ directions.T
+    distances = numpy.sum(fn * fn, axis=1, keepdims=True) - projections * projections
 
     # Retrieve min distance niche index
     niches = numpy.argmin(distances, axis=1)
-    distances = distances[list(range(niches.shape[0])), niches]
+    distances = numpy.sqrt(numpy.maximum(distances[numpy.arange(len(niches)), niches], 0.0))
     return niches, distances
 
 
 def niching(individuals, k, niches, distances, niche_counts):
     selected = []
-    available = numpy.ones(len(individuals), dtype=numpy.bool)
+    available = numpy.ones(len(individuals), dtype=bool)
     while len(selected) < k:
         # Maximum number of individuals (niches) to select in that round
         n = k - len(selected)
 
         # Find the available niches and the minimum niche count in them
-        available_niches = numpy.zeros(len(niche_counts), dtype=numpy.bool)
-        available_niches[numpy.unique(niches[available])] = True
+        available_niches = numpy.bincount(niches[available], minlength=len(niche_counts)) > 0
         min_count = numpy.min(niche_counts[available_niches])
 
         # Select at most n niches with the minimum count
@@ -638,43 +811,52 @@ def niching(individuals, k, niches, distances, niche_counts):
         numpy.random.shuffle(selected_niches)
         selected_niches = selected_niches[:n]
 
-        for niche in selected_niches:
-            # Select from available individuals in niche
-            niche_individuals = numpy.flatnonzero(numpy.logical_and(niches == niche, available))
-            numpy.random.shuffle(niche_individuals)
-
-            # If no individual in that niche, select the closest to reference
-            # Else select randomly
-            if niche_counts[niche] == 0:
-                sel_index = niche_individuals[numpy.argmin(distances[niche_individuals])]
-            else:
-                sel_index = niche_individuals[0]
-
-            # Update availability, counts and selection
-            available[sel_index] = False
-            niche_counts[niche] += 1
-            selected.append(individuals[sel_index])
+        # One individual from each selected niche: the closest to the
+        # reference if no individual is in that niche, else a random one.
+        # The available individuals of the niches are sorted on that key
+        # and the first of each niche is taken.
+        in_selected = numpy.zeros(len(niche_counts), dtype=bool)
+        in_selected[selected_niches] = True
+        candidates = numpy.flatnonzero(numpy.logical_and(available, in_selected[niches]))
+        keys = numpy.where(niche_counts[niches[candidates]] == 0,
+                           distances[candidates], numpy.random.random(len(candidates)))
+        candidates = candidates[numpy.lexsort((keys, niches[candidates]))]
+        first = numpy.insert(niches[candidates][1:] != niches[candidates][:-1], 0, True)
+        sel_indices = candidates[first]
+
+        # Update availability, counts and selection, in the shuffled order
+        # of the niches
+        order = numpy.empty(len(niche_counts), dtype=numpy.int64)
+        order[selected_niches] = numpy.arange(len(selected_niches))
+        sel_indices = sel_indices[numpy.argsort(order[niches[sel_indices]])]
+        available[sel_indices] = False
+        niche_counts[niches[sel_indices]] += 1
+        selected.extend(individuals[i] for i in sel_indices.tolist())
 
     return selected
 
 
+# Reference points of the layers computed so far, per (nobj, p)
+_REFERENCE_POINTS = {}
+
 def uniform_reference_points(nobj, p=4, scaling=None):
     """Generate reference points uniformly on the hyperplane intersecting
     each axis at 1. The scaling factor is used to combine multiple layers of
     reference points.
     """
-    def gen_refs_recursive(ref, nobj, left, total, depth):
-        points = []
-        if depth == nobj - 1:
-            ref[depth] = left / total
-            points.append(ref)
-        else:
-            for i in range(left + 1):
-                ref[depth] = i / total
-                points.extend(gen_refs_recursive(ref.copy(), nobj, left - i, total, depth + 1))
-        return points
-
-    ref_points = numpy.array(gen_refs_recursive(numpy.zeros(nobj), nobj, p, p, 0))
+    if (nobj, p) not in _REFERENCE_POINTS:
+        # The points are the compositions of p in nobj parts, from the
+        # positions of nobj - 1 bars among p + nobj - 1 slots (stars and
+        # bars) in lexicographic order
+        bars = list(combinations(range(p + nobj - 1), nobj - 1))
+        bars = numpy.array(bars, dtype=numpy.int64).reshape(len(bars), nobj - 1)
+        bounds = numpy.hstack((numpy.full((len(bars), 1), -1), bars,
+                               numpy.full((len(bars), 1), p + nobj - 1)))
+        ref_points = (numpy.diff(bounds, axis=1) - 1) / p
+        ref_points.flags.writeable = False
+        _REFERENCE_POINTS[nobj, p] = ref_points
+
+    ref_points = _REFERENCE_POINTS[nobj, p].copy()
     if scaling is not None:
         ref_points *= scaling
         ref_points += (1 - scaling) / nobj
@@ -702,142 +884,121 @@ def selSPEA2(individuals, k):
     .. [Zitzler2001] Zitzler, Laumanns and Thiele, "SPEA 2: Improving the
        strength Pareto evolutionary algorithm", 2001.
     """
+    if k == 0:
+        return []
+    values = numpy.array([ind.fitness.values for ind in individuals], dtype=numpy.float64)
+    wvalues = numpy.array([ind.fitness.wvalues for ind in individuals], dtype=numpy.float64)
     N = len(individuals)
-    L = len(individuals[0].fitness.values)
-    K = math.sqrt(N)
-    strength_fits = [0] * N
-    fits = [0] * N
-    dominating_inds = [list() for i in range(N)]
-
-    for i, ind_i in enumerate(individuals):
-        for j, ind_j in enumerate(individuals[i+1:], i+1):
-            if ind_i.fitness.dominates(ind_j.fitness):
-                strength_fits[i] += 1
-                dominating_inds[j].append(i)
-            elif ind_j.fitness.dominates(ind_i.fitness):
-                strength_fits[j] += 1
-                dominating_inds[i].append(j)
-
-    for i in range(N):
-        for j in dominating_inds[i]:
-            fits[i] += strength_fits[j]
+
+    # Strength of each individual, the number it dominates, and raw
+    # fitness, the sum of the strengths of its dominators
+    dominates = numpy.ones((N, N), dtype=bool)
+    better = numpy.zeros((N, N), dtype=bool)
+    for l in range(wvalues.shape[1]):
+        dominates &= wvalues[:, l, None] >= wvalues[:, l]
+        better |= wvalues[:, l, None] > wvalues[:, l]
+    dominates &= better
+    strength_fits = dominates.sum(axis=1)
+    fits = strength_fits @ dominates
 
     # Choose all non-dominated individuals
-    chosen_indices = [i for i in range(N) if fits[i] < 1]
+    chosen_indices = numpy.flatnonzero(fits < 1)
+    next_indices = numpy.flatnonzero(fits >= 1)
 
     if len(chosen_indices) < k:     # The archive is too small
-        for i in range(N):
-            distances = [0.0] * N
-            for j in range(i + 1, N):
-                dist = 0.0
-                for l in range(L):
-                    val = individuals[i].fitness.values[l] - \
-                          individuals[j].fitness.values[l]
-                    dist += val * val
-                distances[j] = dist
-            kth_dist = _randomizedSelect(distances, 0, N - 1, K)
-            density = 1.0 / (kth_dist + 2.0)
-            fits[i] += density
-
-        next_indices = [(fits[i], i) for i in range(N)
-                        if not i in chosen_indices]
-        next_indices.sort()
-        #print next_indices
-        chosen_indices += [i for _, i in next_indices[:k - len(chosen_indices)]]
+        # Density from the floor(sqrt(N))-th smallest of the distances to
+        # the individuals after each one, the distances to those before
+        # counting as 0
+        kth = min(int(math.sqrt(N)), N - 1)
+        kth_dist = numpy.empty(N)
+        for start in range(0, N, _SPEA2_BLOCK):
+            stop = min(start + _SPEA2_BLOCK, N)
+            distances = numpy.triu(_squared_distances(values[start:stop], values), k=start + 1)
+            kth_dist[start:stop] = numpy.partition(distances, kth, axis=1)[:, kth]
+        fits = fits + 1.0 / (kth_dist + 2.0)
+
+        next_indices = next_indices[numpy.argsort(fits[next_indices], kind='stable')]
+        chosen_indices = numpy.concatenate((chosen_indices, next_indices[:k - len(chosen_indices)]))
 
     elif len(chosen_indices) > k:   # The archive is too large
-        N = len(chosen_indices)
-        distances = [[0.0] * N for i in range(N)]
-        sorted_indices = [[0] * N for i in range(N)]
-        for i in range(N):
-            for j in range(i + 1, N):
-                dist = 0.0
-                for l in range(L):
-                    val = individuals[chosen_indices[i]].fitness.values[l] - \
-                          individuals[chosen_indices[j]].fitness.values[l]
-                    dist += val * val
-                distances[i][j] = dist
-                distances[j][i] = dist
-            distances[i][i] = -1
-
-        # Insert sort is faster than quick sort for short arrays
-        for i in range(N):
-            for j in range(1, N):
-                l = j
-                while l > 0 and distances[i][j] < distances[i][sorted_indices[i][l - 1]]:
-                    sorted_indices[i][l] = sorted_indices[i][l - 1]
-                    l -= 1
-                sorted_indices[i][l] = j
-
-        size = N
-        to_remove = []
-        while size > k:
-            # Search for minimal distance
-            min_pos = 0
-            for i in range(1, N):
-                for j in range(1, size):
-                    dist_i_sorted_j = distances[i][sorted_indices[i][j]]
-                    dist_min_sorted_j = distances[min_pos][sorted_indices[min_pos][j]]
-
-                    if dist_i_sorted_j < dist_min_sorted_j:
-                        min_pos = i
-                        break
-                    elif dist_i_sorted_j > dist_min_sorted_j:
-                        break
-
-            # Remove minimal distance from sorted_indices
-            for i in range(N):
-                distances[i][min_pos] = float("inf")
-                distances[min_pos][i] = float("inf")
-
-                for j in range(1, size - 1):
-                    if sorted_indices[i][j] == min_pos:
-                        sorted_indices[i][j] = sorted_indices[i][j + 1]
-                        sorted_indices[i][j + 1] = min_pos
-
-            # Remove corresponding individual from chosen_indices
-            to_remove.append(min_pos)
-            size -= 1
-
-        for index in reversed(sorted(to_remove)):
-            del chosen_indices[index]
-
-    return [individuals[i] for i in chosen_indices]
-
-def _randomizedSelect(array, begin, end, i):
-    """Allows to select the ith smallest element from array without sorting it.
-    Runtime is expected to be O(n).
+        chosen_indices = chosen_indices[_truncate(values[chosen_indices], k)]
+
+    return [individuals[i] for i in chosen_indices.tolist()]
+
+
+# Number of rows of the distance matrix computed at once
+_SPEA2_BLOCK = 512
+
+def _squared_distances(a, b):
+    # Squared euclidean distances between the rows of *a* and *b*, summed
+    # objective by objective
+    distances = numpy.zeros((len(a), len(b)))
+    for l in range(a.shape[1]):
+        diff = a[:, l, None] - b[:, l]
+        distances += diff * diff
+    return distances
+
+
+def _truncate(values, k):
+    """Returns the indices of the *k* individuals kept by the SPEA-II
+    truncation of the individuals of fitness *values*, in increasing order.
+    The individual removed at each step has the lexicographically smallest
+    sorted distances to the others, the first one for equal distances. Its
+    first distance is the smallest of all, so only the individuals of
+    smallest distance to their nearest neighbour, kept in a heap, are
+    compared on the others.
     """
-    if begin == end:
-        return array[begin]
-    q = _randomizedPartition(array, begin, end)
-    k = q - begin + 1
-    if i < k:
-        return _randomizedSelect(array, begin, q, i)
-    else:
-        return _randomizedSelect(array, q + 1, end, i - k)
-
-def _randomizedPartition(array, begin, end):
-    i = random.randint(begin, end)
-    array[begin], array[i] = array[i], array[begin]
-    return _partition(array, begin, end)
-
-def _partition(array, begin, end):
-    x = array[begin]
-    i = begin - 1
-    j = end + 1
-    while True:
-        j -= 1
-        while array[j] > x:
-            j -= 1
-        i += 1
-        while array[i] < x:
-            i += 1
-        if i < j:
-            array[i], array[j] = array[j], array[i]
+    N = len(values)
+    distances = _squared_distances(values, values)
+    numpy.fill_diagonal(distances, -1)
+    # Neighbours by increasing distance, the individual itself first
+    neighbours = numpy.argsort(distances, axis=1, kind='stable')
+    sorted_distances = numpy.take_along_axis(distances, neighbours, axis=1)
+    alive = numpy.ones(N, dtype=bool)
+    # Position of the nearest alive neighbour, in the heap with its distance
+    nearest = numpy.ones(N, dtype=numpy.int64)
+    heap = [(sorted_distances[i, 1], i, 1) for i in range(N)]
+    heapq.heapify(heap)
+
+    def pop_valid():
+        while True:
+            dist, i, pos = heapq.heappop(heap)
+            if alive[i] and nearest[i] == pos:
+                return dist, i, pos
+
+    for _ in range(N - k):
+        # Individuals of smallest nearest neighbour distance
+        entry = pop_valid()
+        candidates = [entry]
+        while heap and heap[0][0] == entry[0]:
+            dist, i, pos = heapq.heappop(heap)
+            if alive[i] and nearest[i] == pos:
+                candidates.append((dist, i, pos))
+
+        # Lexicographically smallest distances to the other individuals,
+        # the first individual for equal ones
+        if len(candidates) > 1:
+            indices = numpy.array([i for _, i, _ in candidates])
+            rows = numpy.array([sorted_distances[i, 1:][alive[neighbours[i, 1:]]] for i in indices])
+            order = numpy.lexsort(numpy.vstack((indices, rows.T[::-1])))
+            for j in order[1:].tolist():
+                heapq.heappush(heap, candidates[j])
+            min_pos = indices[order[0]]
         else:
-            return j
+            min_pos = entry[1]
+
+        # The individuals whose nearest neighbour is removed have the next one
+        alive[min_pos] = False
+        for i in numpy.flatnonzero(alive & (neighbours[numpy.arange(N), nearest] == min_pos)).tolist():
+            pos = nearest[i] + 1
+            while pos < N and not alive[neighbours[i, pos]]:
+                pos += 1
+            if pos < N:
+                nearest[i] = pos
+                heapq.heappush(heap, (sorted_distances[i, pos], i, pos))
+
+    return numpy.flatnonzero(alive)
 
 
 __all__ = ['selNSGA2', 'selNSGA3', 'selNSGA3WithMemory', 'selSPEA2', 'sortNondominated', 'sortLogNondominated',
-           'selTournamentDCD', 'uniform_reference_points']
+           'selTournamentDCD', 'uniform_reference_points', 'nondominated_fronts', 'crowding_distance']
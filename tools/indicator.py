@@ -14,19 +14,29 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import os
+from multiprocessing import shared_memory
+
 import numpy
 
 try:
     # try importing the C version
     from ._hypervolume import hv as hv
 except ImportError:
-    # fallback on python version
-    from ._hypervolume import pyhv as hv
+    # fallback on the array version, compiled with numba if installed
+    from ._hypervolume import arrayhv as hv
+
+from ._hypervolume.contributions import contributions, HypervolumeContributions
+from ._hypervolume.contributions import _exclusive_volume, _is_front
 
 def hypervolume(front, **kargs):
     """Returns the index of the individual with the least the hypervolume
     contribution. The provided *front* should be a set of non-dominated
     individuals having each a :attr:`fitness` attribute.
+
+    With an *executor* keyword argument (see :func:`contribution_chunks`),
+    the contributions of fronts of more than three objectives are split
+    across its workers.
     """
     # Must use wvalues * -1 since hypervolume use implicit minimization
     # And minimization in deap use max on -obj
@@ -34,35 +44,52 @@ def hypervolume(front, **kargs):
     ref = kargs.get("ref", None)
     if ref is None:
         ref = numpy.max(wobj, axis=0) + 1
-
-    def contribution(i):
-        # The contribution of point p_i in point set P
-        # is the hypervolume of P without p_i
-        return hv.hypervolume(numpy.concatenate((wobj[:i], wobj[i+1:])), ref)
-
-    # Parallelization note: Cannot pickle local function
-    contrib_values = list(map(contribution, list(range(len(front)))))
-
-    # Select the maximum hypervolume value (correspond to the minimum difference)
-    return numpy.argmax(contrib_values)
+    ref = numpy.asarray(ref, dtype=numpy.float64)
+    executor = kargs.get("executor", None)
+
+    # The contribution of point p_i in point set P is the hypervolume of P
+    # less the hypervolume of P without p_i, the least contribution the
+    # largest hypervolume without p_i. The sweeps of the two and three
+    # objectives fronts are faster serial.
+    wobj = numpy.minimum(wobj, ref)
+    if executor is None or (wobj.shape[1] in (2, 3) and _is_front(wobj)):
+        return numpy.argmin(contributions(wobj, ref))
+    return numpy.argmin(contribution_chunks(_hypervolume_rows, wobj, executor, ref))
+
+def hypervolume_contributions(front, **kargs):
+    """Returns the :class:`HypervolumeContributions` of the individuals of
+    *front*, to remove the individuals of least hypervolume contribution
+    one at a time with the contributions of the others updated, as in
+    SMS-EMOA::
+
+        >>> contrib = hypervolume_contributions(front)      # doctest: +SKIP
+        >>> while contrib.size > k:                         # doctest: +SKIP
+        ...     contrib.remove(contrib.argmin())
+        >>> chosen = [front[i] for i in numpy.flatnonzero(contrib.alive)]   # doctest: +SKIP
+    """
+    wobj = numpy.array([ind.fitness.wvalues for ind in front]) * -1
+    ref = kargs.get("ref", None)
+    if ref is None:
+        ref = numpy.max(wobj, axis=0) + 1
+    return HypervolumeContributions(wobj, ref)
 
 def additive_epsilon(front, **kargs):
     """Returns the index of the individual with the least the additive epsilon
     contribution. The provided *front* should be a set of non-dominated
-    individuals having each a :attr:`fitness` attribute.
+    individuals having each a :attr:`fitness` attribute. The contributions
+    are split across the workers of an *executor* keyword argument (see
+    :func:`contribution_chunks`).
 
     .. warning::
 
        This function has not been tested.
     """
     wobj = numpy.array([ind.fitness.wvalues for ind in front]) * -1
-
-    def contribution(i):
-        mwobj = numpy.ma.array(wobj)
-        mwobj[i] = numpy.ma.masked
-        return numpy.min(numpy.max(wobj[i] - mwobj, axis=1))
-
-    contrib_values = list(map(contribution, list(range(len(front)))))
+    executor = kargs.get("executor", None)
+    if executor is None:
+        contrib_values = _additive_epsilon_rows(wobj, 0, len(wobj))
+    else:
+        contrib_values = contribution_chunks(_additive_epsilon_rows, wobj, executor)
 
     # Select the minimum contribution value
     return numpy.argmin(contrib_values)
@@ -71,24 +98,100 @@ def additive_epsilon(front, **kargs):
 def multiplicative_epsilon(front, **kargs):
     """Returns the index of the individual with the least the multiplicative epsilon
     contribution. The provided *front* should be a set of non-dominated
-    individuals having each a :attr:`fitness` attribute.
+    individuals having each a :attr:`fitness` attribute. The contributions
+    are split across the workers of an *executor* keyword argument (see
+    :func:`contribution_chunks`).
 
     .. warning::
 
        This function has not been tested.
     """
     wobj = numpy.array([ind.fitness.wvalues for ind in front]) * -1
+    executor = kargs.get("executor", None)
+    if executor is None:
+        contrib_values = _multiplicative_epsilon_rows(wobj, 0, len(wobj))
+    else:
+        contrib_values = contribution_chunks(_multiplicative_epsilon_rows, wobj, executor)
 
+    # Select the minimum contribution value
+    return numpy.argmin(contrib_values)
+
+
+def contribution_chunks(rows, wobj, executor, *args, chunks=None):
+    """Returns the contributions of the points *wobj* computed by chunks of
+    consecutive points on the workers of *executor*, in the order of the
+    points. *executor* is anything with a :meth:`submit` taking a function
+    and one argument and returning a :class:`concurrent.futures.Future`,
+    as :class:`concurrent.futures.ProcessPoolExecutor` or
+    :class:`evaluation_pool.EvaluationPool`, running on this host: the
+    points are passed to the workers in shared memory, and the chunks only
+    as their bounds. *rows* is a module level function called as
+    ``rows(wobj, start, stop, *args)`` that returns the contributions of
+    the points start to stop. The default number of chunks is four per
+    CPU.
+    """
+    wobj = numpy.asarray(wobj, dtype=numpy.float64)
+    if chunks is None:
+        chunks = 4 * (os.cpu_count() or 1)
+    bounds = numpy.unique(numpy.linspace(0, len(wobj), min(chunks, len(wobj)) + 1).astype(int))
+    if len(bounds) < 3:
+        # One chunk, no need for the workers
+        return list(rows(wobj, 0, len(wobj), *args))
+
+    shm = shared_memory.SharedMemory(create=True, size=wobj.nbytes)
+    try:
+        numpy.ndarray(wobj.shape, dtype=numpy.float64, buffer=shm.buf)[:] = wobj
+        futures = [executor.submit(_contribution_task, (rows, shm.name, wobj.shape, start, stop, args))
+                   for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist())]
+        contrib_values = []
+        for future in futures:
+            contrib_values.extend(future.result())
+        return contrib_values
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _contribution_task(task):
+    # Worker side of contribution_chunks: the chunk of points start to stop
+    # of the points in the shared memory block name
+    rows, name, shape, start, stop, args = task
+    shm = shared_memory.SharedMemory(name=name)
+    wobj = numpy.ndarray(shape, dtype=numpy.float64, buffer=shm.buf)
+    try:
+        return list(rows(wobj, start, stop, *args))
+    finally:
+        del wobj
+        try:
+            shm.close()
+        except BufferError:
+            # The traceback of an error in rows still holds the points
+            pass
+
+
+def _hypervolume_rows(wobj, start, stop, ref):
+    # Volume of the box of each point that the other points do not dominate
+    return [_exclusive_volume(numpy.delete(wobj, i, axis=0), wobj[i], ref)
+            for i in range(start, stop)]
+
+
+def _additive_epsilon_rows(wobj, start, stop):
     def contribution(i):
         mwobj = numpy.ma.array(wobj)
         mwobj[i] = numpy.ma.masked
-        return numpy.min(numpy.max(wobj[i] / mwobj, axis=1))
+        return numpy.min(numpy.max(wobj[i] - mwobj, axis=1))
 
-    contrib_values = list(map(contribution, list(range(len(front)))))
+    return list(map(contribution, list(range(start, stop))))
 
-    # Select the minimum contribution value
-    return numpy.argmin(contrib_values)
 
+def _multiplicative_epsilon_rows(wobj, start, stop):
+    def contribution(i):
+        mwobj = numpy.ma.array(wobj)
+        mwobj[i] = numpy.ma.masked
+        return numpy.min(numpy.max(wobj[i] / mwobj, axis=1))
+
+    return list(map(contribution, list(range(start, stop))))
 
 
-__all__ = ["hypervolume", "additive_epsilon", "multiplicative_epsilon"]
\ No newline at end of file
+__all__ = ["hypervolume", "hypervolume_contributions", "additive_epsilon", "multiplicative_epsilon",
+           "contribution_chunks"]
\ No newline at end of file
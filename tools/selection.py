@@ -211,6 +211,120 @@ def selStochasticUniversalSampling(individuals, k, fit_attr="fitness"):
 
     return chosen
 
+def _sort_dtype(n):
+    # NumPy's stable sort is a radix sort for 16 bit integers
+    return np.uint16 if n <= 65536 else np.int64
+
+
+def _kth_deviation(sorted_values, seg, ptr, length, center, k):
+    """Returns the *k*-th smallest absolute deviation from *center* of every
+    segment of *sorted_values* (sorted within the segments, which start at
+    *ptr* with *length*). The deviations of the values below and above the
+    center are two sorted runs, so the *k*-th is found by a bisection over
+    the number of values taken from the lower run, for all segments at once.
+    """
+    last = len(sorted_values) - 1
+    below = np.bincount(seg, weights=(sorted_values < center[seg]),
+                        minlength=len(ptr)).astype(np.int64)
+    above = length - below
+    lo = np.maximum(0, k + 1 - above)
+    hi = np.minimum(k + 1, below)
+    while (lo < hi).any():
+        mid = (lo + hi) // 2
+        lower = center - sorted_values[np.clip(ptr + below - 1 - mid, 0, last)]
+        upper = sorted_values[np.clip(ptr + below + k - mid, 0, last)] - center
+        too_small = (lo < hi) & (upper > lower)
+        hi = np.where((lo < hi) & ~too_small, mid, hi)
+        lo = np.where(too_small, mid + 1, lo)
+    lower = np.where(lo > 0, center - sorted_values[np.clip(ptr + below - lo, 0, last)], -np.inf)
+    upper = np.where(k - lo >= 0, sorted_values[np.clip(ptr + below + k - lo, 0, last)] - center,
+                     -np.inf)
+    return np.maximum(lower, upper)
+
+
+def _segment_mad(values, ranks, seg, ptr, length):
+    """Returns the median absolute deviation of every segment of *values*,
+    given the *ranks* of the values (any order consistent with the values),
+    where *seg* is the (ascending) segment of every value and the segments
+    start at *ptr* with *length*."""
+    order = np.argsort(ranks.astype(_sort_dtype(ranks.max() + 1)), kind='stable')
+    order = order[np.argsort(seg[order].astype(_sort_dtype(len(ptr))), kind='stable')]
+    sorted_values = values[order]
+    lo, hi = (length - 1) // 2, length // 2
+    median_val = 0.5 * (sorted_values[ptr + lo] + sorted_values[ptr + hi])
+    return 0.5 * (_kth_deviation(sorted_values, seg, ptr, length, median_val, lo) +
+                  _kth_deviation(sorted_values, seg, ptr, length, median_val, hi))
+
+
+def _lexicase(individuals, k, epsilon=None):
+    """Vectorized lexicase selection shared by :func:`selLexicase`,
+    :func:`selEpsilonLexicase` and :func:`selAutomaticEpsilonLexicase`.
+
+    The fitness values are gathered once into an (N, cases) error matrix.
+    The selections that share the same leading cases share their
+    candidates, so the selections are filtered one case at a time for all
+    of them at once: the candidates of every group of selections are kept
+    back to back in one array and each case is one set of segment
+    reductions over it. *epsilon* is None for exact lexicase, a number, or
+    ``'mad'`` for the median absolute deviation of the case over the
+    candidates.
+    """
+    if k == 0:
+        return []
+    rng = np.random.default_rng(random.getrandbits(64))
+    # Errors to minimize whatever the sign of the weights
+    sign = np.where(np.asarray(individuals[0].fitness.weights) > 0, -1.0, 1.0)
+    errors = np.array([ind.fitness.values for ind in individuals], dtype=np.float64) * sign
+    n, ncases = errors.shape
+    # A random order of the cases for every selection
+    orders = np.argsort(rng.random((k, ncases)), axis=1)
+    if epsilon == 'mad':
+        # Ranks of the errors of every case to sort the candidates by
+        ranks = np.argsort(np.argsort(errors, axis=0, kind='stable'), axis=0)
+
+    chosen = np.empty(k, dtype=np.int64)
+    active = np.arange(k)
+    group = np.zeros(k, dtype=np.int64)
+    candidates = np.arange(n)
+    start = np.zeros(1, dtype=np.int64)
+    length = np.full(1, n, dtype=np.int64)
+    for depth in range(ncases):
+        # Selections left with a single candidate are done
+        done = (length[group] == 1)
+        if done.any():
+            chosen[active[done]] = candidates[start[group[done]]]
+            active = active[~done]
+            group = group[~done]
+            if (active.size == 0):
+                break
+
+        # A new group for every group and next case of its selections
+        keys, group = np.unique(group * ncases + orders[active, depth], return_inverse=True)
+        parent = keys // ncases
+        case = keys % ncases
+        new_length = length[parent]
+        ptr = np.cumsum(new_length) - new_length
+        seg = np.repeat(np.arange(len(keys)), new_length)
+        members = candidates[np.arange(ptr[-1] + new_length[-1]) - ptr[seg] + start[parent][seg]]
+        errors_for_this_case = errors[members, case[seg]]
+
+        max_val_to_survive = np.minimum.reduceat(errors_for_this_case, ptr)
+        if epsilon == 'mad':
+            max_val_to_survive += _segment_mad(errors_for_this_case, ranks[members, case[seg]],
+                                               seg, ptr, new_length)
+        elif epsilon is not None:
+            max_val_to_survive += epsilon
+        survive = (errors_for_this_case <= max_val_to_survive[seg])
+        candidates = members[survive]
+        length = np.bincount(seg[survive], minlength=len(keys))
+        start = np.cumsum(length) - length
+
+    # Random choice among the candidates left after every case
+    pick = (rng.random(active.size) * length[group]).astype(np.int64)
+    chosen[active] = candidates[start[group] + pick]
+    return [individuals[i] for i in chosen]
+
+
 def selLexicase(individuals, k):
     """Returns an individual that does the best on the fitness cases when
     considered one at a time in random order.
@@ -220,28 +334,7 @@ def selLexicase(individuals, k):
     :param k: The number of individuals to select.
     :returns: A list of selected individuals.
     """
-    selected_individuals = []
-
-    for i in range(k):
-        fit_weights = individuals[0].fitness.weights
-
-        candidates = individuals
-        cases = list(range(len(individuals[0].fitness.values)))
-        random.shuffle(cases)
-
-        while len(cases) > 0 and len(candidates) > 1:
-            f = min
-            if fit_weights[cases[0]] > 0:
-                f = max
-
-            best_val_for_case = f([x.fitness.values[cases[0]] for x in candidates])
-
-            candidates = list([x for x in candidates if x.fitness.values[cases[0]] == best_val_for_case])
-            cases.pop(0)
-
-        selected_individuals.append(random.choice(candidates))
-
-    return selected_individuals
+    return _lexicase(individuals, k)
 
 
 def selEpsilonLexicase(individuals, k, epsilon):
@@ -255,30 +348,7 @@ def selEpsilonLexicase(individuals, k, epsilon):
     :param k: The number of individuals to select.
     :returns: A list of selected individuals.
     """
-    selected_individuals = []
-
-    for i in range(k):
-        fit_weights = individuals[0].fitness.weights
-
-        candidates = individuals
-        cases = list(range(len(individuals[0].fitness.values)))
-        random.shuffle(cases)
-
-        while len(cases) > 0 and len(candidates) > 1:
-            if fit_weights[cases[0]] > 0:
-                best_val_for_case = max([x.fitness.values[cases[0]] for x in candidates])
-                min_val_to_survive_case = best_val_for_case - epsilon
-                candidates = list([x for x in candidates if x.fitness.values[cases[0]] >= min_val_to_survive_case])
-            else :
-                best_val_for_case = min([x.fitness.values[cases[0]] for x in candidates])
-                max_val_to_survive_case = best_val_for_case + epsilon
-                candidates = list([x for x in candidates if x.fitness.values[cases[0]] <= max_val_to_survive_case])
-
-            cases.pop(0)
-
-        selected_individuals.append(random.choice(candidates))
-
-    return selected_individuals
+    return _lexicase(individuals, k, epsilon)
 
 def selAutomaticEpsilonLexicase(individuals, k):
     """
@@ -291,33 +361,7 @@ def selAutomaticEpsilonLexicase(individuals, k):
     :param k: The number of individuals to select.
     :returns: A list of selected individuals.
     """
-    selected_individuals = []
-
-    for i in range(k):
-        fit_weights = individuals[0].fitness.weights
-
-        candidates = individuals
-        cases = list(range(len(individuals[0].fitness.values)))
-        random.shuffle(cases)
-
-        while len(cases) > 0 and len(candidates) > 1:
-            errors_for_this_case = [x.fitness.values[cases[0]] for x in candidates]
-            median_val = np.median(errors_for_this_case)
-            median_absolute_deviation = np.median([abs(x - median_val) for x in errors_for_this_case])
-            if fit_weights[cases[0]] > 0:
-                best_val_for_case = max(errors_for_this_case)
-                min_val_to_survive = best_val_for_case - median_absolute_deviation
-                candidates = list([x for x in candidates if x.fitness.values[cases[0]] >= min_val_to_survive])
-            else :
-                best_val_for_case = min(errors_for_this_case)
-                max_val_to_survive = best_val_for_case + median_absolute_deviation
-                candidates = list([x for x in candidates if x.fitness.values[cases[0]] <= max_val_to_survive])
-
-            cases.pop(0)
-
-        selected_individuals.append(random.choice(candidates))
-
-    return selected_individuals
+    return _lexicase(individuals, k, 'mad')
 
 
 __all__ = ['selRandom', 'selBest', 'selWorst', 'selRoulette',
@@ -9,9 +9,13 @@ from bisect import bisect_right
 from collections import defaultdict
 from copy import deepcopy
 from functools import partial
-from itertools import chain
+from itertools import accumulate, chain
 from operator import eq
 
+import numpy
+
+from .emo import nondominated_fronts
+
 
 def identity(obj):
     """Returns directly the argument *obj*.
@@ -487,6 +491,85 @@ class Logbook(list):
         return "\n".join(text)
 
 
+class _SortedBlocks(object):
+    """Sequence of (key, item) entries sorted on the keys and stored as a
+    list of blocks of at most 2 * *load* entries, with the last key of every
+    block. Inserting, removing and indexing an entry bisect the block keys
+    and then one block, so they cost O(log n + load) instead of the O(n) of a
+    single list.
+    """
+    def __init__(self, load=256):
+        self.load = load
+        self.keys = list()
+        self.items = list()
+        self.maxes = list()
+        self._len = 0
+        self._ends = None
+
+    def insert(self, key, item):
+        """Inserts *item* at the right of the entries of equal *key*."""
+        if not self.maxes:
+            self.keys.append([key])
+            self.items.append([item])
+            self.maxes.append(key)
+        else:
+            b = min(bisect_right(self.maxes, key), len(self.maxes) - 1)
+            keys, items = self.keys[b], self.items[b]
+            i = bisect_right(keys, key)
+            keys.insert(i, key)
+            items.insert(i, item)
+            self.maxes[b] = keys[-1]
+            if len(keys) > 2 * self.load:
+                # Split the block in two halves
+                self.keys[b:b+1] = [keys[:self.load], keys[self.load:]]
+                self.items[b:b+1] = [items[:self.load], items[self.load:]]
+                self.maxes[b:b+1] = [keys[self.load-1], keys[-1]]
+        self._len += 1
+        self._ends = None
+
+    def _locate(self, pos):
+        # Block and position in the block of entry *pos*
+        if pos == 0:
+            return 0, 0
+        if pos == self._len - 1:
+            return len(self.keys) - 1, len(self.keys[-1]) - 1
+        if self._ends is None:
+            self._ends = list(accumulate(len(keys) for keys in self.keys))
+        b = bisect_right(self._ends, pos)
+        return b, pos - (self._ends[b-1] if b > 0 else 0)
+
+    def item(self, pos):
+        """Returns the item of entry *pos* (0 <= *pos* < len)."""
+        b, i = self._locate(pos)
+        return self.items[b][i]
+
+    def pop(self, pos):
+        """Removes entry *pos* (0 <= *pos* < len) and returns its item."""
+        b, i = self._locate(pos)
+        keys, items = self.keys[b], self.items[b]
+        del keys[i]
+        item = items.pop(i)
+        if keys:
+            self.maxes[b] = keys[-1]
+        else:
+            del self.keys[b], self.items[b], self.maxes[b]
+        self._len -= 1
+        self._ends = None
+        return item
+
+    def iterkeys(self):
+        return chain.from_iterable(self.keys)
+
+    def __iter__(self):
+        return chain.from_iterable(self.items)
+
+    def __reversed__(self):
+        return chain.from_iterable(reversed(items) for items in reversed(self.items))
+
+    def __len__(self):
+        return self._len
+
+
 class HallOfFame(object):
     """The hall of fame contains the best individual that ever lived in the
     population during the evolution. It is lexicographically sorted at all
@@ -507,12 +590,80 @@ class HallOfFame(object):
     The class :class:`HallOfFame` provides an interface similar to a list
     (without being one completely). It is possible to retrieve its length, to
     iterate on it forward and backward and to get an item or a slice from it.
+
+    The hall-of-famers are kept in sorted blocks, so inserting and removing
+    one costs O(log n) comparisons and a move within a block, instead of a
+    move of the whole hall of fame. The :attr:`keys` (the fitnesses, worst
+    first) and :attr:`items` lists are built when read. With the default
+    *similar*, the genomes of the hall-of-famers are kept in a hash set, so
+    finding a similar individual does not scan the hall of fame. Individuals
+    that cannot be converted to an array of floats, and every individual
+    with another *similar*, are compared one by one.
     """
     def __init__(self, maxsize, similar=eq):
         self.maxsize = maxsize
-        self.keys = list()
-        self.items = list()
         self.similar = similar
+        self._entries = _SortedBlocks()
+        self._genomes = defaultdict(int)
+
+    @property
+    def keys(self):
+        return list(self._entries.iterkeys())
+
+    @property
+    def items(self):
+        return list(reversed(self._entries))
+
+    def __setstate__(self, state):
+        state = dict(state)
+        keys = state.pop('keys', None)
+        items = state.pop('items', None)
+        self.__dict__.update(state)
+        # Halls of fame pickled with the keys and items lists
+        if '_entries' not in state:
+            self._entries = _SortedBlocks()
+            for key, item in zip(keys, reversed(items)):
+                self._entries.insert(key, item)
+        # Halls of fame pickled without the hash set
+        if '_genomes' not in state:
+            self._genomes = defaultdict(int)
+            for item in self:
+                self._add_genome(item)
+
+    @staticmethod
+    def _genome_key(ind):
+        # Equal float arrays have equal bytes once -0.0 is made 0.0
+        try:
+            genome = numpy.asarray(ind, dtype=numpy.float64)
+        except (TypeError, ValueError):
+            return None
+        return (genome + 0.0).tobytes()
+
+    def _add_genome(self, item):
+        key = self._genome_key(item)
+        if key is not None:
+            self._genomes[key] += 1
+
+    def _remove_genome(self, item):
+        key = self._genome_key(item)
+        if key is not None:
+            self._genomes[key] -= 1
+            if self._genomes[key] == 0:
+                del self._genomes[key]
+
+    def _has_similar(self, ind):
+        """Returns whether an individual similar to *ind* is in the hall of
+        fame."""
+        if self.similar is eq:
+            key = self._genome_key(ind)
+            if key is not None:
+                return key in self._genomes
+        for hofer in self:
+            # Loop through the hall of fame to check for any
+            # similar individual
+            if self.similar(ind, hofer):
+                return True
+        return False
 
     def update(self, population):
         """Update the hall of fame with the *population* by replacing the
@@ -530,12 +681,7 @@ class HallOfFame(object):
                 self.insert(population[0])
                 continue
             if ind.fitness > self[-1].fitness or len(self) < self.maxsize:
-                for hofer in self:
-                    # Loop through the hall of fame to check for any
-                    # similar individual
-                    if self.similar(ind, hofer):
-                        break
-                else:
+                if not self._has_similar(ind):
                     # The individual is unique and strictly better than
                     # the worst
                     if len(self) >= self.maxsize:
@@ -555,34 +701,39 @@ class HallOfFame(object):
                      hall of fame.
         """
         item = deepcopy(item)
-        i = bisect_right(self.keys, item.fitness)
-        self.items.insert(len(self) - i, item)
-        self.keys.insert(i, item.fitness)
+        self._entries.insert(item.fitness, item)
+        self._add_genome(item)
 
     def remove(self, index):
         """Remove the specified *index* from the hall of fame.
 
         :param index: An integer giving which item to remove.
         """
-        del self.keys[len(self) - (index % len(self) + 1)]
-        del self.items[index]
+        if not -len(self) <= index < len(self):
+            raise IndexError('hall of fame index out of range')
+        item = self._entries.pop(len(self) - (index % len(self) + 1))
+        self._remove_genome(item)
 
     def clear(self):
         """Clear the hall of fame."""
-        del self.items[:]
-        del self.keys[:]
+        self._entries = _SortedBlocks()
+        self._genomes.clear()
 
     def __len__(self):
-        return len(self.items)
+        return len(self._entries)
 
     def __getitem__(self, i):
-        return self.items[i]
+        if isinstance(i, slice):
+            return self.items[i]
+        if not -len(self) <= i < len(self):
+            raise IndexError('hall of fame index out of range')
+        return self._entries.item(len(self) - (i % len(self) + 1))
 
     def __iter__(self):
-        return iter(self.items)
+        return reversed(self._entries)
 
     def __reversed__(self):
-        return reversed(self.items)
+        return iter(self._entries)
 
     def __str__(self):
         return str(self.items)
@@ -618,26 +769,33 @@ class ParetoFront(HallOfFame):
         :param population: A list of individual with a fitness attribute to
                            update the hall of fame with.
         """
-        for ind in population:
-            is_dominated = False
-            dominates_one = False
-            has_twin = False
-            to_remove = []
-            for i, hofer in enumerate(self):    # hofer = hall of famer
-                if not dominates_one and hofer.fitness.dominates(ind.fitness):
-                    is_dominated = True
-                    break
-                elif ind.fitness.dominates(hofer.fitness):
-                    dominates_one = True
-                    to_remove.append(i)
-                elif ind.fitness == hofer.fitness and self.similar(ind, hofer):
-                    has_twin = True
-                    break
-
-            for i in reversed(to_remove):       # Remove the dominated hofer
-                self.remove(i)
-            if not is_dominated and not has_twin:
+        population = list(population)
+        if len(population) == 0:
+            return
+
+        # First front of the hall of famers followed by the population
+        nhof = len(self)
+        wvalues = numpy.array([ind.fitness.wvalues for ind in chain(self, population)],
+                              dtype=numpy.float64)
+        front = nondominated_fronts(wvalues, first_front_only=True)[0]
+        is_kept = numpy.zeros(len(wvalues), dtype=bool)
+        is_kept[front] = True
+
+        # Remove the dominated hofers
+        for i in reversed(numpy.flatnonzero(~is_kept[:nhof]).tolist()):
+            self.remove(i)
+
+        # Insert the nondominated individuals in order, unless they have a
+        # twin of the same fitness
+        twins = defaultdict(list)
+        for hofer in self:
+            twins[hofer.fitness.wvalues].append(hofer)
+        for i in front[front >= nhof].tolist():
+            ind = population[i - nhof]
+            same_fitness = twins[ind.fitness.wvalues]
+            if not any(self.similar(ind, other) for other in same_fitness):
                 self.insert(ind)
+                same_fitness.append(ind)
 
 __all__ = ['HallOfFame', 'ParetoFront', 'History', 'Statistics', 'MultiStatistics', 'Logbook']
 
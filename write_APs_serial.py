@@ -5,7 +5,7 @@ import os
 import pandas as pd
 
 from run_dclamp_simulation import run_ind_dclamp
-from cell_recording import ExperimentalAPSet
+from cell_recording import open_AP_set
 
 
 def main(argv):
@@ -35,8 +35,8 @@ def main(argv):
         # Load in experimental AP set
         # Example: Cell 1 recorded 12/24/20 Ishihara dynamic-clamp 0.75 pA/pF
         path_to_aps = '/home/drew/projects/iPSC-EA_Aug-Oct_2021/cell_6/AP_set'
-        cell = ExperimentalAPSet(path=path_to_aps, file_prefix='cell_6_',
-                                   file_suffix='_SAP.txt', cell_id=6, dc_ik1=1.25)
+        cell = open_AP_set(path=path_to_aps, file_prefix='cell_6_',
+                           file_suffix='_SAP.txt', cell_id=6, dc_ik1=1.25)
 
         # Score AP_set against cell
         hof_scores = []
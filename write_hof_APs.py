@@ -4,16 +4,17 @@ import pandas as pd
 from multiprocessing import Pool
 
 from run_dclamp_simulation import run_ind_dclamp
-from cell_recording import ExperimentalAPSet
+from cell_recording import open_AP_set
+from fitness_cache import FitnessCache, simulation_settings
 
 
 def main(argv):
-    if (len(argv) != 2):
-        print('write_hof_APs.py hof_file NUM_MODELS')
+    if (len(argv) not in (2, 3)):
+        print('write_hof_APs.py hof_file NUM_MODELS [fitness_cache]')
         return
     elif (os.path.exists(argv[0]) is False):
         print('Cannot find hof_file.')
-        print('write_hof_APs.py hof_file NUM_MODELS')
+        print('write_hof_APs.py hof_file NUM_MODELS [fitness_cache]')
         return
     else:
         # Load Hall of Fame File
@@ -34,8 +35,8 @@ def main(argv):
         # Load in experimental AP set
         # Cell 1 recorded 12/24/20 Ishihara dynamic-clamp 0.75 pA/pF
         path_to_aps = '/home/drew/projects/iPSC-GA_Aug21/cell_1/AP_set'
-        cell_1 = ExperimentalAPSet(path=path_to_aps, file_prefix='cell_1_',
-                                   file_suffix='_SAP.txt', cell_id=1, dc_ik1=0.75)
+        cell_1 = open_AP_set(path=path_to_aps, file_prefix='cell_1_',
+                             file_suffix='_SAP.txt', cell_id=1, dc_ik1=0.75)
 
         # Some formatting.
         inds = []
@@ -45,6 +46,18 @@ def main(argv):
         model_id = range(NUM_MODELS)
         for i in range(NUM_MODELS):
             inds.append(list(hof.iloc[i, :]))
+
+        # Every individual is simulated, as its APs are written. The scores
+        # are stored in the fitness cache under the settings of this plain
+        # protocol, apart from those of the fitting runs.
+        hof_scores = [None] * NUM_MODELS
+        if (len(argv) == 3):
+            fit_cache = FitnessCache(path=argv[2])
+            settings = simulation_settings(nai=10.0, ki=130.0)
+            keys = [fit_cache.key(i, cell_1.dc_ik1, cell_1.cell_id, settings) for i in inds]
+        else:
+            fit_cache = None
+        todo = range(NUM_MODELS)
         tasks = [*zip(inds, dc_ik1, nai, ki)]
 
         # To speed things up with multi-threading
@@ -54,9 +67,10 @@ def main(argv):
         hof_APs = p.starmap(run_ind_dclamp, iterable=tasks)
 
         # Score AP_set against Cell 1
-        hof_scores = []
-        for i in range(len(hof_APs)):
-            hof_scores.append(cell_1.score(hof_APs[i], model_id[i], write_data=True))
+        for i, j in enumerate(todo):
+            hof_scores[j] = cell_1.score(hof_APs[i], model_id[j], write_data=True)
+            if fit_cache is not None:
+                fit_cache.put(keys[j], hof_scores[j])
 
         # Order the dict: Format output file
         column_names = []